@@ -0,0 +1,142 @@
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from forta_agent import get_json_rpc_url
+from web3 import Web3
+
+from src.async_rpc import AsyncRpcClient
+from src.loader import load_agent
+from src.metrics import Metrics
+from src.price_cache import PriceCache
+
+# --------------------------SETUP SECTION-------------------------- #
+AGENTS = ['governance', 'loan_transaction', 'price_deviates', 'get_fallback_oracle', 'exchange_rate_goes_down']
+AGENTS_ROOT = os.environ.get('AAVE_AGENTS_ROOT', os.path.join(os.path.dirname(__file__), '..', '..'))
+# (market, network) pairs monitored at once, available markets: MAIN, AMM. There is only mainnet available at this
+# moment, since forta_agent has no Kovan network to dispatch the Kovan events to
+PIPELINES = [('MAIN', 'MAINNET'), ('AMM', 'MAINNET')]
+JSON_RPC_URLS = {}  # network -> JSON-RPC url, the forta_agent one by default
+RPC_TIMEOUT = 10  # seconds
+# ------------------------END SETUP SECTION------------------------ #
+
+
+class Pipeline:
+    # the agents of one (market, network) pair with their own provider, connection pool and price cache. Agents
+    # without a MARKET, e.g. governance, watch the whole network and are loaded in its first pipeline only
+    def __init__(self, market, network, network_agents=True):
+        self.market = market
+        self.network = network
+        self.name = f'{market}_{network}'
+        environ = {'AAVE_MARKET': market, 'AAVE_NETWORK': network}
+        self.agents = {}
+        for agent_name in AGENTS:
+            agent = load_agent(agent_name, AGENTS_ROOT, environ)
+            if network_agents or hasattr(agent, 'MARKET'):
+                self.agents[agent_name] = agent
+
+        # a session per pipeline, so the pipelines do not wait for the connections of each other
+        url = JSON_RPC_URLS.get(network, get_json_rpc_url())
+        provider = Web3.HTTPProvider(url, session=requests.Session(), request_kwargs={'timeout': RPC_TIMEOUT})
+        self.web3 = Web3(provider)
+        # and a concurrent JSON-RPC client per pipeline for the agents fetching their prices with it (ASYNC_RPC)
+        async_agents = [agent for agent in self.agents.values() if getattr(agent, 'ASYNC_RPC', False)]
+        self.rpc_client = AsyncRpcClient(url, max_concurrency=max(agent.RPC_MAX_CONCURRENCY for agent in async_agents),
+                                         timeout=RPC_TIMEOUT) if async_agents else None
+        self.price_cache = PriceCache()
+        # the oracle addresses read by the agents re-reading them every ORACLE_REFRESH_BLOCKS, shared by their block
+        # and transaction handlers
+        self.oracles = {agent_name: agent.OracleAddresses(agent.ORACLE_REFRESH_BLOCKS)
+                        for agent_name, agent in self.agents.items() if hasattr(agent, 'ORACLE_REFRESH_BLOCKS')}
+        for agent in self.agents.values():
+            if hasattr(agent, 'web3'):
+                agent.web3.provider = provider  # module level contracts, e.g. the LendingPoolAddressesProvider
+
+        self.transaction_handlers = self.provide_handlers('handle_transaction')
+        self.block_handlers = self.provide_handlers('handle_block')
+
+    def provide_handlers(self, handler_name):
+        # agents exposing provide_handle_*() get the pipeline provider and cache, its rpc client with ASYNC_RPC and
+        # their oracle addresses with ORACLE_REFRESH_BLOCKS, the others are used as they are without their own metrics
+        # wrapper, since the host records the handler metrics
+        handlers = {}
+        for agent_name, agent in self.agents.items():
+            if hasattr(agent, 'provide_' + handler_name):
+                kwargs = {'rpc_client': self.rpc_client} if getattr(agent, 'ASYNC_RPC', False) else {}
+                if agent_name in self.oracles:
+                    kwargs['oracles'] = self.oracles[agent_name]
+                handlers[agent_name] = getattr(agent, 'provide_' + handler_name)(self.web3, self.price_cache, **kwargs)
+            elif hasattr(agent, 'real_' + handler_name):
+                handlers[agent_name] = getattr(agent, 'real_' + handler_name)
+            elif hasattr(agent, handler_name):
+                handlers[agent_name] = getattr(agent, handler_name)
+        return handlers
+
+
+networks = set()
+pipelines = []
+for market, network in PIPELINES:
+    pipelines.append(Pipeline(market, network, network_agents=network not in networks))
+    networks.add(network)
+agents = pipelines[0].agents
+
+# one metrics registry for all the pipelines, labelled with the agent whose handler is running and its pipeline
+metrics = Metrics('agent_host')
+for pipeline in pipelines:
+    for agent in pipeline.agents.values():
+        if hasattr(agent, 'metrics'):
+            metrics.functions.update(agent.metrics.functions)
+            agent.metrics = metrics
+    metrics.instrument(pipeline.web3)
+    if pipeline.rpc_client is not None:
+        pipeline.rpc_client.metrics = metrics
+    for agent in pipeline.agents.values():
+        if hasattr(agent, 'web3') and 'metrics' in agent.web3.middleware_onion:
+            agent.web3.middleware_onion.replace('metrics', metrics.rpc_middleware)
+
+transaction_handlers = pipelines[0].transaction_handlers
+block_handlers = pipelines[0].block_handlers
+executor = ThreadPoolExecutor(max_workers=len(pipelines), thread_name_prefix='pipeline')
+
+
+def run_handlers(handlers, event, handler_name='handle_event'):
+    findings = []
+    for agent_name, handler in handlers.items():
+        metrics.agent = agent_name
+        try:
+            findings.extend(metrics.call_handler(handler_name, handler, event))
+        except Exception:
+            # one failing agent must not hide the findings of the others
+            print(f'{agent_name} failed to handle the event')
+            traceback.print_exc()
+    return findings
+
+
+def run_pipeline(pipeline, handlers, event, handler_name):
+    metrics.set_context(pipeline=pipeline.name)
+    return run_handlers(handlers, event, handler_name)
+
+
+def run_pipelines(event, handlers_name, handler_name):
+    # the pipelines of the event's network run concurrently, their findings are returned in the PIPELINES order
+    futures = [executor.submit(run_pipeline, pipeline, getattr(pipeline, handlers_name), event, handler_name)
+               for pipeline in pipelines if pipeline.network == event.network.name]
+    return [finding for future in futures for finding in future.result()]
+
+
+def initialize():
+    # lets every agent resolve its addresses before the first event, each one bounded by its own warmup timeout
+    for pipeline in pipelines:
+        for agent in pipeline.agents.values():
+            if hasattr(agent, 'warmup'):
+                agent.warmup()
+    metrics.export()
+
+
+def handle_transaction(transaction_event):
+    return run_pipelines(transaction_event, 'transaction_handlers', 'handle_transaction')
+
+
+def handle_block(block_event):
+    return run_pipelines(block_event, 'block_handlers', 'handle_block')
@@ -0,0 +1,115 @@
+import inspect
+import json
+
+import eth_abi
+from eth_utils import encode_hex, event_abi_to_log_topic
+from forta_agent import Finding, FindingSeverity, FindingType, create_block_event, create_transaction_event
+
+import agent
+from agent import handle_transaction, run_handlers
+
+
+class TestAgentHost:
+    governance_constants = agent.agents['governance'].GOVERNANCE_PROPOSAL_EXECUTED_ABI
+
+    def test_loads_all_agents(self):
+        assert set(agent.agents) == set(agent.AGENTS)
+        assert set(agent.transaction_handlers) == {'governance', 'loan_transaction', 'get_fallback_oracle',
+                                                   'price_deviates'}
+        assert set(agent.block_handlers) == {'loan_transaction', 'price_deviates', 'exchange_rate_goes_down'}
+
+    def test_loads_one_pipeline_per_market(self):
+        assert [(pipeline.market, pipeline.network) for pipeline in agent.pipelines] == agent.PIPELINES
+        main, amm = agent.pipelines
+        assert main.agents['loan_transaction'].MARKET == 'MAIN'
+        assert amm.agents['loan_transaction'].MARKET == 'AMM'
+        assert main.agents['loan_transaction'] is not amm.agents['loan_transaction']
+        assert main.web3.provider is not amm.web3.provider
+        assert main.price_cache is not amm.price_cache
+        # governance watches the whole network, so it runs once
+        assert 'governance' in main.transaction_handlers
+        assert 'governance' not in amm.transaction_handlers
+
+    def test_passes_pipeline_rpc_client_to_price_deviates(self):
+        main, amm = agent.pipelines
+        assert main.rpc_client is not amm.rpc_client
+        for pipeline in agent.pipelines:
+            for handlers in (pipeline.transaction_handlers, pipeline.block_handlers):
+                handler = handlers['price_deviates']
+                assert inspect.getclosurevars(handler).nonlocals['rpc_client'] is pipeline.rpc_client
+        assert main.rpc_client.metrics is agent.metrics
+        # the standalone handlers of price_deviates and their rpc client are never built by the host
+        assert all(not pipeline.agents['price_deviates'].standalone_handlers for pipeline in agent.pipelines)
+
+    def test_reads_price_deviates_oracles_once_per_pipeline(self, monkeypatch):
+        # the block sweep and the transaction checks of a block share the oracle addresses read for it
+        monkeypatch.setattr(agent, 'AGENTS', ['price_deviates'])
+        pipeline = agent.Pipeline('MAIN', 'MAINNET')
+        price_deviates = pipeline.agents['price_deviates']
+        price_oracle, fallback_oracle = '0x1010101010101010101010101010101010101010', \
+            '0x2020202020202020202020202020202020202020'
+        reads = []
+        monkeypatch.setattr(price_deviates, 'resolve_oracles', lambda w3: reads.append('getPriceOracle') or
+                            ((None, price_oracle), (None, fallback_oracle)))
+        monkeypatch.setattr(price_deviates, 'fetch_prices_async', lambda rpc_client, price_cache, price_oracle,
+                            fallback_oracle, assets, block_number: ([100] * len(assets), [100] * len(assets)))
+        asset, aggregator = price_deviates.tokens.tokens[0]['address'], '0x3030303030303030303030303030303030303030'
+        price_deviates.price_updates.watch(price_oracle, fallback_oracle, {asset: [aggregator]})
+        answer_updated_log = {'address': aggregator, 'data': encode_hex(eth_abi.encode_single('uint256', 1)),
+                              'topics': [price_deviates.price_updates.answer_updated_decoder.topic,
+                                         encode_hex(eth_abi.encode_single('int256', 100)),
+                                         encode_hex(eth_abi.encode_single('uint256', 7))]}
+
+        pipeline.block_handlers['price_deviates'](create_block_event({'block': {'number': 13000000}}))
+        pipeline.transaction_handlers['price_deviates'](create_transaction_event({
+            'receipt': {'logs': [answer_updated_log]},
+            'block': {'number': 13000000}
+        }))
+
+        assert reads == ['getPriceOracle']
+
+    def test_loads_pipeline_without_loan_transaction(self, monkeypatch):
+        # the price cache and metrics of the host do not come from any agent
+        monkeypatch.setattr(agent, 'AGENTS', ['governance', 'exchange_rate_goes_down'])
+        pipeline = agent.Pipeline('MAIN', 'MAINNET')
+        assert set(pipeline.agents) == {'governance', 'exchange_rate_goes_down'}
+        assert set(pipeline.block_handlers) == {'exchange_rate_goes_down'}
+
+    def test_dispatches_transaction_to_all_agents(self):
+        governance_address = agent.agents['governance'].AAVE_GOVERNANCE_V2_MAINNET
+        filler = eth_abi.encode_abi(["address"], [governance_address])
+        topics = [event_abi_to_log_topic(json.loads(self.governance_constants)), filler]
+        tx_event = create_transaction_event({
+            'receipt': {
+                'logs': [
+                    {'topics': topics,
+                     'data': filler,
+                     'address': governance_address}, ]},
+        })
+
+        findings = handle_transaction(tx_event)
+        assert [finding.alert_id for finding in findings] == ['AAVE-GOV-EXEC']
+        assert agent.metrics.counters[('aave_findings_total', (('agent', 'governance'), ('alert_id', 'AAVE-GOV-EXEC'),
+                                                               ('pipeline', 'MAIN_MAINNET')))] >= 1
+
+    def test_returns_zero_findings_for_irrelevant_transaction(self):
+        tx_event = create_transaction_event({
+            'transaction': {
+                'to': "0x1010101010101010101010101010101010101010",
+                'data': "0x"
+            },
+        })
+        assert handle_transaction(tx_event) == []
+
+    def test_failing_agent_does_not_hide_other_findings(self):
+        def failing_handler(_):
+            raise ValueError('test')
+
+        finding = Finding({'name': 'Test', 'description': 'Test', 'alert_id': 'TEST', 'type': FindingType.Info,
+                           'severity': FindingSeverity.Info})
+        findings = run_handlers({'failing': failing_handler, 'working': lambda _: [finding]},
+                                create_block_event({'block': {'number': 0}}))
+        assert findings == [finding]
+        assert agent.metrics.counters[('aave_handler_calls_total', (('agent', 'failing'), ('handler', 'handle_event'),
+                                                                    ('outcome', 'error')))] >= 1
+        assert agent.metrics.counters[('aave_findings_total', (('agent', 'working'), ('alert_id', 'TEST')))] >= 1
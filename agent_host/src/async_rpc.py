@@ -0,0 +1,70 @@
+import asyncio
+import itertools
+import time
+
+import aiohttp
+from eth_utils import decode_hex
+
+MAX_CONCURRENCY = 32  # max number of requests in flight
+RPC_TIMEOUT = 30  # seconds
+
+
+class RpcError(Exception):
+    pass
+
+
+class AsyncRpcClient:
+    # JSON-RPC client running eth_calls concurrently over a pooled keep-alive HTTP session
+    def __init__(self, url, max_concurrency=MAX_CONCURRENCY, timeout=RPC_TIMEOUT, metrics=None):
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.metrics = metrics  # records every request like the web3 metrics middleware does
+        self.loop = asyncio.new_event_loop()
+        self._session = None
+        self._semaphore = None
+        self._ids = itertools.count()
+
+    async def _get_session(self):
+        # the session and the semaphore are bound to the client's loop, so they are created inside it
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def request(self, method, params):
+        session = await self._get_session()
+        payload = {'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': params}
+        async with self._semaphore:
+            start = time.perf_counter()
+            body = {'error': 'request failed'}
+            try:
+                async with session.post(self.url, json=payload) as response:
+                    response.raise_for_status()
+                    body = await response.json(content_type=None)
+            finally:
+                if self.metrics is not None:
+                    self.metrics.record_rpc(method, params, time.perf_counter() - start,
+                                            'error' if 'error' in body else 'ok')
+        if 'error' in body:
+            raise RpcError(f'{method} failed: {body["error"]}')
+        return body['result']
+
+    async def eth_call(self, to, data, block_identifier='latest'):
+        block = hex(block_identifier) if isinstance(block_identifier, int) else block_identifier
+        return decode_hex(await self.request('eth_call', [{'to': to, 'data': data}, block]))
+
+    async def eth_calls(self, calls, block_identifier='latest'):
+        return await asyncio.gather(*[self.eth_call(to, data, block_identifier) for to, data in calls])
+
+    def call_all(self, calls, block_identifier='latest'):
+        # blocking entry point for the handlers: runs all the (to, data) calls concurrently, keeps the order
+        return self.loop.run_until_complete(self.eth_calls(calls, block_identifier))
+
+    def close(self):
+        if self._session is not None:
+            self.loop.run_until_complete(self._session.close())
+            self._session = None
+        self.loop.close()
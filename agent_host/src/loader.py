@@ -0,0 +1,33 @@
+import importlib
+import os
+import sys
+
+
+def is_src_module(module_name):
+    return module_name == 'src' or module_name.startswith('src.')
+
+
+def load_agent(agent_name, agents_root, environ=None):
+    # every agent is a separate project importing its own 'src' package and opening files relative to its
+    # directory, so it is imported from inside its directory with the host's 'src' modules put aside. Every call
+    # imports a new instance of the agent, environ is set while it is imported, e.g. its AAVE_MARKET.
+    agent_dir = os.path.abspath(os.path.join(agents_root, agent_name))
+    host_modules = {name: sys.modules.pop(name) for name in list(sys.modules) if is_src_module(name)}
+    host_environ = {name: os.environ.get(name) for name in environ or {}}
+    cwd = os.getcwd()
+    sys.path.insert(0, agent_dir)
+    os.chdir(agent_dir)
+    os.environ.update(environ or {})
+    try:
+        return importlib.import_module('src.agent')
+    finally:
+        for name, value in host_environ.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+        os.chdir(cwd)
+        sys.path.remove(agent_dir)
+        for name in [name for name in sys.modules if is_src_module(name)]:
+            del sys.modules[name]
+        sys.modules.update(host_modules)
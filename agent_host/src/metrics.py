@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_utils import encode_hex, function_abi_to_4byte_selector
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+METRICS_PORT = os.environ.get('METRICS_PORT')  # serve the Prometheus text format on this port if set
+METRICS_JSON_FILE = os.environ.get('METRICS_JSON_FILE')  # dump the metrics as JSON into this file if set
+METRICS_JSON_INTERVAL = float(os.environ.get('METRICS_JSON_INTERVAL', 60))  # seconds between the JSON dumps
+
+
+def function_names(*abis):
+    # maps the 4-byte selectors of the ABI functions to their names, e.g. '0x9d23d9f2' -> 'getAssetsPrices'
+    return {encode_hex(function_abi_to_4byte_selector(abi)): abi['name']
+            for abi_list in abis for abi in (abi_list if isinstance(abi_list, list) else [abi_list])
+            if abi.get('type') == 'function'}
+
+
+def format_labels(labels):
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}' if labels else ''
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    # in-process counters and histograms labelled by agent, exported in the Prometheus text format or as JSON
+    def __init__(self, agent, functions=None):
+        self.default_agent = agent
+        self.functions = functions or {}  # selector -> function name, used as the method label of eth_calls
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        # the agent_host switches the agent label to the agent whose handler is running, and adds the pipeline label,
+        # per thread since the pipelines run concurrently
+        self.local = threading.local()
+
+    @property
+    def agent(self):
+        return getattr(self.local, 'agent', self.default_agent)
+
+    @agent.setter
+    def agent(self, agent):
+        self.local.agent = agent
+
+    def set_context(self, **labels):
+        # labels added to everything recorded from the current thread
+        self.local.labels = labels
+
+    def labels(self, labels):
+        return tuple(sorted({'agent': self.agent, **getattr(self.local, 'labels', {}), **labels}.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = (name, self.labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS, **labels):
+        key = (name, self.labels(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def rpc_method(self, method, params):
+        # eth_calls are labelled with the called contract function, e.g. getAssetsPrices
+        if method == 'eth_call' and params:
+            data = params[0].get('data') or ''
+            return self.functions.get(data[:10], data[:10] or method)
+        return method
+
+    def record_rpc(self, method, params, seconds, outcome):
+        method = self.rpc_method(method, params)
+        self.inc('aave_rpc_calls_total', method=method, outcome=outcome)
+        self.observe('aave_rpc_call_seconds', seconds, method=method)
+
+    def rpc_middleware(self, make_request, w3):
+        # web3 middleware timing every request that goes through the provider
+        def middleware(method, params):
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                response = make_request(method, params)
+                outcome = 'error' if 'error' in response else 'ok'
+                return response
+            finally:
+                self.record_rpc(method, params, time.perf_counter() - start, outcome)
+
+        return middleware
+
+    def instrument(self, w3):
+        w3.middleware_onion.add(self.rpc_middleware, 'metrics')
+        return w3
+
+    def call_handler(self, handler_name, handler, event):
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            findings = handler(event)
+            outcome = 'ok'
+            for finding in findings:
+                self.inc('aave_findings_total', alert_id=finding.alert_id)
+            return findings
+        finally:
+            self.inc('aave_handler_calls_total', handler=handler_name, outcome=outcome)
+            self.observe('aave_handler_seconds', time.perf_counter() - start, handler=handler_name)
+
+    def to_prometheus(self):
+        with self.lock:
+            lines = []
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f'{name}{format_labels(labels)} {value}')
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", bound),))} {count}')
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+                lines.append(f'{name}_sum{format_labels(labels)} {histogram.sum}')
+                lines.append(f'{name}_count{format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self):
+        with self.lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                'histograms': [{'name': name, 'labels': dict(labels), 'buckets': list(histogram.buckets),
+                                'counts': list(histogram.counts), 'sum': histogram.sum, 'count': histogram.count}
+                               for (name, labels), histogram in sorted(self.histograms.items(),
+                                                                       key=lambda item: item[0])],
+            }
+
+    def serve(self, port, host='0.0.0.0'):
+        metrics = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def dump_json(self, path):
+        # written to a temporary file first so that a reader never sees a partial dump
+        with open(path + '.tmp', 'w') as metrics_file:
+            json.dump(self.to_json(), metrics_file)
+        os.replace(path + '.tmp', path)
+
+    def dump_json_periodically(self, path, interval):
+        def dump():
+            while True:
+                time.sleep(interval)
+                self.dump_json(path)
+
+        threading.Thread(target=dump, daemon=True).start()
+
+    def export(self):
+        # starts the exporters configured with the METRICS_* environment variables
+        if METRICS_PORT:
+            self.serve(int(METRICS_PORT))
+        if METRICS_JSON_FILE:
+            self.dump_json_periodically(METRICS_JSON_FILE, METRICS_JSON_INTERVAL)
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from threading import Lock
+
+CACHE_SIZE = 4096  # max number of (oracle, asset, block) prices kept in memory
+
+
+class PriceCache:
+    # LRU cache of oracle prices keyed by (oracle address, asset address, block number)
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._prices = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._prices)
+
+    @staticmethod
+    def key(oracle_address, asset, block_number):
+        return oracle_address.lower(), asset.lower(), int(block_number)
+
+    def get(self, oracle_address, asset, block_number):
+        key = self.key(oracle_address, asset, block_number)
+        with self._lock:
+            if key not in self._prices:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._prices.move_to_end(key)
+            return self._prices[key]
+
+    def put(self, oracle_address, asset, block_number, price):
+        key = self.key(oracle_address, asset, block_number)
+        with self._lock:
+            self._prices[key] = price
+            self._prices.move_to_end(key)
+            while len(self._prices) > self.max_size:
+                self._prices.popitem(last=False)  # evict the least recently used price
+
+    def get_assets_prices(self, price_oracle_contract, oracle_address, assets, block_number):
+        # prices are only cacheable for a fixed block, 'latest' always goes to the oracle
+        if not isinstance(block_number, int):
+            return price_oracle_contract.functions.getAssetsPrices(assets=assets).call(
+                block_identifier=block_number)
+
+        prices = {asset: self.get(oracle_address, asset, block_number) for asset in assets}
+        missing = [asset for asset, price in prices.items() if price is None]
+        if missing:
+            # fetch every missing price with one getAssetsPrices() call
+            fetched = price_oracle_contract.functions.getAssetsPrices(assets=missing).call(
+                block_identifier=block_number)
+            for asset, price in zip(missing, fetched):
+                self.put(oracle_address, asset, block_number, price)
+                prices[asset] = price
+
+        return [prices[asset] for asset in assets]
+
+    def get_asset_price(self, oracle_contract, oracle_address, asset, block_number):
+        # same as get_assets_prices() but for oracles exposing only getAssetPrice(asset)
+        price = self.get(oracle_address, asset, block_number) if isinstance(block_number, int) else None
+        if price is None:
+            price = oracle_contract.functions.getAssetPrice(asset=asset).call(block_identifier=block_number)
+            if isinstance(block_number, int):
+                self.put(oracle_address, asset, block_number, price)
+        return price
+
+    def clear(self):
+        with self._lock:
+            self._prices.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,59 @@
+# Compares TransactionEvent.filter_function()/filter_log(), which parse the ABI JSON and build a web3 contract on
+# every call, with the precompiled decoders from src/decoders.py.
+#
+# Run from the repository root: python benchmarks/abi_decoding.py
+import json
+import os
+import sys
+import timeit
+
+import eth_abi
+from eth_utils import encode_hex
+from forta_agent import create_transaction_event
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'loan_transaction'))
+from src.constants import FLASH_LOAN_FUNCTION  # noqa: E402
+from src.decoders import EventDecoder, FunctionDecoder, filter_function, filter_log  # noqa: E402
+
+LENDING_POOL = '0x7d2768dE32b0b80b7a3454c06BdAc94A69DDc7A9'
+PROPOSAL_EXECUTED_ABI = json.dumps({
+    'anonymous': False,
+    'inputs': [{'indexed': False, 'internalType': 'uint256', 'name': 'id', 'type': 'uint256'},
+               {'indexed': True, 'internalType': 'address', 'name': 'initiatorExecution', 'type': 'address'}],
+    'name': 'ProposalExecuted',
+    'type': 'event'
+})
+ROUNDS = 500
+
+
+def per_call_us(function):
+    return timeit.timeit(function, number=ROUNDS) / ROUNDS * 1e6
+
+
+def main():
+    flash_loan_decoder = FunctionDecoder(FLASH_LOAN_FUNCTION)
+    proposal_executed_decoder = EventDecoder(PROPOSAL_EXECUTED_ABI)
+
+    params = eth_abi.encode_abi(['address', 'address[]', 'uint256[]', 'uint256[]', 'address', 'bytes', 'uint16'],
+                                [LENDING_POOL, [LENDING_POOL] * 5, [1] * 5, [0] * 5, LENDING_POOL, bytes(0), 0])
+    call_event = create_transaction_event({
+        'transaction': {'to': LENDING_POOL, 'data': encode_hex(flash_loan_decoder.selector_bytes + params)}})
+    log_event = create_transaction_event({
+        'receipt': {'logs': [{'topics': [proposal_executed_decoder.topic,
+                                         encode_hex(eth_abi.encode_abi(['address'], [LENDING_POOL]))],
+                              'data': encode_hex(eth_abi.encode_abi(['uint256'], [1])),
+                              'address': LENDING_POOL}]}})
+
+    rows = [
+        ('flashLoan() call', per_call_us(lambda: call_event.filter_function(FLASH_LOAN_FUNCTION, LENDING_POOL)),
+         per_call_us(lambda: filter_function(call_event, flash_loan_decoder, LENDING_POOL))),
+        ('ProposalExecuted log', per_call_us(lambda: log_event.filter_log(PROPOSAL_EXECUTED_ABI, LENDING_POOL)),
+         per_call_us(lambda: filter_log(log_event, proposal_executed_decoder, LENDING_POOL))),
+    ]
+    print(f'{"case":<24}{"forta, us/tx":>16}{"precompiled, us/tx":>22}{"speedup":>10}')
+    for case, forta_us, precompiled_us in rows:
+        print(f'{case:<24}{forta_us:>16.1f}{precompiled_us:>22.1f}{forta_us / precompiled_us:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
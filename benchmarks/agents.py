@@ -0,0 +1,222 @@
+# Drives every agent's handle_transaction()/handle_block() with synthetic events against a counting fake provider
+# and reports events/sec, p50/p99 latency and RPC calls per event.
+#
+# Run from the repository root: python benchmarks/agents.py [--events 500] [--latency 0.001] [--agents loan_transaction]
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+# the agents read the JSON-RPC url at import, no request ever reaches it since their providers are replaced
+os.environ.setdefault('JSON_RPC_HOST', '127.0.0.1')
+os.environ.setdefault('JSON_RPC_PORT', '8545')
+
+import eth_abi  # noqa: E402
+from eth_utils import decode_hex, encode_hex, function_signature_to_4byte_selector  # noqa: E402
+from forta_agent import create_block_event, create_transaction_event  # noqa: E402
+from web3 import Web3  # noqa: E402
+from web3.providers.base import BaseProvider  # noqa: E402
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'agent_host', 'src'))
+from loader import load_agent  # noqa: E402
+
+AGENTS = ['governance', 'loan_transaction', 'price_deviates', 'get_fallback_oracle', 'exchange_rate_goes_down']
+PRICE_ORACLE = '0xA50ba011c48153De246E5192C8f9258A2ba79Ca9'
+FALLBACK_ORACLE = '0x5B09E578cfEAa23F1b11127A658855434e4F3e09'
+LENDING_POOL = '0x7d2768dE32b0b80b7a3454c06BdAc94A69DDc7A9'
+OTHER_CONTRACT = '0x1010101010101010101010101010101010101010'
+FIRST_BLOCK = 13000000
+WARMUP_EVENTS = 10
+
+with open(os.path.join(ROOT, 'loan_transaction', 'src', 'tokens.json'), 'r') as tokens_file:
+    TOKENS = [token['address'] for token in json.load(tokens_file)['proto']]
+
+
+def selector(signature):
+    return encode_hex(function_signature_to_4byte_selector(signature))
+
+
+def price(asset):
+    # any deterministic non-zero price, the same for both oracles so price_deviates does not fire
+    return 10 ** 15 + int(asset[-4:], 16)
+
+
+def encode_address(address):
+    return encode_hex(eth_abi.encode_abi(['address'], [address]))
+
+
+def respond_assets_prices(data):
+    assets, = eth_abi.decode_abi(['address[]'], decode_hex(data)[4:])
+    return encode_hex(eth_abi.encode_abi(['uint256[]'], [[price(asset) for asset in assets]]))
+
+
+def respond_asset_price(data):
+    asset, = eth_abi.decode_abi(['address'], decode_hex(data)[4:])
+    return encode_hex(eth_abi.encode_abi(['uint256'], [price(asset)]))
+
+
+RESPONDERS = {
+    selector('getPriceOracle()'): ('getPriceOracle', lambda _: encode_address(PRICE_ORACLE)),
+    selector('getLendingPool()'): ('getLendingPool', lambda _: encode_address(LENDING_POOL)),
+    selector('getFallbackOracle()'): ('getFallbackOracle', lambda _: encode_address(FALLBACK_ORACLE)),
+    selector('getAssetsPrices(address[])'): ('getAssetsPrices', respond_assets_prices),
+    selector('getAssetPrice(address)'): ('getAssetPrice', respond_asset_price),
+}
+
+
+class CountingProvider(BaseProvider):
+    # answers the Aave eth_calls the agents make and counts them by contract function
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+
+    def make_request(self, method, params):
+        if self.latency:
+            time.sleep(self.latency)
+        if method == 'eth_call':
+            data = params[0]['data']
+            name, respond = RESPONDERS[data[:10]]
+            self.calls[name] += 1
+            return {'jsonrpc': '2.0', 'id': 0, 'result': respond(data)}
+        self.calls[method] += 1
+        return {'jsonrpc': '2.0', 'id': 0, 'result': '0x1'}
+
+    def isConnected(self):
+        return True
+
+
+def flash_loan_event(decoder, assets, block_number):
+    # a contract starting a flash loan, one FlashLoan log of the lending pool per asset
+    logs = [{'address': LENDING_POOL,
+             'topics': [decoder.topic] + [encode_address(value) for value in (OTHER_CONTRACT, OTHER_CONTRACT, asset)],
+             'data': encode_hex(eth_abi.encode_abi(['uint256', 'uint256', 'uint16'], [10 ** 24, 9 * 10 ** 20, 0]))}
+            for asset in assets]
+    return create_transaction_event({
+        'transaction': {'to': OTHER_CONTRACT, 'data': '0x', 'hash': '0x1'},
+        'receipt': {'logs': logs},
+        'block': {'number': block_number}})
+
+
+def irrelevant_event(_):
+    return create_transaction_event({
+        'transaction': {'to': OTHER_CONTRACT, 'data': '0xa9059cbb' + '00' * 64, 'hash': '0x1'},
+        'receipt': {'logs': [{'topics': ['0x' + 'dd' * 32], 'data': '0x', 'address': OTHER_CONTRACT}]},
+        'block': {'number': FIRST_BLOCK}})
+
+
+def scenarios(agents, w3):
+    # (name, handler, event factory taking the event index), one fresh block per event unless stated otherwise
+    loan_transaction = agents.get('loan_transaction')
+    if loan_transaction:
+        handler = loan_transaction.provide_handle_transaction(w3)
+        decoder = loan_transaction.flash_loan_decoder
+        for size in (1, 5, 20):
+            assets = [TOKENS[i % len(TOKENS)] for i in range(size)]
+            yield (f'loan_transaction flashLoan {size} assets', handler,
+                   lambda i, assets=assets: flash_loan_event(decoder, assets, FIRST_BLOCK + i))
+        yield ('loan_transaction flashLoan 5 assets same block', handler,
+               lambda _: flash_loan_event(decoder, TOKENS[:5], FIRST_BLOCK))
+        yield 'loan_transaction irrelevant tx', handler, irrelevant_event
+
+        # 10 flash loans per block of 3 assets each, out of 12 distinct assets per block, with fresh price caches
+        def block_of_loans(i):
+            return flash_loan_event(decoder, [TOKENS[(i + k) % 12] for k in range(3)], FIRST_BLOCK + i // 10)
+        yield 'loan_transaction 10 loans per block', loan_transaction.provide_handle_transaction(w3), block_of_loans
+        yield ('loan_transaction 10 loans per block batched',
+               loan_transaction.provide_handle_transaction(w3, batch=loan_transaction.BlockBatch()), block_of_loans)
+
+    governance = agents.get('governance')
+    if governance:
+        topics = [governance.proposal_executed_decoder.topic, encode_address(OTHER_CONTRACT)]
+        executed = create_transaction_event({
+            'receipt': {'logs': [{'topics': topics, 'data': encode_hex(eth_abi.encode_abi(['uint256'], [1])),
+                                  'address': governance.AAVE_GOVERNANCE_V2_MAINNET}]}})
+        yield 'governance ProposalExecuted', governance.handle_transaction, lambda _: executed
+        yield 'governance irrelevant tx', governance.handle_transaction, irrelevant_event
+
+    get_fallback_oracle = agents.get('get_fallback_oracle')
+    if get_fallback_oracle:
+        called = create_transaction_event({
+            'transaction': {'to': PRICE_ORACLE, 'data': get_fallback_oracle.get_fallback_oracle_decoder.selector}})
+        yield 'get_fallback_oracle call', get_fallback_oracle.handle_transaction, lambda _: called
+        yield 'get_fallback_oracle irrelevant tx', get_fallback_oracle.handle_transaction, irrelevant_event
+
+    price_deviates = agents.get('price_deviates')
+    if price_deviates:
+        # the concurrent client talks HTTP, the sequential path goes through the counting provider
+        # a scheduler with an interval of one block checks every token on every block
+        # every sweep has its own state store, so it does not resume from the last block of the previous one
+        full_sweep = price_deviates.BlockScheduler(price_deviates.tokens.tokens, 1)
+        yield (f'price_deviates {len(TOKENS)} token sweep',
+               price_deviates.provide_handle_block(w3, scheduler=full_sweep,
+                                                   state_store=price_deviates.StateStore(None, 'benchmark')),
+               lambda i: create_block_event({'block': {'number': FIRST_BLOCK + i}}))
+        yield ('price_deviates sharded sweep',
+               price_deviates.provide_handle_block(w3, state_store=price_deviates.StateStore(None, 'benchmark')),
+               lambda i: create_block_event({'block': {'number': FIRST_BLOCK + i}}))
+
+    exchange_rate_goes_down = agents.get('exchange_rate_goes_down')
+    if exchange_rate_goes_down:
+        yield ('exchange_rate_goes_down block', exchange_rate_goes_down.provide_handle_block(w3),
+               lambda i: create_block_event({'block': {'number': FIRST_BLOCK + i}}))
+        assets = exchange_rate_goes_down.tokens.addresses
+        rates = exchange_rate_goes_down.ExchangeRates(assets, exchange_rate_goes_down.all_pairs(assets))
+        yield (f'exchange_rate_goes_down {len(rates.pairs)} pairs block',
+               exchange_rate_goes_down.provide_handle_block(w3, rates=rates),
+               lambda i: create_block_event({'block': {'number': FIRST_BLOCK + i}}))
+
+
+def percentile(sorted_values, q):
+    return sorted_values[int(q * (len(sorted_values) - 1))]
+
+
+def run(handler, event_factory, provider, events):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):  # agents printing to stdout
+        return measure(handler, event_factory, provider, events)
+
+
+def measure(handler, event_factory, provider, events):
+    for i in range(-WARMUP_EVENTS, 0):
+        handler(event_factory(i))  # the blocks before the measured ones, the block handlers skip blocks seen before
+    prepared = [event_factory(i) for i in range(events)]
+    provider.calls.clear()
+    latencies = []
+    start = time.perf_counter()
+    for event in prepared:
+        event_start = time.perf_counter()
+        handler(event)
+        latencies.append(time.perf_counter() - event_start)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return events / elapsed, percentile(latencies, 0.5), percentile(latencies, 0.99), Counter(provider.calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the agents throughput against a counting fake provider')
+    parser.add_argument('--events', type=int, default=200, help='events per scenario')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every RPC request')
+    parser.add_argument('--agents', nargs='+', default=AGENTS, choices=AGENTS)
+    args = parser.parse_args()
+
+    provider = CountingProvider(args.latency)
+    w3 = Web3(provider)
+    agents = {agent_name: load_agent(agent_name, ROOT) for agent_name in args.agents}
+    for agent in agents.values():
+        if hasattr(agent, 'web3'):
+            agent.web3.provider = provider  # module level contracts, e.g. the LendingPoolAddressesProvider
+
+    print(f'{"scenario":<50}{"events/s":>10}{"p50, ms":>10}{"p99, ms":>10}{"rpc/event":>11}  rpc calls')
+    for name, handler, event_factory in scenarios(agents, w3):
+        events_per_second, p50, p99, calls = run(handler, event_factory, provider, args.events)
+        calls_per_event = sum(calls.values()) / args.events
+        breakdown = ', '.join(f'{method} {count / args.events:g}' for method, count in calls.most_common())
+        print(f'{name:<50}{events_per_second:>10.0f}{p50 * 1e3:>10.3f}{p99 * 1e3:>10.3f}{calls_per_event:>11.2f}'
+              f'  {breakdown}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,84 +1,121 @@
-from forta_agent import Finding, FindingType, FindingSeverity, get_json_rpc_url
+from forta_agent import Finding, FindingType, get_json_rpc_url
+from src.coalescer import Coalescer
 from src.constants import LendingPoolAddressesProvider, GET_ASSETS_PRICE_ABI
+from src.exchange_rates import ExchangeRates, SEVERITIES, all_pairs, severity_buckets
+from src.market import Market, WARMUP_TIMEOUT
+from src.metrics import Metrics, function_names
+from src.price_cache import PriceCache
+from src.state_store import StateStore
+from src.token_registry import TokenRegistry
 import json
+import os
 from web3 import Web3
 
-web3 = Web3(Web3.HTTPProvider(get_json_rpc_url()))
+RPC_TIMEOUT = 10  # seconds
+
 get_assets_price_abi = json.loads(GET_ASSETS_PRICE_ABI)
 
 TOKEN_1 = 'USDC'  # Specify first token name
 TOKEN_2 = 'DAI'  # Specify second token name
+PAIRS = [(TOKEN_1, TOKEN_2)]  # (first, second) token names of every watched exchange rate
+ALL_PAIRS = False  # watch the exchange rates of all the N × (N - 1) pairs of the market tokens instead of PAIRS
+STATE_PATH = os.environ.get('AAVE_STATE_PATH')  # SQLite file keeping the agent state across restarts, memory if not set
+COALESCE_BLOCKS = 300  # ~1 hour - the drops of a pair after its first finding are summarized once per window, 0 - off
 
-MARKET = 'MAIN'  # available options: MAIN, AMM
-NETWORK = 'MAINNET'  # There is only mainnet available at this moment
+MARKET = os.environ.get('AAVE_MARKET', 'MAIN')  # available options: MAIN, AMM
+NETWORK = os.environ.get('AAVE_NETWORK', 'MAINNET')  # There is only mainnet available at this moment
 LendingPoolAddressesProvider_address = LendingPoolAddressesProvider.get(MARKET + '_' + NETWORK)
 
-exchange_rate_history = [0]
-with open('./src/tokens.json', 'r') as tokens_file:
-    tokens = json.load(tokens_file)
+tokens = TokenRegistry.load('./src/tokens.json', MARKET)
 with open('./src/LendingPoolAddressesProvider.json', 'r') as abi_file:
     abi = json.load(abi_file)
 
+# every RPC call and handler invocation is counted and timed, see initialize() for the export
+metrics = Metrics('exchange_rate_goes_down', function_names(abi, get_assets_price_abi))
+web3 = metrics.instrument(Web3(Web3.HTTPProvider(get_json_rpc_url(), request_kwargs={'timeout': RPC_TIMEOUT})))
+
 # Always get the latest price oracle address by calling getPriceOracle() on the LendingPoolAddressesProvider contract.
 # © https://docs.aave.com/developers/the-core-protocol/price-oracle
-lpap_contract = web3.eth.contract(address=Web3.toChecksumAddress(LendingPoolAddressesProvider_address), abi=abi)
-price_oracle_address = lpap_contract.functions.getPriceOracle().call()
+# The address is resolved on first use or by initialize(), never at import, unless it is restored from the state store
+store = StateStore(STATE_PATH, f'exchange_rate_goes_down_{MARKET}_{NETWORK}')
+market = Market(web3, MARKET, NETWORK, LendingPoolAddressesProvider_address, abi, store)
+
+
+def create_exchange_rates():
+    # one price vector per block covers all the pairs: the tokens of the market, or the tokens of PAIRS
+    if ALL_PAIRS:
+        assets = tokens.addresses
+        return ExchangeRates(assets, all_pairs(assets))
+    pairs = [(tokens.by_symbol(first)['address'], tokens.by_symbol(second)['address']) for first, second in PAIRS]
+    assets = list(dict.fromkeys(asset for pair in pairs for asset in pair))
+    return ExchangeRates(assets, pairs)
+
 
-json_market = 'proto' if MARKET == 'MAIN' else 'amm'
-token_first = next((x for x in tokens[json_market] if x['symbol'] == TOKEN_1), None)
-token_second = next((x for x in tokens[json_market] if x['symbol'] == TOKEN_2), None)
-token_first_address = token_first['address']
-token_second_address = token_second['address']
+exchange_rates = create_exchange_rates()
+if store.get('exchange_rates') is not None:
+    exchange_rates.restore(store.get('exchange_rates'))  # the first block after a restart compares with the last one
+finding_coalescer = Coalescer(COALESCE_BLOCKS,
+                              ('1st_token', '2nd_token', '1st_token_address', '2nd_token_address', 'market'),
+                              'difference') if COALESCE_BLOCKS else None
 
 
-def get_severity(dif):
-    if dif < 0.02:
-        return FindingSeverity.Medium
-    elif 0.02 <= dif < 0.1:
-        return FindingSeverity.High
-    elif dif >= 0.1:
-        return FindingSeverity.Critical
-    else:
-        return FindingSeverity.Info
+def warmup():
+    # resolve the price oracle address before the first block, a slow RPC only delays it to the first block
+    market.warmup(['PriceOracle'], WARMUP_TIMEOUT)
 
 
-def provide_handle_block(w3):
+def initialize():
+    warmup()
+    metrics.export()
+
+
+def provide_handle_block(w3, price_cache=None, rates=None, coalescer=None, state_store=None):
+    # every block makes one getAssetsPrices() call however many pairs are watched, the last rates are checkpointed to
+    # the state store
+    price_cache = PriceCache() if price_cache is None else price_cache
+    rates = exchange_rates if rates is None else rates
+    coalescer = finding_coalescer if coalescer is None else coalescer
+    state_store = store if state_store is None else state_store
+
     def handle_block(block_event):
         findings = []
+        price_oracle_address = market.price_oracle
         price_oracle_contract = w3.eth.contract(address=Web3.toChecksumAddress(price_oracle_address),
                                                 abi=[get_assets_price_abi])
 
-        price1, price2 = price_oracle_contract.functions.getAssetsPrices(
-            assets=[token_first_address, token_second_address]).call(
-            block_identifier=int(block_event.block_number))
-
-        exchange_rate = price1 / price2
-
-        if exchange_rate < exchange_rate_history[-1]:
-            dif = exchange_rate_history[-1] - exchange_rate
+        prices = price_cache.get_assets_prices(price_oracle_contract, price_oracle_address, rates.assets,
+                                               int(block_event.block_number))
 
+        dropped, differences = rates.update(prices)
+        state_store.put('exchange_rates', rates.state())
+        for pair_index, dif, severity in zip(dropped, differences, severity_buckets(differences)):
+            token_first, token_second = (tokens.by_address(asset) for asset in rates.pairs[pair_index])
             findings.append(Finding({
                 'name': 'Aave Exchange Rate Down',
-                'description': f'{TOKEN_1}/{TOKEN_2} Exchange Rate Goes Down',
+                'description': f'{token_first["symbol"]}/{token_second["symbol"]} Exchange Rate Goes Down',
                 'alert_id': f'AAVE-EXR',
                 'type': FindingType.Info,
-                'severity': get_severity(dif),
+                'severity': SEVERITIES[severity],
                 'metadata': {
-                    'difference': dif,
-                    '1st_token': TOKEN_1,
-                    '2nd_token': TOKEN_2,
+                    'difference': float(dif),
+                    '1st_token': token_first['symbol'],
+                    '2nd_token': token_second['symbol'],
+                    '1st_token_address': token_first['address'],
+                    '2nd_token_address': token_second['address'],
                     'market': MARKET
                 }
             }))
 
-        exchange_rate_history.append(exchange_rate)
+        if coalescer is not None:
+            return coalescer.coalesce(findings, int(block_event.block_number))
         return findings
 
     return handle_block
 
 
-real_handle_block = provide_handle_block(web3)
+price_cache = PriceCache()
+real_handle_block = provide_handle_block(web3, price_cache)
 
 
 def handle_block(block_event):
-    return real_handle_block(block_event)
+    return metrics.call_handler('handle_block', real_handle_block, block_event)
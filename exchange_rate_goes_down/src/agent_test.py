@@ -1,5 +1,9 @@
+import pytest
 from forta_agent import FindingSeverity, FindingType, create_block_event
-from agent import provide_handle_block, MARKET, TOKEN_1, TOKEN_2
+
+import agent
+from agent import provide_handle_block, tokens, MARKET, TOKEN_1, TOKEN_2
+from src.exchange_rates import ExchangeRates, all_pairs
 
 
 class Web3Mock:
@@ -32,6 +36,31 @@ class FunctionsMock:
         return self.exchange_rate_1, self.exchange_rate_2
 
 
+class PriceVectorMock:
+    # getAssetsPrices() of any assets, counting the calls
+    def __init__(self, prices):
+        self.prices = prices
+        self.calls = 0
+        self.eth = self
+        self.functions = self
+
+    def contract(self, *args, **kwargs):
+        return self
+
+    def getAssetsPrices(self, assets):
+        self.assets = assets
+        return self
+
+    def call(self, **_):
+        self.calls += 1
+        return [self.prices.get(tokens.by_address(asset)['symbol'], 10) for asset in self.assets]
+
+
+@pytest.fixture(autouse=True)
+def reset_coalescer():
+    agent.finding_coalescer.windows.clear()  # every test starts with no open window
+
+
 class TestExchangeRateAgent:
     block_event = create_block_event({
         'block': {
@@ -97,3 +126,45 @@ class TestExchangeRateAgent:
             assert finding.metadata['2nd_token'] == TOKEN_2
             assert finding.metadata['difference'] == 9 / 10 - 5 / 10
             assert finding.metadata['market'] == MARKET
+
+    def test_watches_all_pairs_with_one_call_per_block(self):
+        assets = tokens.addresses
+        rates = ExchangeRates(assets, all_pairs(assets))
+        w3 = PriceVectorMock({'USDC': 9, 'DAI': 10})
+        handle_block = provide_handle_block(w3, rates=rates)
+        assert handle_block(create_block_event({'block': {'number': 1}})) == []
+        w3.prices['USDC'] = 8
+        findings = handle_block(create_block_event({'block': {'number': 2}}))
+
+        assert w3.calls == 2
+        # USDC goes down against every other token, 10 is the price of the tokens not set
+        assert len(findings) == len(assets) - 1
+        assert {finding.metadata['1st_token'] for finding in findings} == {'USDC'}
+        dai_finding = next(finding for finding in findings if finding.metadata['2nd_token'] == 'DAI')
+        assert dai_finding.description == 'USDC/DAI Exchange Rate Goes Down'
+        assert dai_finding.metadata['difference'] == 9 / 10 - 8 / 10
+        assert dai_finding.severity == FindingSeverity.High
+        assert dai_finding.metadata['1st_token_address'] == tokens.by_symbol('USDC')['address']
+
+    def test_coalesces_drops_of_a_pair(self):
+        w3 = PriceVectorMock({})
+        assets = tokens.addresses[:2]
+        handle_block = provide_handle_block(w3, rates=ExchangeRates(assets, [tuple(assets)]))
+        first_symbol, second_symbol = (token['symbol'] for token in tokens.tokens[:2])
+        findings_per_block = []
+        for block_number, price in enumerate([10, 9, 8, 8.5, 7], start=100):
+            w3.prices[first_symbol] = price
+            findings_per_block.append(handle_block(create_block_event({'block': {'number': block_number}})))
+
+        # the first drop is returned at once, and so is the escalation to a higher severity, the next ones within the
+        # window are summarized after it
+        assert [len(findings) for findings in findings_per_block] == [0, 1, 0, 0, 1]
+        assert findings_per_block[4][0].severity == FindingSeverity.Critical
+        findings = handle_block(create_block_event({'block': {'number': 101 + agent.COALESCE_BLOCKS}}))
+        assert [finding.alert_id for finding in findings] == ['AAVE-EXR-SUMMARY']
+        summary = findings[0]
+        assert summary.metadata['1st_token'] == first_symbol
+        assert summary.metadata['2nd_token'] == second_symbol
+        assert summary.metadata['count'] == 3
+        assert (summary.metadata['first_block'], summary.metadata['last_block']) == (101, 104)
+        assert summary.severity == FindingSeverity.Critical
@@ -0,0 +1,86 @@
+from forta_agent import Finding
+
+
+class Window:
+    # the findings of one (alert_id, key) folded together since the first one, which was returned as it is
+    def __init__(self, finding, value, block_number):
+        self.finding = finding
+        self.first_block = block_number
+        self.last_block = block_number
+        self.count = 1
+        self.returned = 1  # the findings returned as they are: the first one and the escalations
+        self.min = self.max = self.cumulative = value
+        self.severity = finding.severity
+        self.returned_severity = finding.severity
+
+    def add(self, finding, value, block_number):
+        self.last_block = block_number
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.cumulative += value
+        self.severity = max(self.severity, finding.severity)
+
+
+class Coalescer:
+    # bounds the findings of every (alert_id, key) per window_blocks: the first finding of a window is returned at
+    # once, and so is every later one of a higher severity than all those returned in the window, so an escalation is
+    # never held back. The others are folded into a summary finding returned once the window is over, with the count
+    # and the min, max and cumulative of the value_field of all the findings of the window
+    def __init__(self, window_blocks, key_fields, value_field):
+        self.window_blocks = window_blocks
+        self.key_fields = key_fields
+        self.value_field = value_field
+        self.windows = {}
+
+    def key(self, finding):
+        return (finding.alert_id,) + tuple(finding.metadata.get(field) for field in self.key_fields)
+
+    def coalesce(self, findings, block_number):
+        # the findings to return for block_number: the summaries of the windows over, then the first findings of
+        # the new windows
+        coalesced = self.flush(block_number)
+        for finding in findings:
+            key = self.key(finding)
+            value = finding.metadata[self.value_field]
+            window = self.windows.get(key)
+            if window is None:
+                self.windows[key] = Window(finding, value, block_number)
+                coalesced.append(finding)
+                continue
+            window.add(finding, value, block_number)
+            if finding.severity > window.returned_severity:
+                window.returned += 1
+                window.returned_severity = finding.severity
+                coalesced.append(finding)
+        return coalesced
+
+    def flush(self, block_number=None):
+        # summaries of the windows starting window_blocks or more before block_number, of all of them with None
+        summaries = []
+        for key, window in list(self.windows.items()):
+            if block_number is None or block_number - window.first_block >= self.window_blocks:
+                del self.windows[key]
+                if window.count > window.returned:
+                    summaries.append(self.summarize(window))
+        return summaries
+
+    def summarize(self, window):
+        finding = window.finding
+        return Finding({
+            'name': f'{finding.name} Summary',
+            'description': f'{finding.description} {window.count} times in blocks {window.first_block}-'
+                           f'{window.last_block}',
+            'alert_id': f'{finding.alert_id}-SUMMARY',
+            'type': finding.type,
+            'severity': window.severity,
+            'metadata': {
+                **{field: finding.metadata.get(field) for field in self.key_fields},
+                'count': window.count,
+                'first_block': window.first_block,
+                'last_block': window.last_block,
+                f'min_{self.value_field}': window.min,
+                f'max_{self.value_field}': window.max,
+                f'cumulative_{self.value_field}': window.cumulative,
+            }
+        })
@@ -0,0 +1,70 @@
+from forta_agent import Finding, FindingSeverity, FindingType
+
+from src.coalescer import Coalescer
+
+
+def create_finding(pair, difference, severity=FindingSeverity.Medium):
+    return Finding({'name': 'Aave Exchange Rate Down', 'description': f'{pair} Exchange Rate Goes Down',
+                    'alert_id': 'AAVE-EXR', 'type': FindingType.Info, 'severity': severity,
+                    'metadata': {'pair': pair, 'difference': difference}})
+
+
+class TestCoalescer:
+    def test_returns_first_finding_of_every_key(self):
+        coalescer = Coalescer(10, ('pair',), 'difference')
+        usdc_dai, dai_usdc = create_finding('USDC/DAI', 0.01), create_finding('DAI/USDC', 0.01)
+
+        assert coalescer.coalesce([usdc_dai, dai_usdc], 100) == [usdc_dai, dai_usdc]
+        assert coalescer.coalesce([create_finding('USDC/DAI', 0.02)], 101) == []
+
+    def test_summarizes_window_once_over(self):
+        coalescer = Coalescer(10, ('pair',), 'difference')
+        coalescer.coalesce([create_finding('USDC/DAI', 0.01)], 100)
+        coalescer.coalesce([create_finding('USDC/DAI', 0.03, FindingSeverity.High)], 102)
+        coalescer.coalesce([create_finding('USDC/DAI', 0.02)], 109)
+        assert coalescer.coalesce([], 109) == []
+
+        summary, = coalescer.coalesce([], 110)
+        assert summary.alert_id == 'AAVE-EXR-SUMMARY'
+        assert summary.severity == FindingSeverity.High
+        assert summary.metadata == {'pair': 'USDC/DAI', 'count': 3, 'first_block': 100, 'last_block': 109,
+                                    'min_difference': 0.01, 'max_difference': 0.03,
+                                    'cumulative_difference': 0.01 + 0.03 + 0.02}
+        # a new window starts with the next finding
+        finding = create_finding('USDC/DAI', 0.01)
+        assert coalescer.coalesce([finding], 111) == [finding]
+
+    def test_returns_escalation_at_once(self):
+        coalescer = Coalescer(300, ('pair',), 'difference')
+        coalescer.coalesce([create_finding('USDC/DAI', 0.01)], 0)
+
+        critical = create_finding('USDC/DAI', 0.5, FindingSeverity.Critical)
+        assert coalescer.coalesce([critical], 1) == [critical]
+        # no escalation beyond the highest severity returned in the window
+        assert coalescer.coalesce([create_finding('USDC/DAI', 0.03, FindingSeverity.High)], 2) == []
+        assert coalescer.coalesce([create_finding('USDC/DAI', 0.4, FindingSeverity.Critical)], 3) == []
+        summary, = coalescer.flush()
+        assert summary.metadata['count'] == 4
+
+    def test_does_not_summarize_returned_findings_only(self):
+        coalescer = Coalescer(10, ('pair',), 'difference')
+        coalescer.coalesce([create_finding('USDC/DAI', 0.01)], 100)
+        coalescer.coalesce([create_finding('USDC/DAI', 0.03, FindingSeverity.High)], 101)
+
+        assert coalescer.coalesce([], 110) == []
+
+    def test_does_not_summarize_single_finding(self):
+        coalescer = Coalescer(10, ('pair',), 'difference')
+        coalescer.coalesce([create_finding('USDC/DAI', 0.01)], 100)
+
+        assert coalescer.coalesce([], 200) == []
+        assert coalescer.windows == {}
+
+    def test_bounds_findings_per_window(self):
+        coalescer = Coalescer(100, ('pair',), 'difference')
+        findings = []
+        for block_number in range(1000):
+            findings.extend(coalescer.coalesce([create_finding('USDC/DAI', 0.001)], block_number))
+        findings.extend(coalescer.flush())
+
+        assert len(findings) == 2 * 10
@@ -0,0 +1,63 @@
+import numpy as np
+from forta_agent import FindingSeverity
+
+SEVERITIES = [FindingSeverity.Medium, FindingSeverity.High, FindingSeverity.Critical]
+SEVERITY_THRESHOLDS = [0.02, 0.1]  # exchange rate drops from which the High and Critical severities start
+
+
+def all_pairs(assets):
+    # every ordered pair of different assets, N × (N - 1) of them
+    return [(first, second) for first in assets for second in assets if first != second]
+
+
+def severity_buckets(differences):
+    # index into SEVERITIES of every exchange rate drop
+    return np.digitize(differences, SEVERITY_THRESHOLDS)
+
+
+class ExchangeRates:
+    # the exchange rates of any number of pairs computed from one price vector per block, rate = first / second.
+    # Only the last rate of every pair is kept, so the memory is one float per pair however long the agent runs
+    def __init__(self, assets, pairs):
+        self.assets = list(assets)  # the order of the prices passed to update()
+        index = {asset: i for i, asset in enumerate(self.assets)}
+        self.pairs = list(pairs)
+        self.first = np.array([index[first] for first, _ in self.pairs], dtype=np.intp)
+        self.second = np.array([index[second] for _, second in self.pairs], dtype=np.intp)
+        self.last_rates = np.full(len(self.pairs), np.nan)
+
+    def rates(self, prices):
+        # a pair with a zero price gets nan, so it never fires
+        prices = np.asarray(prices, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = prices[self.first] / prices[self.second]
+        rates[(prices[self.first] == 0) | (prices[self.second] == 0)] = np.nan
+        return rates
+
+    def last(self):
+        return self.last_rates
+
+    def append(self, rates):
+        rates = np.asarray(rates, dtype=np.float64)
+        valid = ~np.isnan(rates)
+        self.last_rates = np.where(valid, rates, self.last_rates)  # a pair with a zero price keeps its last rate
+
+    def state(self):
+        # the last rates by pair, what the next rates are compared with after a restart
+        return {'pairs': [list(pair) for pair in self.pairs], 'rates': self.last().tolist()}
+
+    def restore(self, state):
+        # the pairs no longer watched are dropped, the new ones start from their next rates
+        last = dict(zip(map(tuple, state['pairs']), state['rates']))
+        self.last_rates = np.array([last.get(pair, np.nan) for pair in self.pairs], dtype=np.float64)
+
+    def update(self, prices):
+        # appends the rates of prices and returns the pairs whose rate went down since their last rate:
+        # (their indices into pairs, how much their rates dropped)
+        rates = self.rates(prices)
+        last = self.last()
+        with np.errstate(invalid='ignore'):
+            dropped = np.nonzero(rates < last)[0]
+        differences = last[dropped] - rates[dropped]
+        self.append(rates)
+        return dropped, differences
@@ -0,0 +1,75 @@
+import math
+
+from forta_agent import FindingSeverity
+
+from src.exchange_rates import ExchangeRates, SEVERITIES, all_pairs, severity_buckets
+
+ASSETS = ['USDC', 'DAI', 'WETH']
+
+
+class TestExchangeRates:
+    def test_computes_rates_of_the_pairs(self):
+        exchange_rates = ExchangeRates(ASSETS, [('USDC', 'DAI'), ('WETH', 'USDC')])
+
+        assert exchange_rates.rates([8, 10, 4000]).tolist() == [8 / 10, 4000 / 8]
+
+    def test_all_pairs(self):
+        pairs = all_pairs(ASSETS)
+        exchange_rates = ExchangeRates(ASSETS, pairs)
+
+        assert len(pairs) == 6 and ('USDC', 'USDC') not in pairs
+        rates = dict(zip(pairs, exchange_rates.rates([8, 10, 4000])))
+        assert rates[('DAI', 'WETH')] == 10 / 4000
+        assert rates[('WETH', 'DAI')] == 4000 / 10
+
+    def test_returns_dropped_rates(self):
+        exchange_rates = ExchangeRates(ASSETS, all_pairs(ASSETS))
+
+        dropped, differences = exchange_rates.update([9, 10, 4000])
+        assert len(dropped) == 0  # nothing to compare the first rates with
+        dropped, differences = exchange_rates.update([8, 10, 4000])
+
+        assert [exchange_rates.pairs[i] for i in dropped] == [('USDC', 'DAI'), ('USDC', 'WETH')]
+        assert differences.tolist() == [9 / 10 - 8 / 10, 9 / 4000 - 8 / 4000]
+        assert [SEVERITIES[bucket] for bucket in severity_buckets(differences)] == [FindingSeverity.High,
+                                                                                    FindingSeverity.Medium]
+
+    def test_ignores_zero_prices(self):
+        exchange_rates = ExchangeRates(ASSETS, [('USDC', 'DAI'), ('DAI', 'USDC')])
+
+        exchange_rates.update([9, 10, 4000])
+        assert all(math.isnan(rate) for rate in exchange_rates.rates([9, 0, 4000]))
+        dropped, _ = exchange_rates.update([9, 0, 4000])
+        assert len(dropped) == 0
+
+    def test_keeps_last_rates(self):
+        exchange_rates = ExchangeRates(ASSETS, [('USDC', 'DAI'), ('DAI', 'USDC')])
+        exchange_rates.update([8, 10, 4000])
+        exchange_rates.update([9, 10, 4000])
+
+        assert exchange_rates.last().tolist() == [0.9, 10 / 9]
+        # a zero price leaves the last rates of its pairs as they are
+        exchange_rates.update([9, 0, 4000])
+        assert exchange_rates.last().tolist() == [0.9, 10 / 9]
+
+    def test_returns_rates_dropped_across_zero_prices(self):
+        exchange_rates = ExchangeRates(ASSETS, [('USDC', 'DAI')])
+        exchange_rates.update([9, 10, 4000])
+        exchange_rates.update([9, 0, 4000])
+
+        dropped, differences = exchange_rates.update([8, 10, 4000])
+        assert dropped.tolist() == [0]
+        assert differences.tolist() == [9 / 10 - 8 / 10]
+
+    def test_restores_last_rates(self):
+        exchange_rates = ExchangeRates(ASSETS, [('USDC', 'DAI'), ('DAI', 'USDC')])
+        exchange_rates.update([9, 10, 4000])
+        state = exchange_rates.state()
+
+        # after a restart watching one more pair, the first block is compared with the last one before it
+        restarted = ExchangeRates(ASSETS, [('USDC', 'DAI'), ('WETH', 'USDC')])
+        restarted.restore(state)
+        dropped, differences = restarted.update([8, 10, 4000])
+
+        assert [restarted.pairs[i] for i in dropped] == [('USDC', 'DAI')]
+        assert differences.tolist() == [9 / 10 - 8 / 10]
@@ -0,0 +1,121 @@
+import json
+import threading
+
+from web3 import Web3
+
+from src.constants import ERC20_DECIMALS_ABI, ERC20_SYMBOL_ABI, GET_RESERVE_DATA_ABI, GET_RESERVES_LIST_ABI
+
+REFRESH_BLOCKS = 7200  # ~1 day - blocks between two getReservesList() calls
+
+lending_pool_abi = [json.loads(GET_RESERVES_LIST_ABI), json.loads(GET_RESERVE_DATA_ABI)]
+erc20_abi = [json.loads(ERC20_DECIMALS_ABI), json.loads(ERC20_SYMBOL_ABI)]
+
+
+def market_key(market):
+    # tokens.json keys the markets by the Aave UI names
+    return 'proto' if market == 'MAIN' else 'amm'
+
+
+class TokenRegistry:
+    # the reserves of one market from tokens.json, indexed by address, symbol and aToken symbol. The addresses are
+    # checksummed once at load, the indexes are keyed by the lower case address so any casing finds the token.
+    # refresh() adds the reserves listed by the LendingPool since tokens.json was written.
+    def __init__(self, token_list, refresh_blocks=REFRESH_BLOCKS):
+        self.tokens = []
+        self._by_address = {}
+        self._by_symbol = {}
+        self._by_atoken_symbol = {}
+        self._lock = threading.Lock()
+        self.refresh_blocks = refresh_blocks
+        self.next_refresh_block = None
+        for token in token_list:
+            self.add(token)
+
+    @classmethod
+    def load(cls, path, market, refresh_blocks=REFRESH_BLOCKS):
+        with open(path, 'r') as tokens_file:
+            return cls(json.load(tokens_file)[market_key(market)], refresh_blocks)
+
+    def add(self, token):
+        token = dict(token, address=Web3.toChecksumAddress(token['address']))
+        if token.get('aTokenAddress'):
+            token['aTokenAddress'] = Web3.toChecksumAddress(token['aTokenAddress'])
+        # the list is replaced rather than appended to, so a refresh never changes a list being iterated
+        self.tokens = self.tokens + [token]
+        self._by_address[token['address'].lower()] = token
+        self._by_symbol[token['symbol']] = token
+        if token.get('aTokenSymbol'):
+            self._by_atoken_symbol[token['aTokenSymbol']] = token
+        return token
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __contains__(self, address):
+        return address.lower() in self._by_address
+
+    def by_address(self, address):
+        return self._by_address.get(address.lower())
+
+    def by_symbol(self, symbol):
+        return self._by_symbol.get(symbol)
+
+    def by_atoken_symbol(self, atoken_symbol):
+        return self._by_atoken_symbol.get(atoken_symbol)
+
+    @property
+    def addresses(self):
+        return [token['address'] for token in self.tokens]
+
+    def refresh(self, w3, lending_pool_address, block_identifier='latest'):
+        # only the reserves missing from the registry are looked up, a few calls each, once
+        lending_pool = w3.eth.contract(address=Web3.toChecksumAddress(lending_pool_address), abi=lending_pool_abi)
+        added = []
+        with self._lock:
+            for address in lending_pool.functions.getReservesList().call(block_identifier=block_identifier):
+                if address not in self:
+                    reserve = lending_pool.functions.getReserveData(address).call(block_identifier=block_identifier)
+                    added.append(self.add(read_token(w3, address, reserve, block_identifier)))
+        return added
+
+    def refresh_if_due(self, w3, get_lending_pool_address, block_number):
+        # called on every event, refreshes every refresh_blocks blocks starting one interval after the first call,
+        # a failed refresh is only retried at the next interval. get_lending_pool_address is only called when due.
+        if self.next_refresh_block is None:
+            self.next_refresh_block = block_number + self.refresh_blocks
+        if block_number < self.next_refresh_block:
+            return []
+        self.next_refresh_block = block_number + self.refresh_blocks
+        try:
+            return self.refresh(w3, get_lending_pool_address())
+        except Exception as error:
+            print(f'token registry is not refreshed: {error}')
+            return []
+
+
+def read_symbol(w3, address, block_identifier):
+    # a few tokens (e.g. MKR) return the symbol as bytes32 instead of a string
+    try:
+        return w3.eth.contract(address=address, abi=erc20_abi).functions.symbol().call(
+            block_identifier=block_identifier)
+    except Exception:
+        result = w3.eth.call({'to': address, 'data': Web3.keccak(text='symbol()')[:4].hex()}, block_identifier)
+        return bytes(result[:32]).rstrip(b'\0').decode('utf-8', 'replace')
+
+
+def read_token(w3, address, reserve, block_identifier='latest'):
+    # reserve is the getReserveData() tuple: aToken, stable and variable debt token at 7, 8 and 9
+    decimals = w3.eth.contract(address=address, abi=erc20_abi).functions.decimals().call(
+        block_identifier=block_identifier)
+    return {
+        'aTokenAddress': reserve[7],
+        'aTokenSymbol': read_symbol(w3, Web3.toChecksumAddress(reserve[7]), block_identifier),
+        'stableDebtTokenAddress': reserve[8],
+        'variableDebtTokenAddress': reserve[9],
+        'symbol': read_symbol(w3, address, block_identifier),
+        'address': address,
+        'decimals': decimals,
+    }
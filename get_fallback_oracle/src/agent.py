@@ -1,27 +1,85 @@
 import json
+import os
 import forta_agent
 from web3 import Web3
-from src.constants import GET_FALLBACK_ORACLE, LendingPoolAddressesProvider
+from src.constants import GET_FALLBACK_ORACLE, LendingPoolAddressesProvider, PRICE_ORACLE_UPDATED_ABI
+from src.decoders import EventDecoder, FunctionDecoder, filter_function, filter_log
+from src.market import Market, WARMUP_TIMEOUT
+from src.metrics import Metrics, function_names
+from src.prefilter import Prefilter
+from src.state_store import StateStore
 from forta_agent import Finding, FindingType, FindingSeverity, get_json_rpc_url
 
-MARKET = 'MAIN'  # available options: MAIN, AMM
-NETWORK = 'MAINNET'  # Specify your network here
+MARKET = os.environ.get('AAVE_MARKET', 'MAIN')  # available options: MAIN, AMM
+NETWORK = os.environ.get('AAVE_NETWORK', 'MAINNET')  # There is only mainnet available at this moment
+RPC_TIMEOUT = 10  # seconds
+STATE_PATH = os.environ.get('AAVE_STATE_PATH')  # SQLite file keeping the agent state across restarts, memory if not set
 LendingPoolAddressesProvider_address = LendingPoolAddressesProvider.get(MARKET + '_' + NETWORK)
 
-web3 = Web3(Web3.HTTPProvider(get_json_rpc_url()))
 with open('./src/LendingPoolAddressesProvider.json', 'r') as abi_file:
     abi = json.load(abi_file)
 
+# every RPC call and handler invocation is counted and timed, see initialize() for the export
+metrics = Metrics('get_fallback_oracle', function_names(abi))
+web3 = metrics.instrument(Web3(Web3.HTTPProvider(get_json_rpc_url(), request_kwargs={'timeout': RPC_TIMEOUT})))
 
-def handle_transaction(transaction_event: forta_agent.transaction_event.TransactionEvent):
+# get actual PriceOracle contract address from the LendingPoolAddressesProvider using getPriceOracle ABI on first use
+# or in initialize() unless it is restored from the state store, afterwards it is only refreshed when the
+# LendingPoolAddressesProvider emits PriceOracleUpdated
+store = StateStore(STATE_PATH, f'get_fallback_oracle_{MARKET}_{NETWORK}')
+market = Market(web3, MARKET, NETWORK, LendingPoolAddressesProvider_address, abi, store)
+
+get_fallback_oracle_decoder = FunctionDecoder(GET_FALLBACK_ORACLE)
+price_oracle_updated_decoder = EventDecoder(PRICE_ORACLE_UPDATED_ABI)
+
+# only transactions calling getFallbackOracle() or updating the PriceOracle address are decoded
+prefilter = Prefilter()
+prefilter.watch_event(LendingPoolAddressesProvider_address, price_oracle_updated_decoder.topic)
+
+
+def watch_price_oracle():
+    # the PriceOracle address is only known once the market is resolved
+    if not prefilter.functions:
+        prefilter.watch_function(market.price_oracle, get_fallback_oracle_decoder.selector)
+
+
+def set_price_oracle_address(address):
+    if market.is_resolved(['PriceOracle']):
+        prefilter.unwatch(market.price_oracle)
+    market.set_address('PriceOracle', address)
+    prefilter.watch_function(address, get_fallback_oracle_decoder.selector)
+
+
+def warmup():
+    # resolve the address before the first transaction, a slow RPC only delays it to the first transaction
+    if market.warmup(['PriceOracle'], WARMUP_TIMEOUT, lambda _, address: set_price_oracle_address(address)):
+        watch_price_oracle()
+
+
+def initialize():
+    warmup()
+    metrics.export()
+
+
+def update_price_oracle_address(transaction_event: forta_agent.transaction_event.TransactionEvent):
+    if not prefilter.matches_event(transaction_event):
+        return
+    # the new PriceOracle address is the indexed argument of the event, so no RPC call is needed
+    events = filter_log(transaction_event, price_oracle_updated_decoder, LendingPoolAddressesProvider_address)
+    for event in events:
+        set_price_oracle_address(event['args']['newAddress'])
+
+
+def real_handle_transaction(transaction_event: forta_agent.transaction_event.TransactionEvent):
     findings = []
+    update_price_oracle_address(transaction_event)
+    watch_price_oracle()
+    if not prefilter.matches_function(transaction_event):
+        return findings
 
-    # get LendingPoolAddressesProvider contract address in the specified network
-    contract = web3.eth.contract(address=Web3.toChecksumAddress(LendingPoolAddressesProvider_address), abi=abi)
-    # get actual PriceOracle contract address from the LendingPoolAddressesProvider using getPriceOracle ABI
-    price_oracle_address = contract.functions.getPriceOracle().call()
+    price_oracle_address = market.price_oracle
     # filter transaction events where GetFallbackOracle was called with PriceOracle address
-    oracle_calls = transaction_event.filter_function(GET_FALLBACK_ORACLE, price_oracle_address)
+    oracle_calls = filter_function(transaction_event, get_fallback_oracle_decoder, price_oracle_address)
 
     if oracle_calls:
         findings.append(Finding({
@@ -32,8 +90,13 @@ def handle_transaction(transaction_event: forta_agent.transaction_event.Transact
             'severity': FindingSeverity.Medium,
             'metadata': {
                 'tx_hash': transaction_event.hash,
-                'price_oracle': price_oracle_address
+                'price_oracle': price_oracle_address,
+                'market': MARKET
             }
         }))
 
     return findings
+
+
+def handle_transaction(transaction_event):
+    return metrics.call_handler('handle_transaction', real_handle_transaction, transaction_event)
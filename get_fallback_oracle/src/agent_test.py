@@ -1,9 +1,11 @@
 import json
-from eth_utils import encode_hex, function_abi_to_4byte_selector
+import eth_abi
+from eth_utils import encode_hex, event_abi_to_log_topic, function_abi_to_4byte_selector
 from forta_agent import create_transaction_event, get_json_rpc_url
 from web3 import Web3
+import agent
 from agent import handle_transaction
-from src.constants import LendingPoolAddressesProvider, GET_FALLBACK_ORACLE
+from src.constants import LendingPoolAddressesProvider, GET_FALLBACK_ORACLE, PRICE_ORACLE_UPDATED_ABI
 
 MARKET = 'MAIN'  # available options: MAIN, AMM
 NETWORK = 'MAINNET'  # Specify your network here
@@ -51,3 +53,28 @@ class TestFallbackOracleAgent:
         })
         findings = handle_transaction(tx_event)
         assert len(findings) == 0
+
+    def test_follows_price_oracle_updated_event(self):
+        initial_price_oracle_address = agent.market.price_oracle
+        new_price_oracle_address = "0x1010101010101010101010101010101010101010"
+        topics = [event_abi_to_log_topic(json.loads(PRICE_ORACLE_UPDATED_ABI)),
+                  eth_abi.encode_abi(["address"], [new_price_oracle_address])]
+        data = encode_hex(function_abi_to_4byte_selector(json.loads(GET_FALLBACK_ORACLE)))
+
+        try:
+            handle_transaction(create_transaction_event({
+                'receipt': {
+                    'logs': [
+                        {'topics': topics,
+                         'data': "0x",
+                         'address': LendingPoolAddressesProvider_address}, ]},
+            }))
+            findings = handle_transaction(create_transaction_event({
+                'transaction': {
+                    'to': new_price_oracle_address,
+                    'data': data}
+            }))
+            assert len(findings) == 1
+            assert findings[0].metadata['price_oracle'].lower() == new_price_oracle_address
+        finally:
+            agent.set_price_oracle_address(initial_price_oracle_address)
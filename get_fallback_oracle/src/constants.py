@@ -19,3 +19,18 @@ LendingPoolAddressesProvider = {
     'AMM_MAINNET': "0xAcc030EF66f9dFEAE9CbB0cd1B25654b82cFA8d5",
     # 'AMM_KOVAN': "0x67FB118A780fD740C8936511947cC4bE7bb7730c",
 }
+
+PRICE_ORACLE_UPDATED_ABI = """
+  {
+    "anonymous": false,
+    "inputs": [
+      {
+        "indexed": true,
+        "internalType": "address",
+        "name": "newAddress",
+        "type": "address"
+      }
+    ],
+    "name": "PriceOracleUpdated",
+    "type": "event"
+  }"""
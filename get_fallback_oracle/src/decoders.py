@@ -0,0 +1,148 @@
+import json
+
+from eth_abi.decoding import ContextFramesBytesIO, TupleDecoder
+from eth_abi.exceptions import DecodingError
+from eth_abi.registry import registry
+from eth_utils import decode_hex, encode_hex, event_abi_to_log_topic, function_abi_to_4byte_selector, \
+    to_checksum_address
+from eth_utils.abi import collapse_if_tuple
+
+
+def to_bytes(value):
+    # transaction data and log topics come either as hex strings or as bytes
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    return decode_hex(value) if value else b''
+
+
+def is_hashed_when_indexed(abi_type):
+    # indexed strings, bytes, arrays and structs are stored in the topic as their keccak hash
+    return abi_type in ('string', 'bytes') or abi_type.endswith(']') or abi_type.startswith('(')
+
+
+def normalize(abi_type, value):
+    # return arrays as lists and addresses checksummed like web3 does
+    if abi_type.endswith(']'):
+        return [normalize(abi_type[:abi_type.rindex('[')], item) for item in value]
+    if abi_type == 'address':
+        return to_checksum_address(value)
+    return value
+
+
+class FunctionDecoder:
+    # parses a function ABI once and decodes call data for it without building a web3 contract
+    def __init__(self, abi):
+        self.abi = json.loads(abi) if isinstance(abi, str) else abi
+        self.name = self.abi['name']
+        self.selector_bytes = function_abi_to_4byte_selector(self.abi)
+        self.selector = encode_hex(self.selector_bytes)
+        self.names = [abi_input['name'] for abi_input in self.abi['inputs']]
+        self.types = [collapse_if_tuple(abi_input) for abi_input in self.abi['inputs']]
+        self.decoder = TupleDecoder(decoders=[registry.get_decoder(abi_type) for abi_type in self.types])
+
+    def decode(self, data):
+        data = to_bytes(data)
+        if data[:4] != self.selector_bytes:
+            return None
+        try:
+            values = self.decoder(ContextFramesBytesIO(data[4:]))
+        except DecodingError:
+            return None
+        return {name: normalize(abi_type, value) for name, abi_type, value in zip(self.names, self.types, values)}
+
+
+class EventDecoder:
+    # parses an event ABI once and decodes logs for it without building a web3 contract
+    def __init__(self, abi):
+        self.abi = json.loads(abi) if isinstance(abi, str) else abi
+        self.name = self.abi['name']
+        self.topic_bytes = event_abi_to_log_topic(self.abi)
+        self.topic = encode_hex(self.topic_bytes)
+        indexed = [abi_input for abi_input in self.abi['inputs'] if abi_input['indexed']]
+        not_indexed = [abi_input for abi_input in self.abi['inputs'] if not abi_input['indexed']]
+        self.indexed_names = [abi_input['name'] for abi_input in indexed]
+        self.indexed_types = [collapse_if_tuple(abi_input) for abi_input in indexed]
+        self.indexed_decoders = [None if is_hashed_when_indexed(abi_type) else registry.get_decoder(abi_type)
+                                 for abi_type in self.indexed_types]
+        self.data_names = [abi_input['name'] for abi_input in not_indexed]
+        self.data_types = [collapse_if_tuple(abi_input) for abi_input in not_indexed]
+        self.data_decoder = TupleDecoder(decoders=[registry.get_decoder(abi_type) for abi_type in self.data_types])
+
+    def decode(self, log):
+        topics = [to_bytes(topic) for topic in log.topics]
+        if not topics or topics[0] != self.topic_bytes or len(topics) != len(self.indexed_names) + 1:
+            return None
+        args = {}
+        try:
+            for name, abi_type, decoder, topic in zip(self.indexed_names, self.indexed_types, self.indexed_decoders,
+                                                      topics[1:]):
+                args[name] = normalize(abi_type, decoder(ContextFramesBytesIO(topic))) if decoder else topic
+            values = self.data_decoder(ContextFramesBytesIO(to_bytes(log.data)))
+        except DecodingError:
+            return None
+        for name, abi_type, value in zip(self.data_names, self.data_types, values):
+            args[name] = normalize(abi_type, value)
+        return {
+            'event': self.name,
+            'args': args,
+            'address': log.address,
+            'log_index': log.log_index,
+            'transaction_hash': log.transaction_hash,
+            'block_number': log.block_number,
+        }
+
+
+def filter_function(transaction_event, decoders, contract_address=''):
+    # same as TransactionEvent.filter_function() but with precompiled decoders
+    decoders = decoders if isinstance(decoders, list) else [decoders]
+    sources = [(transaction_event.transaction.to, transaction_event.transaction.data)]
+    if transaction_event.traces:
+        sources = [(trace.action.to, trace.action.input) for trace in transaction_event.traces]
+    if contract_address:
+        contract_address = contract_address.lower()
+        sources = [(to, data) for to, data in sources if to and to.lower() == contract_address]
+    results = []
+    for to, data in sources:
+        for decoder in decoders:
+            args = decoder.decode(data)
+            if args is not None:
+                results.append((decoder.name, args))
+                break
+    return results
+
+
+def filter_log(transaction_event, decoders, contract_address=''):
+    # same as TransactionEvent.filter_log() but with precompiled decoders
+    decoders = decoders if isinstance(decoders, list) else [decoders]
+    logs = transaction_event.logs
+    if contract_address:
+        contract_address = contract_address.lower()
+        logs = [log for log in logs if log.address and log.address.lower() == contract_address]
+    results = []
+    for log in logs:
+        for decoder in decoders:
+            event = decoder.decode(log)
+            if event is not None:
+                results.append(event)
+                break
+    return results
+
+
+def index_by_topic(decoders):
+    return {decoder.topic_bytes: decoder for decoder in decoders}
+
+
+def filter_log_by_topic(transaction_event, decoders_by_topic, contract_address=''):
+    # same as filter_log() for any number of events in one pass: the decoder of a log is looked up by its topic0
+    # in decoders_by_topic, see index_by_topic(), instead of every decoder being tried in turn
+    logs = transaction_event.logs
+    if contract_address:
+        contract_address = contract_address.lower()
+        logs = [log for log in logs if log.address and log.address.lower() == contract_address]
+    results = []
+    for log in logs:
+        decoder = decoders_by_topic.get(to_bytes(log.topics[0])) if log.topics else None
+        event = decoder.decode(log) if decoder else None
+        if event is not None:
+            results.append(event)
+    return results
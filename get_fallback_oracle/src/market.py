@@ -0,0 +1,75 @@
+import threading
+
+from web3 import Web3
+
+WARMUP_TIMEOUT = 10  # seconds to wait for the addresses at startup
+
+
+class Market:
+    # Aave market addresses resolved lazily through the LendingPoolAddressesProvider, so that importing an agent does
+    # not make any RPC calls. warmup() resolves them ahead of the first event but never blocks startup for longer
+    # than its timeout. With a store the addresses of the last run are used at once after a restart.
+    def __init__(self, w3, name, network, provider_address, provider_abi, store=None):
+        self.name = name
+        self.network = network
+        self.provider_address = provider_address
+        self.provider_contract = w3.eth.contract(address=Web3.toChecksumAddress(provider_address), abi=provider_abi)
+        self.store = store
+        self._addresses = store.get('addresses', {}) if store is not None else {}
+        self._restored = set(self._addresses)  # not read from the LendingPoolAddressesProvider by this run yet
+        self._lock = threading.Lock()
+
+    def get_address(self, name):
+        # name is the LendingPoolAddressesProvider getter without 'get', e.g. 'PriceOracle' for getPriceOracle()
+        address = self._addresses.get(name)
+        if address is None:
+            with self._lock:
+                address = self._addresses.get(name)
+                if address is None:
+                    address = self.read_address(name)
+                    self.set_address(name, address)
+        return address
+
+    def read_address(self, name):
+        return getattr(self.provider_contract.functions, 'get' + name)().call()
+
+    def set_address(self, name, address):
+        self._addresses[name] = address
+        self._restored.discard(name)
+        if self.store is not None:
+            self.store.put('addresses', dict(self._addresses))
+
+    @property
+    def price_oracle(self):
+        return self.get_address('PriceOracle')
+
+    @property
+    def lending_pool(self):
+        return self.get_address('LendingPool')
+
+    def is_resolved(self, names):
+        return all(name in self._addresses for name in names)
+
+    def warmup(self, names, timeout=WARMUP_TIMEOUT, on_change=None):
+        # resolve the addresses in a background thread, handlers retry lazily if it fails or is still running.
+        # Restored addresses are used without waiting, and checked in the background: one changed while the agent was
+        # down is passed to on_change(name, address), set_address() by default
+        on_change = self.set_address if on_change is None else on_change
+        restored = [name for name in names if name in self._restored]
+
+        def resolve():
+            try:
+                for name in restored:
+                    address = self.read_address(name)
+                    if address != self._addresses.get(name):
+                        on_change(name, address)
+                    self._restored.discard(name)
+                for name in names:
+                    self.get_address(name)
+            except Exception as error:
+                print(f'{self.name} {self.network} market addresses are not resolved yet: {error}')
+
+        thread = threading.Thread(target=resolve, daemon=True)
+        thread.start()
+        thread.join(0 if self.is_resolved(names) else timeout)
+        return self.is_resolved(names)
@@ -1,31 +1,196 @@
 import forta_agent
 from forta_agent import Finding, FindingType, FindingSeverity
-from src.constants import AAVE_GOVERNANCE_V2_MAINNET, GOVERNANCE_PROPOSAL_EXECUTED_ABI
-
-
-def handle_transaction(transaction_event: forta_agent.transaction_event.TransactionEvent):
-    findings = []
-
-    # filter transaction events where GOVERNANCE_PROPOSAL_EXECUTED event is in the log with AAVE_GOVERNANCE_V2 address
-    events = transaction_event.filter_log(GOVERNANCE_PROPOSAL_EXECUTED_ABI,
-                                          AAVE_GOVERNANCE_V2_MAINNET)
-    for event in events:
-        id = event.get('args', {}).get('id', None)  # attempt to get proposal id
-        id = id if id else 'UNKNOWN ID'  # set 'UNKNOWN ID' if failed
-        initiator_execution = event.get('args', {}).get('initiatorExecution', None)  # attempt to get initiator
-        initiator_execution = initiator_execution if initiator_execution else 'UNKNOWN INITIATOR'
-        # set 'UNKNOWN INITIATOR' if failed
-
-        findings.append(Finding({
-            'name': 'Aave Governance Proposal is EXECUTED',
-            'description': f'Aave governance proposal with id {id} is executed by {initiator_execution}',
-            'alert_id': 'AAVE-GOV-EXEC',
-            'type': FindingType.Info,
-            'severity': FindingSeverity.Info,
-            'metadata': {
-                'id': id,
-                'initiator_execution': initiator_execution
-            }
-        }))
-
-    return findings
+from src.constants import AAVE_GOVERNANCE_V2_MAINNET, GOVERNANCE_PROPOSAL_EXECUTED_ABI, \
+    GOVERNANCE_PROPOSAL_CREATED_ABI, GOVERNANCE_PROPOSAL_QUEUED_ABI, GOVERNANCE_PROPOSAL_CANCELED_ABI, \
+    GOVERNANCE_VOTE_EMITTED_ABI, GOVERNANCE_EXECUTOR_AUTHORIZED_ABI, GOVERNANCE_EXECUTOR_UNAUTHORIZED_ABI
+from src.decoders import EventDecoder, filter_log_by_topic, index_by_topic
+from src.metrics import Metrics
+from src.prefilter import Prefilter
+from src.proposals import ProposalTable
+
+LARGE_VOTE_POWER = 100_000 * 10 ** 18  # votes with at least this voting power, in AAVE wei, are reported
+
+metrics = Metrics('governance')  # every handler invocation is counted and timed, see initialize() for the export
+proposal_executed_decoder = EventDecoder(GOVERNANCE_PROPOSAL_EXECUTED_ABI)
+proposal_created_decoder = EventDecoder(GOVERNANCE_PROPOSAL_CREATED_ABI)
+proposal_queued_decoder = EventDecoder(GOVERNANCE_PROPOSAL_QUEUED_ABI)
+proposal_canceled_decoder = EventDecoder(GOVERNANCE_PROPOSAL_CANCELED_ABI)
+vote_emitted_decoder = EventDecoder(GOVERNANCE_VOTE_EMITTED_ABI)
+executor_authorized_decoder = EventDecoder(GOVERNANCE_EXECUTOR_AUTHORIZED_ABI)
+executor_unauthorized_decoder = EventDecoder(GOVERNANCE_EXECUTOR_UNAUTHORIZED_ABI)
+# the logs of a transaction are decoded in one pass, the decoder of each log being looked up by its topic0
+decoders_by_topic = index_by_topic([proposal_created_decoder, vote_emitted_decoder, proposal_queued_decoder,
+                                    proposal_executed_decoder, proposal_canceled_decoder,
+                                    executor_authorized_decoder, executor_unauthorized_decoder])
+
+# only transactions with a log of one of these events emitted by the governance contract are decoded
+prefilter = Prefilter()
+for decoder in decoders_by_topic.values():
+    prefilter.watch_event(AAVE_GOVERNANCE_V2_MAINNET, decoder.topic)
+
+
+def initialize():
+    metrics.export()
+
+
+def create_executed_finding(args):
+    id = args.get('id', None)  # attempt to get proposal id
+    id = id if id else 'UNKNOWN ID'  # set 'UNKNOWN ID' if failed
+    initiator_execution = args.get('initiatorExecution', None)  # attempt to get initiator
+    initiator_execution = initiator_execution if initiator_execution else 'UNKNOWN INITIATOR'
+    # set 'UNKNOWN INITIATOR' if failed
+
+    return Finding({
+        'name': 'Aave Governance Proposal is EXECUTED',
+        'description': f'Aave governance proposal with id {id} is executed by {initiator_execution}',
+        'alert_id': 'AAVE-GOV-EXEC',
+        'type': FindingType.Info,
+        'severity': FindingSeverity.Info,
+        'metadata': {
+            'id': id,
+            'initiator_execution': initiator_execution
+        }
+    })
+
+
+def create_created_finding(args):
+    return Finding({
+        'name': 'Aave Governance Proposal is CREATED',
+        'description': f'Aave governance proposal with id {args["id"]} is created by {args["creator"]}',
+        'alert_id': 'AAVE-GOV-CREATED',
+        'type': FindingType.Info,
+        'severity': FindingSeverity.Info,
+        'metadata': {
+            'id': args['id'],
+            'creator': args['creator'],
+            'executor': args['executor'],
+            'start_block': args['startBlock'],
+            'end_block': args['endBlock']
+        }
+    })
+
+
+def create_vote_finding(args):
+    support = 'for' if args['support'] else 'against'
+    return Finding({
+        'name': 'Aave Governance Large Vote',
+        'description': f'{args["voter"]} voted {support} Aave governance proposal with id {args["id"]} with '
+                       f'{args["votingPower"] / 10 ** 18} AAVE of voting power',
+        'alert_id': 'AAVE-GOV-VOTE',
+        'type': FindingType.Info,
+        'severity': FindingSeverity.Info,
+        'metadata': {
+            'id': args['id'],
+            'voter': args['voter'],
+            'support': args['support'],
+            'voting_power': args['votingPower']
+        }
+    })
+
+
+def create_queued_finding(args):
+    return Finding({
+        'name': 'Aave Governance Proposal is QUEUED',
+        'description': f'Aave governance proposal with id {args["id"]} is queued by {args["initiatorQueueing"]} '
+                       f'for execution at {args["executionTime"]}',
+        'alert_id': 'AAVE-GOV-QUEUED',
+        'type': FindingType.Info,
+        'severity': FindingSeverity.Info,
+        'metadata': {
+            'id': args['id'],
+            'execution_time': args['executionTime'],
+            'initiator_queueing': args['initiatorQueueing']
+        }
+    })
+
+
+def create_canceled_finding(args):
+    return Finding({
+        'name': 'Aave Governance Proposal is CANCELED',
+        'description': f'Aave governance proposal with id {args["id"]} is canceled',
+        'alert_id': 'AAVE-GOV-CANCELED',
+        'type': FindingType.Info,
+        'severity': FindingSeverity.Info,
+        'metadata': {
+            'id': args['id']
+        }
+    })
+
+
+def create_executor_finding(args, authorized):
+    action = 'AUTHORIZED' if authorized else 'UNAUTHORIZED'
+    return Finding({
+        'name': f'Aave Governance Executor is {action}',
+        'description': f'Aave governance executor {args["executor"]} is {action.lower()}',
+        'alert_id': f'AAVE-GOV-EXECUTOR-{action}',
+        'type': FindingType.Info,
+        'severity': FindingSeverity.Medium,
+        'metadata': {
+            'executor': args['executor']
+        }
+    })
+
+
+def create_anomaly_finding(event, anomaly):
+    id = event['args']['id']
+    return Finding({
+        'name': 'Aave Governance Proposal Lifecycle Anomaly',
+        'description': f'{event["event"]} of Aave governance proposal with id {id}: {anomaly.replace("_", " ")}',
+        'alert_id': 'AAVE-GOV-ANOMALY',
+        'type': FindingType.Suspicious,
+        'severity': FindingSeverity.High,
+        'metadata': {
+            'id': id,
+            'event': event['event'],
+            'anomaly': anomaly
+        }
+    })
+
+
+def create_handle_transaction(proposals):
+    def handle_transaction(transaction_event: forta_agent.transaction_event.TransactionEvent):
+        findings = []
+        if not prefilter.matches_event(transaction_event):
+            return findings
+
+        # the block may be missing, e.g. in tests, the checks using it are skipped then
+        block_number = None if transaction_event.block_number is None else int(transaction_event.block_number)
+        timestamp = None if transaction_event.timestamp is None else int(transaction_event.timestamp)
+        for event in filter_log_by_topic(transaction_event, decoders_by_topic, AAVE_GOVERNANCE_V2_MAINNET):
+            name, args = event['event'], event['args']
+            anomalies = []
+            if name == 'ProposalCreated':
+                anomalies = proposals.created(args)
+                findings.append(create_created_finding(args))
+            elif name == 'VoteEmitted':
+                anomalies = proposals.voted(args, block_number)
+                if args['votingPower'] >= LARGE_VOTE_POWER:
+                    findings.append(create_vote_finding(args))
+            elif name == 'ProposalQueued':
+                anomalies = proposals.queued(args, block_number, timestamp)
+                findings.append(create_queued_finding(args))
+            elif name == 'ProposalExecuted':
+                anomalies = proposals.executed(args, timestamp)
+                findings.append(create_executed_finding(args))
+            elif name == 'ProposalCanceled':
+                anomalies = proposals.canceled(args)
+                findings.append(create_canceled_finding(args))
+            elif name == 'ExecutorAuthorized':
+                proposals.executor_authorized(args['executor'])
+                findings.append(create_executor_finding(args, authorized=True))
+            elif name == 'ExecutorUnauthorized':
+                proposals.executor_unauthorized(args['executor'])
+                findings.append(create_executor_finding(args, authorized=False))
+            findings.extend(create_anomaly_finding(event, anomaly) for anomaly in anomalies)
+
+        return findings
+
+    return handle_transaction
+
+
+proposal_table = ProposalTable()
+real_handle_transaction = create_handle_transaction(proposal_table)
+
+
+def handle_transaction(transaction_event):
+    return metrics.call_handler('handle_transaction', real_handle_transaction, transaction_event)
@@ -1,9 +1,55 @@
 import json
 import eth_abi
-from eth_utils import event_abi_to_log_topic
+from eth_utils import encode_hex, event_abi_to_log_topic
 from forta_agent import create_transaction_event
-from agent import handle_transaction
+from agent import handle_transaction, create_handle_transaction, proposal_created_decoder, vote_emitted_decoder, \
+    proposal_queued_decoder, proposal_executed_decoder, proposal_canceled_decoder, executor_unauthorized_decoder
 from src.constants import GOVERNANCE_PROPOSAL_EXECUTED_ABI, AAVE_GOVERNANCE_V2_MAINNET
+from src.proposals import ProposalTable
+
+CREATOR = "0x3333333333333333333333333333333333333333"
+EXECUTOR = "0xEE56e2B3D491590B5b31738cC34d5232F378a8D5"
+DAY = 24 * 60 * 60
+START_BLOCK = 13000000
+END_BLOCK = START_BLOCK + 19200
+QUEUED_AT = 1630000000
+
+
+def create_log(decoder, **args):
+    # the log of the decoder event with args, the indexed ones as topics and the others abi-encoded as data
+    topics = [decoder.topic] + [encode_hex(eth_abi.encode_abi([abi_type], [args[name]]))
+                                for name, abi_type in zip(decoder.indexed_names, decoder.indexed_types)]
+    data = eth_abi.encode_abi(decoder.data_types, [args[name] for name in decoder.data_names])
+    return {'topics': topics, 'data': encode_hex(data), 'address': AAVE_GOVERNANCE_V2_MAINNET}
+
+
+def create_created_log(id, executor=EXECUTOR):
+    return create_log(proposal_created_decoder, id=id, creator=CREATOR, executor=executor, targets=[CREATOR],
+                      values=[0], signatures=['execute()'], calldatas=[b''], withDelegatecalls=[True],
+                      startBlock=START_BLOCK, endBlock=END_BLOCK, strategy=CREATOR, ipfsHash=bytes(32))
+
+
+def create_vote_log(id, voting_power, support=True):
+    return create_log(vote_emitted_decoder, id=id, voter=CREATOR, support=support, votingPower=voting_power)
+
+
+def create_queued_log(id, execution_time):
+    return create_log(proposal_queued_decoder, id=id, executionTime=execution_time, initiatorQueueing=CREATOR)
+
+
+def create_executed_log(id):
+    return create_log(proposal_executed_decoder, id=id, initiatorExecution=CREATOR)
+
+
+def create_event(logs, block_number, timestamp):
+    return create_transaction_event({
+        'receipt': {'logs': logs},
+        'block': {'number': block_number, 'timestamp': timestamp}
+    })
+
+
+def alerts(findings):
+    return [(finding.alert_id, finding.metadata.get('anomaly')) for finding in findings]
 
 
 class TestAaveGovernanceAgent:
@@ -52,5 +98,82 @@ class TestAaveGovernanceAgent:
         findings = handle_transaction(tx_event)
         assert len(findings) != 0
 
+    def test_returns_findings_of_every_step_of_the_lifecycle(self):
+        handle = create_handle_transaction(ProposalTable())
+
+        assert alerts(handle(create_event([create_created_log(1)], START_BLOCK - 10, 0))) == [
+            ('AAVE-GOV-CREATED', None)]
+        # only the votes with a large voting power are reported
+        votes = [create_vote_log(1, 10 ** 18), create_vote_log(1, 200_000 * 10 ** 18, support=False)]
+        findings = handle(create_event(votes, START_BLOCK + 10, 0))
+        assert alerts(findings) == [('AAVE-GOV-VOTE', None)]
+        assert findings[0].metadata['support'] is False
+        findings = handle(create_event([create_queued_log(1, QUEUED_AT + 2 * DAY)], END_BLOCK + 1, QUEUED_AT))
+        assert alerts(findings) == [('AAVE-GOV-QUEUED', None)]
+        findings = handle(create_event([create_executed_log(1)], END_BLOCK + 20000, QUEUED_AT + 2 * DAY))
+        assert alerts(findings) == [('AAVE-GOV-EXEC', None)]
+        assert findings[0].metadata == {'id': 1, 'initiator_execution': CREATOR}
+
+    def test_decodes_all_logs_of_transaction_in_one_pass(self):
+        handle = create_handle_transaction(ProposalTable())
+        logs = [create_created_log(1), create_created_log(2),
+                create_log(proposal_canceled_decoder, id=1),
+                {**create_created_log(3), 'address': "0x1010101010101010101010101010101010101010"}]
+
+        findings = handle(create_event(logs, START_BLOCK - 10, 0))
+
+        assert [(finding.alert_id, finding.metadata['id']) for finding in findings] == [
+            ('AAVE-GOV-CREATED', 1), ('AAVE-GOV-CREATED', 2), ('AAVE-GOV-CANCELED', 1)]
+
+    def test_returns_anomaly_if_executed_faster_than_expected(self):
+        handle = create_handle_transaction(ProposalTable())
+        handle(create_event([create_created_log(1)], START_BLOCK - 10, 0))
+
+        # queued with an execution time shorter than the delay of any executor, then executed before it
+        findings = handle(create_event([create_queued_log(1, QUEUED_AT + 60)], END_BLOCK + 1, QUEUED_AT))
+        assert alerts(findings) == [('AAVE-GOV-QUEUED', None), ('AAVE-GOV-ANOMALY', 'short_execution_delay')]
+        findings = handle(create_event([create_executed_log(1)], END_BLOCK + 2, QUEUED_AT + 30))
+        assert alerts(findings) == [('AAVE-GOV-EXEC', None),
+                                    ('AAVE-GOV-ANOMALY', 'executed_before_execution_time'),
+                                    ('AAVE-GOV-ANOMALY', 'executed_too_fast')]
+        assert findings[1].metadata == {'id': 1, 'event': 'ProposalExecuted',
+                                        'anomaly': 'executed_before_execution_time'}
+
+    def test_returns_anomalies_of_steps_out_of_order(self):
+        handle = create_handle_transaction(ProposalTable())
+        handle(create_event([create_created_log(1), create_created_log(2)], START_BLOCK - 10, 0))
+
+        findings = handle(create_event([create_queued_log(1, QUEUED_AT + 2 * DAY)], END_BLOCK - 1, QUEUED_AT))
+        assert alerts(findings)[1:] == [('AAVE-GOV-ANOMALY', 'queued_before_voting_end')]
+        findings = handle(create_event([create_vote_log(1, 1)], END_BLOCK, QUEUED_AT))
+        assert alerts(findings) == [('AAVE-GOV-ANOMALY', 'vote_after_queued')]
+        findings = handle(create_event([create_executed_log(2)], END_BLOCK + 1, QUEUED_AT))
+        assert alerts(findings)[1:] == [('AAVE-GOV-ANOMALY', 'executed_without_queue')]
+        handle(create_event([create_log(proposal_canceled_decoder, id=1)], END_BLOCK + 2, QUEUED_AT))
+        findings = handle(create_event([create_executed_log(1)], END_BLOCK + 3, QUEUED_AT + 2 * DAY))
+        assert alerts(findings)[1:] == [('AAVE-GOV-ANOMALY', 'executed_after_canceled')]
+
+    def test_returns_anomaly_if_proposal_uses_unauthorized_executor(self):
+        handle = create_handle_transaction(ProposalTable())
+
+        findings = handle(create_event([create_log(executor_unauthorized_decoder, executor=EXECUTOR)], 1, 0))
+        assert alerts(findings) == [('AAVE-GOV-EXECUTOR-UNAUTHORIZED', None)]
+        findings = handle(create_event([create_created_log(1)], START_BLOCK - 10, 0))
+        assert alerts(findings) == [('AAVE-GOV-CREATED', None), ('AAVE-GOV-ANOMALY', 'unauthorized_executor')]
+
+    def test_execution_of_proposal_seen_first_has_no_anomaly(self):
+        # proposals created and queued before the agent started are only reported as executed
+        handle = create_handle_transaction(ProposalTable())
+        findings = handle(create_event([create_executed_log(7)], END_BLOCK, QUEUED_AT))
+        assert alerts(findings) == [('AAVE-GOV-EXEC', None)]
+
+    def test_checks_blocks_given_as_strings(self):
+        handle = create_handle_transaction(ProposalTable())
+        handle(create_event([create_created_log(1)], str(START_BLOCK - 10), '0'))
 
-TestAaveGovernanceAgent().test_returns_findings_if_everything_is_correct()
\ No newline at end of file
+        findings = handle(create_event([create_queued_log(1, QUEUED_AT + 60)], str(END_BLOCK - 1), str(QUEUED_AT)))
+        assert alerts(findings)[1:] == [('AAVE-GOV-ANOMALY', 'queued_before_voting_end'),
+                                        ('AAVE-GOV-ANOMALY', 'short_execution_delay')]
+        # without a block, the checks using it are skipped
+        findings = handle(create_transaction_event({'receipt': {'logs': [create_executed_log(1)]}}))
+        assert alerts(findings) == [('AAVE-GOV-EXEC', None)]
@@ -19,4 +19,184 @@ GOVERNANCE_PROPOSAL_EXECUTED_ABI = """
   ],
   "name": "ProposalExecuted",
   "type": "event"
-}"""
\ No newline at end of file
+}"""
+GOVERNANCE_PROPOSAL_CREATED_ABI = """
+{
+  "anonymous": false,
+  "inputs": [
+    {
+      "indexed": false,
+      "internalType": "uint256",
+      "name": "id",
+      "type": "uint256"
+    },
+    {
+      "indexed": true,
+      "internalType": "address",
+      "name": "creator",
+      "type": "address"
+    },
+    {
+      "indexed": true,
+      "internalType": "contract IExecutorWithTimelock",
+      "name": "executor",
+      "type": "address"
+    },
+    {
+      "indexed": false,
+      "internalType": "address[]",
+      "name": "targets",
+      "type": "address[]"
+    },
+    {
+      "indexed": false,
+      "internalType": "uint256[]",
+      "name": "values",
+      "type": "uint256[]"
+    },
+    {
+      "indexed": false,
+      "internalType": "string[]",
+      "name": "signatures",
+      "type": "string[]"
+    },
+    {
+      "indexed": false,
+      "internalType": "bytes[]",
+      "name": "calldatas",
+      "type": "bytes[]"
+    },
+    {
+      "indexed": false,
+      "internalType": "bool[]",
+      "name": "withDelegatecalls",
+      "type": "bool[]"
+    },
+    {
+      "indexed": false,
+      "internalType": "uint256",
+      "name": "startBlock",
+      "type": "uint256"
+    },
+    {
+      "indexed": false,
+      "internalType": "uint256",
+      "name": "endBlock",
+      "type": "uint256"
+    },
+    {
+      "indexed": false,
+      "internalType": "address",
+      "name": "strategy",
+      "type": "address"
+    },
+    {
+      "indexed": false,
+      "internalType": "bytes32",
+      "name": "ipfsHash",
+      "type": "bytes32"
+    }
+  ],
+  "name": "ProposalCreated",
+  "type": "event"
+}"""
+GOVERNANCE_PROPOSAL_QUEUED_ABI = """
+{
+  "anonymous": false,
+  "inputs": [
+    {
+      "indexed": false,
+      "internalType": "uint256",
+      "name": "id",
+      "type": "uint256"
+    },
+    {
+      "indexed": false,
+      "internalType": "uint256",
+      "name": "executionTime",
+      "type": "uint256"
+    },
+    {
+      "indexed": true,
+      "internalType": "address",
+      "name": "initiatorQueueing",
+      "type": "address"
+    }
+  ],
+  "name": "ProposalQueued",
+  "type": "event"
+}"""
+GOVERNANCE_PROPOSAL_CANCELED_ABI = """
+{
+  "anonymous": false,
+  "inputs": [
+    {
+      "indexed": false,
+      "internalType": "uint256",
+      "name": "id",
+      "type": "uint256"
+    }
+  ],
+  "name": "ProposalCanceled",
+  "type": "event"
+}"""
+GOVERNANCE_VOTE_EMITTED_ABI = """
+{
+  "anonymous": false,
+  "inputs": [
+    {
+      "indexed": false,
+      "internalType": "uint256",
+      "name": "id",
+      "type": "uint256"
+    },
+    {
+      "indexed": true,
+      "internalType": "address",
+      "name": "voter",
+      "type": "address"
+    },
+    {
+      "indexed": false,
+      "internalType": "bool",
+      "name": "support",
+      "type": "bool"
+    },
+    {
+      "indexed": false,
+      "internalType": "uint256",
+      "name": "votingPower",
+      "type": "uint256"
+    }
+  ],
+  "name": "VoteEmitted",
+  "type": "event"
+}"""
+GOVERNANCE_EXECUTOR_AUTHORIZED_ABI = """
+{
+  "anonymous": false,
+  "inputs": [
+    {
+      "indexed": false,
+      "internalType": "address",
+      "name": "executor",
+      "type": "address"
+    }
+  ],
+  "name": "ExecutorAuthorized",
+  "type": "event"
+}"""
+GOVERNANCE_EXECUTOR_UNAUTHORIZED_ABI = """
+{
+  "anonymous": false,
+  "inputs": [
+    {
+      "indexed": false,
+      "internalType": "address",
+      "name": "executor",
+      "type": "address"
+    }
+  ],
+  "name": "ExecutorUnauthorized",
+  "type": "event"
+}"""
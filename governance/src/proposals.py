@@ -0,0 +1,104 @@
+CREATED = 'CREATED'
+QUEUED = 'QUEUED'
+EXECUTED = 'EXECUTED'
+CANCELED = 'CANCELED'
+
+MIN_EXECUTION_DELAY = 24 * 60 * 60  # seconds, the delay of the short executor, the fastest a proposal can be executed
+
+
+class Proposal:
+    # what the logs of the governance contract told about one proposal so far
+    def __init__(self, id):
+        self.id = id
+        self.state = None  # unknown until one of its logs is seen
+        self.created = False
+        self.executor = None
+        self.start_block = None
+        self.end_block = None
+        self.queued_at = None  # timestamp of the block of the ProposalQueued log
+        self.execution_time = None
+        self.votes_for = 0
+        self.votes_against = 0
+
+
+class ProposalTable:
+    # in-memory table of the proposals by id and of the executors, fed with the decoded logs of the governance contract
+    # in block order. Every method returns the anomalies of its event, i.e. the steps of the lifecycle which the
+    # contract should not let happen or which happen faster than the executors allow. The checks only use what was
+    # seen, so a proposal created before the agent started gets the checks of its later steps only.
+    def __init__(self, min_execution_delay=MIN_EXECUTION_DELAY):
+        self.min_execution_delay = min_execution_delay
+        self.proposals = {}
+        self.unauthorized_executors = set()
+
+    def get(self, id):
+        proposal = self.proposals.get(id)
+        if proposal is None:
+            proposal = self.proposals[id] = Proposal(id)
+        return proposal
+
+    def created(self, args):
+        proposal = self.get(args['id'])
+        proposal.state = CREATED
+        proposal.created = True
+        proposal.executor = args['executor']
+        proposal.start_block = args['startBlock']
+        proposal.end_block = args['endBlock']
+        if args['executor'] in self.unauthorized_executors:
+            return ['unauthorized_executor']
+        return []
+
+    def voted(self, args, block_number):
+        proposal = self.get(args['id'])
+        if args['support']:
+            proposal.votes_for += args['votingPower']
+        else:
+            proposal.votes_against += args['votingPower']
+        anomalies = []
+        if proposal.state in (QUEUED, EXECUTED, CANCELED):
+            anomalies.append(f'vote_after_{proposal.state.lower()}')
+        elif proposal.created and block_number is not None and \
+                not proposal.start_block <= block_number <= proposal.end_block:
+            anomalies.append('vote_outside_voting_period')
+        return anomalies
+
+    def queued(self, args, block_number, timestamp):
+        proposal = self.get(args['id'])
+        anomalies = []
+        if proposal.state in (EXECUTED, CANCELED):
+            anomalies.append(f'queued_after_{proposal.state.lower()}')
+        if proposal.created and block_number is not None and block_number <= proposal.end_block:
+            anomalies.append('queued_before_voting_end')
+        if timestamp is not None and args['executionTime'] - timestamp < self.min_execution_delay:
+            anomalies.append('short_execution_delay')
+        proposal.state = QUEUED
+        proposal.queued_at = timestamp
+        proposal.execution_time = args['executionTime']
+        return anomalies
+
+    def executed(self, args, timestamp):
+        proposal = self.get(args['id'])
+        anomalies = []
+        if proposal.state == CANCELED:
+            anomalies.append('executed_after_canceled')
+        elif proposal.created and proposal.state != QUEUED:
+            anomalies.append('executed_without_queue')
+        if timestamp is not None and proposal.execution_time is not None and timestamp < proposal.execution_time:
+            anomalies.append('executed_before_execution_time')
+        if timestamp is not None and proposal.queued_at is not None and \
+                timestamp - proposal.queued_at < self.min_execution_delay:
+            anomalies.append('executed_too_fast')
+        proposal.state = EXECUTED
+        return anomalies
+
+    def canceled(self, args):
+        proposal = self.get(args['id'])
+        anomalies = ['canceled_after_executed'] if proposal.state == EXECUTED else []
+        proposal.state = CANCELED
+        return anomalies
+
+    def executor_authorized(self, executor):
+        self.unauthorized_executors.discard(executor)
+
+    def executor_unauthorized(self, executor):
+        self.unauthorized_executors.add(executor)
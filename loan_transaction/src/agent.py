@@ -1,52 +1,112 @@
 import json
+import os
 
 import forta_agent
 from forta_agent import Finding, FindingType, FindingSeverity, Web3, get_json_rpc_url
-from src.constants import LendingPoolAddressesProvider, GET_ASSETS_PRICE_ABI, FLASH_LOAN_FUNCTION, USD_TH, \
+from src.constants import LendingPoolAddressesProvider, GET_ASSETS_PRICE_ABI, FLASH_LOAN_EVENT, USD_TH, \
     CRITICAL_USD_TH, \
     HIGH_USD_TH
-
-MARKET = 'MAIN'  # available options: MAIN, AMM
-NETWORK = 'MAINNET'  # There is only mainnet available at this moment
+from src.block_batch import BlockBatch
+from src.decoders import EventDecoder, filter_log
+from src.market import Market, WARMUP_TIMEOUT
+from src.metrics import Metrics, function_names
+from src.prefilter import Prefilter
+from src.price_cache import PriceCache
+from src.state_store import StateStore
+from src.token_registry import TokenRegistry, erc20_abi, lending_pool_abi
+from src.usd_valuation import UsdValuation
+
+MARKET = os.environ.get('AAVE_MARKET', 'MAIN')  # available options: MAIN, AMM
+NETWORK = os.environ.get('AAVE_NETWORK', 'MAINNET')  # There is only mainnet available at this moment
+RPC_TIMEOUT = 10  # seconds
+USD_BUCKETS = (1e5, 1e6, 5e6, USD_TH, HIGH_USD_TH, CRITICAL_USD_TH, 1e8, 1e9)  # flash loan value histogram buckets
+BLOCK_BATCHING = False  # value the flash loans of a block together once it is over, findings are one block late
+STATE_PATH = os.environ.get('AAVE_STATE_PATH')  # SQLite file keeping the agent state across restarts, memory if not set
 LendingPoolAddressesProvider_address = LendingPoolAddressesProvider.get(MARKET + '_' + NETWORK)
 
-web3 = Web3(Web3.HTTPProvider(get_json_rpc_url()))
 get_assets_price_abi = json.loads(GET_ASSETS_PRICE_ABI)
 with open('./src/LendingPoolAddressesProvider.json', 'r') as abi_file:
     abi = json.load(abi_file)
-with open('./src/tokens.json', 'r') as tokens_file:
-    tokens = json.load(tokens_file)
+# the market's reserves, new ones are picked up from the LendingPool while running
+tokens = TokenRegistry.load('./src/tokens.json', MARKET)
+
+# every RPC call and handler invocation is counted and timed, see initialize() for the export
+metrics = Metrics('loan_transaction', function_names(abi, get_assets_price_abi, lending_pool_abi, erc20_abi))
+web3 = metrics.instrument(Web3(Web3.HTTPProvider(get_json_rpc_url(), request_kwargs={'timeout': RPC_TIMEOUT})))
 
 # Always get the latest price oracle address by calling getPriceOracle() on the LendingPoolAddressesProvider contract.
 # © https://docs.aave.com/developers/the-core-protocol/price-oracle
-lpap_contract = web3.eth.contract(address=Web3.toChecksumAddress(LendingPoolAddressesProvider_address), abi=abi)
-price_oracle_address = lpap_contract.functions.getPriceOracle().call()  # get price oracle address
-lending_pool_address = lpap_contract.functions.getLendingPool().call()  # get lending pool address
+# The price oracle and lending pool addresses are resolved on first use or by initialize(), never at import, unless
+# they are restored from the state store
+store = StateStore(STATE_PATH, f'loan_transaction_{MARKET}_{NETWORK}')
+market = Market(web3, MARKET, NETWORK, LendingPoolAddressesProvider_address, abi, store)
 
-json_market = 'proto' if MARKET == 'MAIN' else 'amm'
-USDT_address = next((x['address'] for x in tokens[json_market] if x['aTokenSymbol'] == 'aUSDT'), None)
+USDT_address = tokens.by_symbol('USDT')['address']  # the same reserve in all the markets
 
+flash_loan_decoder = EventDecoder(FLASH_LOAN_EVENT)
 
-def provide_handle_transaction(w3):
-    def handle_transaction(transaction_event: forta_agent.transaction_event.TransactionEvent):
+# only transactions with a FlashLoan log of the lending pool are decoded, whoever called flashLoan(): an EOA or a
+# contract
+prefilter = Prefilter()
+
+# flash loan transactions waiting for the end of their block, with BLOCK_BATCHING
+pending_flash_loans = BlockBatch()
+
+
+def watch_lending_pool():
+    # the lending pool address is only known once the market is resolved
+    if not prefilter.events:
+        prefilter.watch_event(market.lending_pool, flash_loan_decoder.topic)
+
+
+def set_market_address(name, address):
+    # an address changed while the agent was down, the prefilter follows the lending pool
+    if name == 'LendingPool' and prefilter.events:
+        prefilter.unwatch(market.lending_pool)
+    market.set_address(name, address)
+    if name == 'LendingPool':
+        watch_lending_pool()
+
+
+def warmup():
+    # resolve the addresses before the first transaction, a slow RPC only delays them to the first transaction
+    if market.warmup(['PriceOracle', 'LendingPool'], WARMUP_TIMEOUT, set_market_address):
+        watch_lending_pool()
+
+
+def initialize():
+    warmup()
+    metrics.export()
+
+
+def provide_handle_flash_loans(w3, price_cache=None):
+    # values the flash loans of the given transactions of one block with one price fetch: the union of their assets
+    # is fetched first, in a single getAssetsPrices() call with the USDT price, so the RPC cost of a block depends on
+    # the number of distinct assets only. Prices are shared between all flash loans of the same block.
+    price_cache = PriceCache() if price_cache is None else price_cache
+    valuation = UsdValuation(tokens, USDT_address, price_cache)
+
+    def handle_flash_loans(block_number, transaction_events):
         findings = []
+        loans = [(transaction_event, loan) for transaction_event in transaction_events
+                 for loan in get_flash_loans(transaction_event)]
+        if not loans:
+            return findings
 
+        price_oracle_address = market.price_oracle
         # create price oracle contract
         price_oracle_contract = w3.eth.contract(address=Web3.toChecksumAddress(price_oracle_address),
                                                 abi=[get_assets_price_abi])
-        # filter transaction by flashLoan() with lending pool address
-        results = transaction_event.filter_function(FLASH_LOAN_FUNCTION, lending_pool_address)
-        for result in results:
-            args = result[1]
-            assets = args.get('assets', [])  # get the asset's addresses from in the loan
-            amounts = args.get('amounts', [])  # get the asset's amounts from in the loan
-
-            # total amount in USD = (sum of (each asset price in wETH * amount of each asset)) / USDT price in wETH
-            total_usd = sum([price_oracle_contract.functions.getAssetsPrices(assets=[asset]).call(
-                        block_identifier=int(transaction_event.block_number))[0] * amounts[i] for i, asset in
-                        enumerate(assets)]) / price_oracle_contract.functions.getAssetsPrices([USDT_address]).call()[0]
-
-            print(total_usd)
+        assets = list(dict.fromkeys(asset for _, args in loans for asset in args['assets']))
+        valuation.block_prices(price_oracle_contract, price_oracle_address, assets, block_number)
+
+        for transaction_event, args in loans:
+            # total amount in USD = (sum of (each asset price in wETH * amount of each asset)) / USDT price in wETH,
+            # with the amounts scaled by the asset decimals and the prices at the transaction's block
+            total_usd = valuation.value(w3, price_oracle_contract, price_oracle_address, args['assets'],
+                                        args['amounts'], block_number)
+
+            metrics.observe('aave_flash_loan_usd', total_usd, buckets=USD_BUCKETS, market=MARKET)
             if total_usd >= USD_TH:
                 findings.append(Finding({
                     'name': 'AAVE FlashLoan Transaction',
@@ -58,15 +118,74 @@ def provide_handle_transaction(w3):
                         'transaction_amount': total_usd,
                         'market': MARKET,
                         'tx_hash': transaction_event.transaction.hash,
-                        'receiver': args.get('receiverAddress', 'UNKNOWN RECEIVER')
+                        'receiver': args['target'],
+                        'initiator': args['initiator'],
+                        'premium_amount': valuation.value(w3, price_oracle_contract, price_oracle_address,
+                                                          args['assets'], args['premiums'], block_number)
                     }
                 }))
 
         return findings
 
+    return handle_flash_loans
+
+
+def get_flash_loans(transaction_event):
+    # the LendingPool emits one FlashLoan log per borrowed asset, including the flash loans started by contracts and
+    # nested in other calls. The logs of the same (target, initiator) make one flash loan, in the order of their first
+    # log.
+    loans = {}
+    for event in filter_log(transaction_event, flash_loan_decoder, market.lending_pool):
+        args = event['args']
+        loan = loans.setdefault((args['target'], args['initiator']), {
+            'target': args['target'], 'initiator': args['initiator'], 'assets': [], 'amounts': [], 'premiums': []})
+        loan['assets'].append(args['asset'])
+        loan['amounts'].append(args['amount'])
+        loan['premiums'].append(args['premium'])
+    return list(loans.values())
+
+
+def handle_batches(handle_flash_loans, batches):
+    # batches - {block number: transaction events} from BlockBatch
+    return [finding for block_number, transaction_events in sorted(batches.items())
+            for finding in handle_flash_loans(block_number, transaction_events)]
+
+
+def provide_handle_transaction(w3, price_cache=None, batch=None):
+    # with a batch the flash loan transactions are collected and valued together once their block is over, their
+    # findings are returned by the handler getting the first event of a later block, see provide_handle_block()
+    batch = pending_flash_loans if batch is None and BLOCK_BATCHING else batch
+    handle_flash_loans = provide_handle_flash_loans(w3, price_cache)
+
+    def handle_transaction(transaction_event: forta_agent.transaction_event.TransactionEvent):
+        block_number = int(transaction_event.block_number)
+        watch_lending_pool()
+        tokens.refresh_if_due(w3, lambda: market.lending_pool, block_number)
+        matches = prefilter.matches_event(transaction_event)
+        if batch is None:
+            return handle_flash_loans(block_number, [transaction_event]) if matches else []
+
+        done = batch.take_before(block_number)
+        if matches:
+            batch.add(block_number, transaction_event)
+        return handle_batches(handle_flash_loans, done)
+
     return handle_transaction
 
 
+def provide_handle_block(w3, price_cache=None, batch=None):
+    # a block event closes the batches of the earlier blocks, nothing to do without batching
+    batch = pending_flash_loans if batch is None and BLOCK_BATCHING else batch
+    handle_flash_loans = provide_handle_flash_loans(w3, price_cache)
+
+    def handle_block(block_event):
+        if batch is None:
+            return []
+        return handle_batches(handle_flash_loans, batch.take_before(int(block_event.block_number)))
+
+    return handle_block
+
+
 def get_severity(amount):
     if amount < HIGH_USD_TH:
         return FindingSeverity.Medium
@@ -76,8 +195,14 @@ def get_severity(amount):
         return FindingSeverity.Critical
 
 
-real_handle_transaction = provide_handle_transaction(web3)
+price_cache = PriceCache()
+real_handle_transaction = provide_handle_transaction(web3, price_cache)
+real_handle_block = provide_handle_block(web3, price_cache)
 
 
 def handle_transaction(transaction_event):
-    return real_handle_transaction(transaction_event)
+    return metrics.call_handler('handle_transaction', real_handle_transaction, transaction_event)
+
+
+def handle_block(block_event):
+    return metrics.call_handler('handle_block', real_handle_block, block_event)
@@ -1,12 +1,14 @@
 import json
 
 import eth_abi
-from eth_utils import encode_hex, function_abi_to_4byte_selector
-from forta_agent import FindingSeverity, FindingType, get_json_rpc_url, create_transaction_event
+from eth_utils import encode_hex
+from forta_agent import FindingSeverity, FindingType, get_json_rpc_url, create_block_event, create_transaction_event
 from web3 import Web3
 
-from agent import provide_handle_transaction, MARKET, NETWORK
-from src.constants import LendingPoolAddressesProvider, FLASH_LOAN_FUNCTION
+from agent import provide_handle_block, provide_handle_transaction, initialize, tokens, MARKET, NETWORK
+from src.block_batch import BlockBatch
+from src.constants import LendingPoolAddressesProvider, FLASH_LOAN_EVENT
+from src.decoders import EventDecoder
 
 
 class Web3Mock:
@@ -31,12 +33,14 @@ class FunctionsMock:
     def __init__(self, prices):
         self.prices = prices
         self.asset = 'USDT'
+        self.calls = 0
 
     def getAssetsPrices(self, assets):
         self.assets = assets
         return self
 
     def call(self, **_):
+        self.calls += 1
         return [self.prices.get(asset) for asset in self.assets]
 
 
@@ -46,38 +50,58 @@ with open('./src/LendingPoolAddressesProvider.json', 'r') as abi_file:
 
 LendingPoolAddressesProvider_address = LendingPoolAddressesProvider.get(MARKET + '_' + NETWORK)
 
+USDC = "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
+DAI = "0x6B175474E89094C44Da98b954EedeAC495271d0F"
+TUSD = "0x0000000000085d4780B73119b644AE5ecd22b376"
+PRICES = {'0xdAC17F958D2ee523a2206206994597C13D831ec7': 218474666888275, USDC: 813456443213438,
+          DAI: 999999999999999, TUSD: 111111111111111}
+
+
+RECEIVER = "0x3333333333333333333333333333333333333333"
+INITIATOR = "0x4444444444444444444444444444444444444444"
+FLASH_LOAN_TOPIC = EventDecoder(FLASH_LOAN_EVENT).topic
+
+
+def get_lending_pool_address():
+    lpap_contract = web3.eth.contract(address=Web3.toChecksumAddress(LendingPoolAddressesProvider_address), abi=abi)
+    return lpap_contract.functions.getLendingPool().call()
+
+
+def create_flash_loan_logs(assets, amounts, target=RECEIVER, initiator=INITIATOR, address=None):
+    # one FlashLoan log per asset, with a premium of 0.09% like the LendingPool
+    return [{'address': address or get_lending_pool_address(),
+             'topics': [FLASH_LOAN_TOPIC] + [encode_hex(eth_abi.encode_abi(['address'], [value]))
+                                             for value in (target, initiator, asset)],
+             'data': encode_hex(eth_abi.encode_abi(['uint256', 'uint256', 'uint16'], [amount, amount * 9 // 10000, 0]))}
+            for asset, amount in zip(assets, amounts)]
+
+
+def create_flash_loan_event(assets, amounts, block_number=0, tx_hash="123", to=None, logs=None):
+    # the transaction is sent to the lending pool unless to is set, e.g. to a contract starting the flash loan
+    return create_transaction_event({
+        'transaction': {
+            'to': to or get_lending_pool_address(),
+            'data': "0x",
+            'hash': tx_hash
+        },
+        'receipt': {
+            'logs': create_flash_loan_logs(assets, amounts) if logs is None else logs
+        },
+        'block': {
+            'number': block_number
+        }
+    })
+
 
 class TestFlashLoanAgent:
 
     def test_returns_finding_with_medium_if_flash_loan_total_bigger_than_10kk(self):
         w3 = Web3Mock(prices={'0xdAC17F958D2ee523a2206206994597C13D831ec7': 218474666888275,  # USDT address and price
-                              '0x0000000000000000000000000000000000000000': 813456443213438,  # Random address and price
-                              '0x1111111111111111111111111111111111111111': 999999999999999,  # Random address and price
+                              '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48': 813456443213438,  # USDC address and price
+                              '0x6B175474E89094C44Da98b954EedeAC495271d0F': 999999999999999,  # DAI address and price
                               })
 
-        lpap_contract = web3.eth.contract(address=Web3.toChecksumAddress(LendingPoolAddressesProvider_address), abi=abi)
-        lending_pool_address = lpap_contract.functions.getLendingPool().call()  # get lending pool address
-        func = function_abi_to_4byte_selector(json.loads(FLASH_LOAN_FUNCTION))
-
-        params = eth_abi.encode_abi(["address", "address[]", "uint256[]", "uint256[]", "address", "bytes", "uint16"],
-                                    ["0x3333333333333333333333333333333333333333",  # Receiver address
-                                    ["0x0000000000000000000000000000000000000000",  # Token addresses
-                                     "0x1111111111111111111111111111111111111111"], [2000000, 2000000],  # Amounts
-                                    [1], "0x0000000000000000000000000000000000000000", bytes(0), 0])
-                                     # modes, onBehalfOf, params, referralCode
-
-        data = encode_hex(func + params)
-
-        tx_event = create_transaction_event({
-            'transaction': {
-                'to': lending_pool_address,
-                'data': data,
-                'hash': "123"
-            },
-            'block': {
-                'number': 0
-            }
-        })
+        tx_event = create_flash_loan_event([USDC, DAI], [2000000 * 10 ** 6, 2000000 * 10 ** 18])
 
         findings = provide_handle_transaction(w3)(tx_event)
 
@@ -95,32 +119,11 @@ class TestFlashLoanAgent:
 
     def test_returns_finding_with_high_if_flash_loan_total_bigger_than_30kk(self):
         w3 = Web3Mock(prices={'0xdAC17F958D2ee523a2206206994597C13D831ec7': 218474666888275,  # USDT address and price
-                              '0x0000000000000000000000000000000000000000': 813456443213438,  # Random address and price
-                              '0x1111111111111111111111111111111111111111': 999999999999999,  # Random address and price
+                              '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48': 813456443213438,  # USDC address and price
+                              '0x6B175474E89094C44Da98b954EedeAC495271d0F': 999999999999999,  # DAI address and price
                               })
 
-        lpap_contract = web3.eth.contract(address=Web3.toChecksumAddress(LendingPoolAddressesProvider_address), abi=abi)
-        lending_pool_address = lpap_contract.functions.getLendingPool().call()  # get lending pool address
-        func = function_abi_to_4byte_selector(json.loads(FLASH_LOAN_FUNCTION))
-
-        params = eth_abi.encode_abi(["address", "address[]", "uint256[]", "uint256[]", "address", "bytes", "uint16"],
-                                    ["0x3333333333333333333333333333333333333333",
-                                     ["0x0000000000000000000000000000000000000000",  # Token addresses
-                                      "0x1111111111111111111111111111111111111111"], [4000000, 4000000],  # Amounts
-                                     [1], "0x0000000000000000000000000000000000000000", bytes(0), 0])
-
-        data = encode_hex(func + params)
-
-        tx_event = create_transaction_event({
-            'transaction': {
-                'to': lending_pool_address,
-                'data': data,
-                'hash': "123"
-            },
-            'block': {
-                'number': 0
-            }
-        })
+        tx_event = create_flash_loan_event([USDC, DAI], [4000000 * 10 ** 6, 4000000 * 10 ** 18])
 
         findings = provide_handle_transaction(w3)(tx_event)
 
@@ -138,32 +141,11 @@ class TestFlashLoanAgent:
 
     def test_returns_finding_with_critical_if_flash_loan_total_bigger_than_50kk(self):
         w3 = Web3Mock(prices={'0xdAC17F958D2ee523a2206206994597C13D831ec7': 218474666888275,  # USDT address and price
-                              '0x0000000000000000000000000000000000000000': 813456443213438,  # Random address and price
-                              '0x1111111111111111111111111111111111111111': 999999999999999,  # Random address and price
+                              '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48': 813456443213438,  # USDC address and price
+                              '0x6B175474E89094C44Da98b954EedeAC495271d0F': 999999999999999,  # DAI address and price
                               })
 
-        lpap_contract = web3.eth.contract(address=Web3.toChecksumAddress(LendingPoolAddressesProvider_address), abi=abi)
-        lending_pool_address = lpap_contract.functions.getLendingPool().call()  # get lending pool address
-        func = function_abi_to_4byte_selector(json.loads(FLASH_LOAN_FUNCTION))
-
-        params = eth_abi.encode_abi(["address", "address[]", "uint256[]", "uint256[]", "address", "bytes", "uint16"],
-                                    ["0x3333333333333333333333333333333333333333",
-                                     ["0x0000000000000000000000000000000000000000",  # Token addresses
-                                      "0x1111111111111111111111111111111111111111"], [8000000, 8000000],  # Amounts
-                                     [1], "0x0000000000000000000000000000000000000000", bytes(0), 0])
-
-        data = encode_hex(func + params)
-
-        tx_event = create_transaction_event({
-            'transaction': {
-                'to': lending_pool_address,
-                'data': data,
-                'hash': "123"
-            },
-            'block': {
-                'number': 0
-            }
-        })
+        tx_event = create_flash_loan_event([USDC, DAI], [8000000 * 10 ** 6, 8000000 * 10 ** 18])
 
         findings = provide_handle_transaction(w3)(tx_event)
 
@@ -181,41 +163,51 @@ class TestFlashLoanAgent:
 
     def test_returns_zero_finding_if_flash_loan_total_below_10kk(self):
         w3 = Web3Mock(prices={'0xdAC17F958D2ee523a2206206994597C13D831ec7': 218474666888275,  # USDT address and price
-                              '0x0000000000000000000000000000000000000000': 813456443213438,  # Random address and price
-                              '0x1111111111111111111111111111111111111111': 999999999999999,  # Random address and price
+                              '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48': 813456443213438,  # USDC address and price
+                              '0x6B175474E89094C44Da98b954EedeAC495271d0F': 999999999999999,  # DAI address and price
                               })
 
-        lpap_contract = web3.eth.contract(address=Web3.toChecksumAddress(LendingPoolAddressesProvider_address), abi=abi)
-        lending_pool_address = lpap_contract.functions.getLendingPool().call()  # get lending pool address
-        func = function_abi_to_4byte_selector(json.loads(FLASH_LOAN_FUNCTION))
+        tx_event = create_flash_loan_event([USDC, DAI], [1000000 * 10 ** 6, 1000000 * 10 ** 18])
 
-        params = eth_abi.encode_abi(["address", "address[]", "uint256[]", "uint256[]", "address", "bytes", "uint16"],
-                                    ["0x3333333333333333333333333333333333333333",
-                                     ["0x0000000000000000000000000000000000000000",  # Token addresses
-                                      "0x1111111111111111111111111111111111111111"], [1000000, 1000000],  # Amounts
-                                     [1], "0x0000000000000000000000000000000000000000", bytes(0), 0])
+        findings = provide_handle_transaction(w3)(tx_event)
 
-        data = encode_hex(func + params)
+        assert not findings
 
-        tx_event = create_transaction_event({
-            'transaction': {
-                'to': lending_pool_address,
-                'data': data,
-                'hash': "123"
-            },
-            'block': {
-                'number': 0
-            }
-        })
+    def test_fetches_all_prices_with_single_call(self):
+        w3 = Web3Mock(prices={'0xdAC17F958D2ee523a2206206994597C13D831ec7': 218474666888275,  # USDT address and price
+                              '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48': 813456443213438,  # USDC address and price
+                              '0x6B175474E89094C44Da98b954EedeAC495271d0F': 999999999999999,  # DAI address and price
+                              '0x0000000000085d4780B73119b644AE5ecd22b376': 111111111111111,  # TUSD address and price
+                              })
+
+        tx_event = create_flash_loan_event([USDC, DAI, TUSD],
+                                           [8000000 * 10 ** 6, 8000000 * 10 ** 18, 8000000 * 10 ** 18])
 
         findings = provide_handle_transaction(w3)(tx_event)
 
-        assert not findings
+        assert findings
+        assert w3.eth.contract.functions.calls == 1
+
+    def test_reuses_prices_for_flash_loans_in_same_block(self):
+        w3 = Web3Mock(prices={'0xdAC17F958D2ee523a2206206994597C13D831ec7': 218474666888275,  # USDT address and price
+                              '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48': 813456443213438,  # USDC address and price
+                              '0x6B175474E89094C44Da98b954EedeAC495271d0F': 999999999999999,  # DAI address and price
+                              })
+
+        tx_event = create_flash_loan_event([USDC, DAI], [8000000 * 10 ** 6, 8000000 * 10 ** 18])
+
+        handle_transaction = provide_handle_transaction(w3)
+        first_findings = handle_transaction(tx_event)
+        second_findings = handle_transaction(tx_event)
+
+        assert first_findings
+        assert second_findings[0].metadata['transaction_amount'] == first_findings[0].metadata['transaction_amount']
+        assert w3.eth.contract.functions.calls == 1
 
     def test_returns_zero_finding_if_not_flash_loan(self):
         w3 = Web3Mock(prices={'0xdAC17F958D2ee523a2206206994597C13D831ec7': 218474666888275,  # USDT address and price
-                              '0x0000000000000000000000000000000000000000': 813456443213438,  # Random address and price
-                              '0x1111111111111111111111111111111111111111': 999999999999999,  # Random address and price
+                              '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48': 813456443213438,  # USDC address and price
+                              '0x6B175474E89094C44Da98b954EedeAC495271d0F': 999999999999999,  # DAI address and price
                               })
 
         lpap_contract = web3.eth.contract(address=Web3.toChecksumAddress(LendingPoolAddressesProvider_address), abi=abi)
@@ -238,30 +230,89 @@ class TestFlashLoanAgent:
 
     def test_returns_zero_finding_if_address_is_wrong(self):
         w3 = Web3Mock(prices={'0xdAC17F958D2ee523a2206206994597C13D831ec7': 218474666888275,  # USDT address and price
-                              '0x0000000000000000000000000000000000000000': 813456443213438,  # Random address and price
-                              '0x1111111111111111111111111111111111111111': 999999999999999,  # Random address and price
+                              '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48': 813456443213438,  # USDC address and price
+                              '0x6B175474E89094C44Da98b954EedeAC495271d0F': 999999999999999,  # DAI address and price
                               })
 
-        func = function_abi_to_4byte_selector(json.loads(FLASH_LOAN_FUNCTION))
-        params = eth_abi.encode_abi(["address", "address[]", "uint256[]", "uint256[]", "address", "bytes", "uint16"],
-                                    ["0x3333333333333333333333333333333333333333",
-                                     ["0x0000000000000000000000000000000000000000",  # Token addresses
-                                      "0x1111111111111111111111111111111111111111"], [1000000, 1000000],  # Amounts
-                                     [1], "0x0000000000000000000000000000000000000000", bytes(0), 0])
+        # FlashLoan logs emitted by another contract than the lending pool
+        logs = create_flash_loan_logs([USDC, DAI], [8000000 * 10 ** 6, 8000000 * 10 ** 18],
+                                      address="0x3333333333333333333333333333333333333333")
+        tx_event = create_flash_loan_event([USDC, DAI], [8000000 * 10 ** 6, 8000000 * 10 ** 18], logs=logs)
 
-        data = encode_hex(func + params)
+        findings = provide_handle_transaction(w3)(tx_event)
 
-        tx_event = create_transaction_event({
-            'transaction': {
-                'to': "0x3333333333333333333333333333333333333333",
-                'data': data,
-                'hash': "123"
-            },
-            'block': {
-                'number': 0
-            }
-        })
+        assert not findings
+
+    def test_returns_finding_with_prices_from_replayed_rpc(self, rpc):
+        # the price oracle is called through a real Web3 provider, the responses come from src/rpc_fixtures.json
+        tx_event = create_flash_loan_event([USDC, DAI], [2000000 * 10 ** 6, 2000000 * 10 ** 18], 13000000)
+
+        initialize()  # resolve the market addresses, so only the price calls are counted
+        tokens.next_refresh_block = None  # the other tests ran at block 0, no token registry refresh is due yet
+        rpc.reset_requests()
+        findings = provide_handle_transaction(web3)(tx_event)
+
+        assert len(findings) == 1
+        assert findings[0].metadata['transaction_amount'] == 16601068.389689447
+        assert rpc.requests['eth_call'] == 1  # a single getAssetsPrices()
+
+    def test_values_flash_loans_of_block_together(self):
+        w3 = Web3Mock(prices=PRICES)
+        batch = BlockBatch()
+        handle_transaction = provide_handle_transaction(w3, batch=batch)
+        handle_block = provide_handle_block(w3, batch=batch)
+
+        assert not handle_transaction(create_flash_loan_event([USDC, DAI], [8000000 * 10 ** 6, 8000000 * 10 ** 18],
+                                                              10, "0x01"))
+        assert not handle_transaction(create_flash_loan_event([DAI, TUSD], [8000000 * 10 ** 18, 10 ** 18], 10, "0x02"))
+        assert not handle_transaction(create_flash_loan_event([USDC], [10 ** 6], 10, "0x03"))  # below $10m
+        assert len(batch) == 3
+
+        findings = handle_block(create_block_event({'block': {'number': 11}}))
+
+        assert [finding.metadata['tx_hash'] for finding in findings] == ["0x01", "0x02"]
+        assert findings[0].metadata['transaction_amount'] == 66404273.55875779
+        assert w3.eth.contract.functions.calls == 1  # USDC, DAI, TUSD and USDT at once
+        assert len(batch) == 0
+
+    def test_returns_batched_findings_with_transaction_of_later_block(self):
+        w3 = Web3Mock(prices=PRICES)
+        handle_transaction = provide_handle_transaction(w3, batch=BlockBatch())
+
+        assert not handle_transaction(create_flash_loan_event([USDC, DAI], [8000000 * 10 ** 6, 8000000 * 10 ** 18],
+                                                              10, "0x01"))
+        findings = handle_transaction(create_transaction_event({
+            'transaction': {'to': "0x3333333333333333333333333333333333333333", 'data': "0x"},
+            'block': {'number': 11}}))
+
+        assert [finding.metadata['tx_hash'] for finding in findings] == ["0x01"]
+
+    def test_returns_finding_for_flash_loan_started_by_contract(self):
+        w3 = Web3Mock(prices=PRICES)
+        # the transaction calls a contract, which calls flashLoan() on the lending pool
+        tx_event = create_flash_loan_event([USDC, DAI], [8000000 * 10 ** 6, 8000000 * 10 ** 18],
+                                           to="0x5555555555555555555555555555555555555555")
 
         findings = provide_handle_transaction(w3)(tx_event)
 
-        assert not findings
+        assert len(findings) == 1
+        assert findings[0].metadata['transaction_amount'] == 66404273.55875779
+        assert findings[0].metadata['receiver'] == RECEIVER
+        assert findings[0].metadata['initiator'] == INITIATOR
+        assert findings[0].metadata['premium_amount'] == 66404273.55875779 * 9 / 10000
+
+    def test_returns_finding_for_every_nested_flash_loan(self):
+        w3 = Web3Mock(prices=PRICES)
+        # the receiver of the outer flash loan takes another one while holding the first, its logs come first
+        nested = create_flash_loan_logs([DAI], [4000000 * 10 ** 18],
+                                        target="0x6666666666666666666666666666666666666666", initiator=RECEIVER)
+        outer = create_flash_loan_logs([USDC, DAI], [4000000 * 10 ** 6, 4000000 * 10 ** 18])
+        tx_event = create_flash_loan_event([], [], to="0x5555555555555555555555555555555555555555",
+                                           logs=nested + outer)
+
+        findings = provide_handle_transaction(w3)(tx_event)
+
+        assert [finding.metadata['receiver'] for finding in findings] == ["0x6666666666666666666666666666666666666666",
+                                                                          RECEIVER]
+        assert findings[1].metadata['transaction_amount'] == 33202136.779378895
+        assert w3.eth.contract.functions.calls == 1
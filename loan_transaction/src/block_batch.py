@@ -0,0 +1,29 @@
+from threading import Lock
+
+
+class BlockBatch:
+    # the relevant transactions of the blocks being received, kept until a later block shows up. A block is over
+    # once an event of a later block arrives, so its transactions are handed over by take_before() with that event.
+    def __init__(self):
+        self.transactions = {}  # block number -> transaction events in arrival order
+        self._lock = Lock()
+
+    def __len__(self):
+        return sum(len(transactions) for transactions in self.transactions.values())
+
+    def add(self, block_number, transaction_event):
+        with self._lock:
+            self.transactions.setdefault(block_number, []).append(transaction_event)
+
+    def take_before(self, block_number):
+        # {block number: transaction events} of the blocks before block_number, removed from the batch
+        with self._lock:
+            done = {block: transactions for block, transactions in self.transactions.items() if block < block_number}
+            for block in done:
+                del self.transactions[block]
+        return done
+
+    def take_all(self):
+        with self._lock:
+            done, self.transactions = self.transactions, {}
+        return done
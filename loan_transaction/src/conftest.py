@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# The tests never reach a real node: eth_calls are replayed from src/rpc_fixtures.json by a local JSON-RPC server.
+# Run them with RPC_RECORD=<node url> to record the missing responses into the fixtures.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'rpc_replay'))
+from rpc_replay import ReplayServer  # noqa: E402
+
+rpc_server = ReplayServer(os.path.join(os.path.dirname(__file__), 'rpc_fixtures.json'),
+                          upstream=os.environ.get('RPC_RECORD')).start()
+# forta_agent reads the JSON-RPC url when it is imported, so it has to be set before the agent is collected
+os.environ['JSON_RPC_HOST'] = rpc_server.host
+os.environ['JSON_RPC_PORT'] = str(rpc_server.port)
+
+
+@pytest.fixture
+def rpc():
+    rpc_server.reset_requests()
+    return rpc_server
@@ -0,0 +1,94 @@
+import json
+
+import eth_abi
+from eth_utils import encode_hex
+from forta_agent import create_transaction_event
+
+from src.constants import FLASH_LOAN_FUNCTION
+from src.decoders import EventDecoder, FunctionDecoder, filter_function, filter_log, filter_log_by_topic, \
+    index_by_topic
+
+LENDING_POOL = "0x7d2768dE32b0b80b7a3454c06BdAc94A69DDc7A9"
+TRANSFER_EVENT = json.dumps({
+    "anonymous": False,
+    "inputs": [
+        {"indexed": True, "internalType": "address", "name": "from", "type": "address"},
+        {"indexed": True, "internalType": "address", "name": "to", "type": "address"},
+        {"indexed": False, "internalType": "uint256", "name": "value", "type": "uint256"}
+    ],
+    "name": "Transfer",
+    "type": "event"
+})
+APPROVAL_EVENT = TRANSFER_EVENT.replace('"from"', '"owner"').replace('"to"', '"spender"') \
+    .replace('Transfer', 'Approval')
+
+
+class TestDecoders:
+    flash_loan_decoder = FunctionDecoder(FLASH_LOAN_FUNCTION)
+    transfer_decoder = EventDecoder(TRANSFER_EVENT)
+
+    def flash_loan_event(self, to=LENDING_POOL):
+        params = eth_abi.encode_abi(["address", "address[]", "uint256[]", "uint256[]", "address", "bytes", "uint16"],
+                                    ["0x3333333333333333333333333333333333333333",
+                                     ["0xdac17f958d2ee523a2206206994597c13d831ec7"], [2000000],
+                                     [0], "0x0000000000000000000000000000000000000000", bytes(0), 0])
+        return create_transaction_event({
+            'transaction': {'to': to, 'data': encode_hex(self.flash_loan_decoder.selector_bytes + params)}})
+
+    def test_decodes_function_like_filter_function(self):
+        tx_event = self.flash_loan_event()
+
+        results = filter_function(tx_event, self.flash_loan_decoder, LENDING_POOL)
+        expected = tx_event.filter_function(FLASH_LOAN_FUNCTION, LENDING_POOL)
+
+        assert len(results) == len(expected) == 1
+        assert results[0][0] == 'flashLoan'
+        for name, value in expected[0][1].items():
+            assert results[0][1][name] == value
+        assert results[0][1]['assets'] == ["0xdAC17F958D2ee523a2206206994597C13D831ec7"]
+
+    def test_skips_function_on_other_address_or_selector(self):
+        assert not filter_function(self.flash_loan_event(to="0x1010101010101010101010101010101010101010"),
+                                   self.flash_loan_decoder, LENDING_POOL)
+        tx_event = create_transaction_event({'transaction': {'to': LENDING_POOL, 'data': "0x12345678"}})
+        assert not filter_function(tx_event, self.flash_loan_decoder, LENDING_POOL)
+
+    def test_decodes_event_like_filter_log(self):
+        topics = [self.transfer_decoder.topic,
+                  encode_hex(eth_abi.encode_abi(["address"], ["0x3333333333333333333333333333333333333333"])),
+                  encode_hex(eth_abi.encode_abi(["address"], [LENDING_POOL]))]
+        data = encode_hex(eth_abi.encode_abi(["uint256"], [42]))
+        tx_event = create_transaction_event({
+            'receipt': {'logs': [{'topics': topics, 'data': data, 'address': LENDING_POOL}]}})
+
+        events = filter_log(tx_event, self.transfer_decoder, LENDING_POOL)
+        expected = tx_event.filter_log(TRANSFER_EVENT, LENDING_POOL)
+
+        assert len(events) == len(expected) == 1
+        assert events[0]['event'] == 'Transfer'
+        assert events[0]['args'] == dict(expected[0]['args'])
+
+    def test_skips_event_with_wrong_topic_count(self):
+        tx_event = create_transaction_event({
+            'receipt': {'logs': [{'topics': [self.transfer_decoder.topic], 'data': "0x", 'address': LENDING_POOL}]}})
+        assert not filter_log(tx_event, self.transfer_decoder)
+
+    def test_dispatches_logs_by_topic_in_one_pass(self):
+        approval_decoder = EventDecoder(APPROVAL_EVENT)
+        addresses = [encode_hex(eth_abi.encode_abi(["address"], [address]))
+                     for address in ("0x3333333333333333333333333333333333333333", LENDING_POOL)]
+        data = encode_hex(eth_abi.encode_abi(["uint256"], [42]))
+        tx_event = create_transaction_event({
+            'receipt': {'logs': [{'topics': [approval_decoder.topic] + addresses, 'data': data,
+                                  'address': LENDING_POOL},
+                                 {'topics': [], 'data': "0x", 'address': LENDING_POOL},
+                                 {'topics': [self.transfer_decoder.topic] + addresses, 'data': data,
+                                  'address': LENDING_POOL},
+                                 {'topics': [self.transfer_decoder.topic] + addresses, 'data': data,
+                                  'address': "0x1010101010101010101010101010101010101010"}]}})
+
+        events = filter_log_by_topic(tx_event, index_by_topic([self.transfer_decoder, approval_decoder]), LENDING_POOL)
+
+        # in the order of the logs, like filter_log() with both decoders
+        assert [event['event'] for event in events] == ['Approval', 'Transfer']
+        assert events == filter_log(tx_event, [self.transfer_decoder, approval_decoder], LENDING_POOL)
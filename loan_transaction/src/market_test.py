@@ -0,0 +1,133 @@
+import threading
+import time
+
+import pytest
+
+from src.market import Market
+from src.state_store import StateStore
+
+PROVIDER_ADDRESS = '0xb53c1a33016b2dc2ff3653530bff1848a515c8c5'
+PRICE_ORACLE_ADDRESS = '0xA50ba011c48153De246E5192C8f9258A2ba79Ca9'
+LENDING_POOL_ADDRESS = '0x7d2768dE32b0b80b7a3454c06BdAc94A69DDc7A9'
+
+
+class Web3Mock:
+    def __init__(self, functions):
+        self.eth = EthMock(functions)
+
+
+class EthMock:
+    def __init__(self, functions):
+        self.functions = functions
+
+    def contract(self, **_):
+        return self
+
+
+class CallMock:
+    def __init__(self, result, release=None):
+        self.result = result
+        self.release = release
+        self.calls = 0
+
+    def __call__(self):
+        return self
+
+    def call(self):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait()
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FunctionsMock:
+    def __init__(self, price_oracle, lending_pool):
+        self.getPriceOracle = price_oracle
+        self.getLendingPool = lending_pool
+
+
+def create_market(price_oracle, lending_pool=None, store=None):
+    functions = FunctionsMock(price_oracle, lending_pool or CallMock(LENDING_POOL_ADDRESS))
+    return Market(Web3Mock(functions), 'MAIN', 'MAINNET', PROVIDER_ADDRESS, [], store)
+
+
+class TestMarket:
+    def test_does_not_call_rpc_until_address_is_used(self):
+        get_price_oracle = CallMock(PRICE_ORACLE_ADDRESS)
+        market = create_market(get_price_oracle)
+
+        assert get_price_oracle.calls == 0
+        assert not market.is_resolved(['PriceOracle'])
+        assert market.price_oracle == PRICE_ORACLE_ADDRESS
+        assert market.price_oracle == PRICE_ORACLE_ADDRESS
+        assert get_price_oracle.calls == 1
+
+    def test_warmup_resolves_all_addresses(self):
+        market = create_market(CallMock(PRICE_ORACLE_ADDRESS))
+
+        assert market.warmup(['PriceOracle', 'LendingPool'], timeout=1)
+        assert market.price_oracle == PRICE_ORACLE_ADDRESS
+        assert market.lending_pool == LENDING_POOL_ADDRESS
+
+    def test_warmup_returns_after_timeout_if_rpc_is_slow(self):
+        release = threading.Event()
+        get_price_oracle = CallMock(PRICE_ORACLE_ADDRESS, release)
+        market = create_market(get_price_oracle)
+
+        assert not market.warmup(['PriceOracle'], timeout=0.05)
+        release.set()
+        # the address resolved by the background warmup is reused on first use
+        assert market.price_oracle == PRICE_ORACLE_ADDRESS
+        assert get_price_oracle.calls == 1
+
+    def test_warmup_failure_is_retried_on_first_use(self):
+        get_price_oracle = CallMock(ConnectionError('RPC is down'))
+        market = create_market(get_price_oracle)
+
+        assert not market.warmup(['PriceOracle'], timeout=1)
+        with pytest.raises(ConnectionError):
+            market.price_oracle
+        get_price_oracle.result = PRICE_ORACLE_ADDRESS
+        assert market.price_oracle == PRICE_ORACLE_ADDRESS
+
+    def test_set_address_overrides_resolved_address(self):
+        get_price_oracle = CallMock(PRICE_ORACLE_ADDRESS)
+        market = create_market(get_price_oracle)
+
+        market.set_address('PriceOracle', '0x1010101010101010101010101010101010101010')
+        assert market.price_oracle == '0x1010101010101010101010101010101010101010'
+        assert get_price_oracle.calls == 0
+
+    def test_restores_addresses_from_store(self):
+        store = StateStore(None, 'test')
+        create_market(CallMock(PRICE_ORACLE_ADDRESS), store=store).warmup(['PriceOracle', 'LendingPool'], timeout=1)
+
+        release = threading.Event()
+        get_price_oracle = CallMock(PRICE_ORACLE_ADDRESS, release)
+        market = create_market(get_price_oracle, store=store)
+        # the restored addresses are used at once, the check in the background is not waited for
+        start = time.monotonic()
+        assert market.warmup(['PriceOracle', 'LendingPool'], timeout=10)
+        assert time.monotonic() - start < 1
+        assert market.price_oracle == PRICE_ORACLE_ADDRESS
+        assert market.lending_pool == LENDING_POOL_ADDRESS
+        release.set()
+
+    def test_warmup_passes_address_changed_while_down(self):
+        store = StateStore(None, 'test')
+        store.put('addresses', {'PriceOracle': '0x1010101010101010101010101010101010101010'})
+        market = create_market(CallMock(PRICE_ORACLE_ADDRESS), store=store)
+        changed = threading.Event()
+        changes = []
+
+        def on_change(name, address):
+            changes.append((name, address))
+            market.set_address(name, address)
+            changed.set()
+
+        assert market.warmup(['PriceOracle'], timeout=1, on_change=on_change)
+        assert changed.wait(1)
+        assert changes == [('PriceOracle', PRICE_ORACLE_ADDRESS)]
+        assert store.get('addresses') == {'PriceOracle': PRICE_ORACLE_ADDRESS}
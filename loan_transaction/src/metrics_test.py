@@ -0,0 +1,91 @@
+import json
+import urllib.request
+
+import pytest
+from forta_agent import Finding, FindingSeverity, FindingType, get_json_rpc_url
+from web3 import Web3
+
+from src.constants import LendingPoolAddressesProvider
+from src.metrics import Metrics, function_names
+
+with open('./src/LendingPoolAddressesProvider.json', 'r') as abi_file:
+    abi = json.load(abi_file)
+
+
+def create_finding(alert_id):
+    return Finding({'name': 'Test', 'description': 'Test', 'alert_id': alert_id, 'type': FindingType.Info,
+                    'severity': FindingSeverity.Info})
+
+
+class TestMetrics:
+    def test_labels_eth_calls_with_contract_function(self, rpc):
+        metrics = Metrics('loan_transaction', function_names(abi))
+        w3 = metrics.instrument(Web3(Web3.HTTPProvider(get_json_rpc_url())))
+        lpap_address = Web3.toChecksumAddress(LendingPoolAddressesProvider.get('MAIN_MAINNET'))
+        lpap_contract = w3.eth.contract(address=lpap_address, abi=abi)
+
+        lpap_contract.functions.getLendingPool().call()
+        lpap_contract.functions.getLendingPool().call()
+
+        labels = (('agent', 'loan_transaction'), ('method', 'getLendingPool'), ('outcome', 'ok'))
+        assert metrics.counters[('aave_rpc_calls_total', labels)] == 2
+        assert metrics.histograms[('aave_rpc_call_seconds', labels[:2])].count == 2
+
+    def test_records_failed_rpc_calls(self, rpc):
+        metrics = Metrics('loan_transaction', function_names(abi))
+        w3 = metrics.instrument(Web3(Web3.HTTPProvider(get_json_rpc_url())))
+        # no response is recorded for this address, so the replay server answers with an error
+        lpap_contract = w3.eth.contract(address='0x1010101010101010101010101010101010101010', abi=abi)
+
+        with pytest.raises(ValueError):
+            lpap_contract.functions.getPriceOracle().call()
+
+        labels = (('agent', 'loan_transaction'), ('method', 'getPriceOracle'), ('outcome', 'error'))
+        assert metrics.counters[('aave_rpc_calls_total', labels)] == 1
+
+    def test_counts_handler_calls_and_findings(self):
+        metrics = Metrics('governance')
+
+        metrics.call_handler('handle_transaction', lambda _: [create_finding('AAVE-GOV-EXEC')], None)
+        with pytest.raises(ValueError):
+            metrics.call_handler('handle_transaction', lambda _: int('not a number'), None)
+
+        assert metrics.counters[('aave_handler_calls_total', (('agent', 'governance'),
+                                                              ('handler', 'handle_transaction'),
+                                                              ('outcome', 'ok')))] == 1
+        assert metrics.counters[('aave_handler_calls_total', (('agent', 'governance'),
+                                                              ('handler', 'handle_transaction'),
+                                                              ('outcome', 'error')))] == 1
+        assert metrics.counters[('aave_findings_total', (('agent', 'governance'), ('alert_id', 'AAVE-GOV-EXEC')))] == 1
+
+    def test_exports_prometheus_text(self):
+        metrics = Metrics('loan_transaction')
+        metrics.inc('aave_rpc_calls_total', method='getAssetsPrices', outcome='ok')
+        metrics.observe('aave_flash_loan_usd', 2e7, buckets=(1e7, 3e7), market='MAIN')
+
+        server = metrics.serve(0, '127.0.0.1')
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{server.server_address[1]}/metrics') as response:
+                text = response.read().decode()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert 'aave_rpc_calls_total{agent="loan_transaction",method="getAssetsPrices",outcome="ok"} 1' in text
+        assert 'aave_flash_loan_usd_bucket{agent="loan_transaction",market="MAIN",le="10000000.0"} 0' in text
+        assert 'aave_flash_loan_usd_bucket{agent="loan_transaction",market="MAIN",le="30000000.0"} 1' in text
+        assert 'aave_flash_loan_usd_bucket{agent="loan_transaction",market="MAIN",le="+Inf"} 1' in text
+        assert 'aave_flash_loan_usd_sum{agent="loan_transaction",market="MAIN"} 20000000.0' in text
+
+    def test_dumps_json(self, tmp_path):
+        metrics = Metrics('loan_transaction')
+        metrics.inc('aave_rpc_calls_total', method='getAssetsPrices', outcome='ok')
+        path = str(tmp_path / 'metrics.json')
+
+        metrics.dump_json(path)
+
+        with open(path, 'r') as metrics_file:
+            dump = json.load(metrics_file)
+        assert dump['counters'] == [{'name': 'aave_rpc_calls_total', 'value': 1,
+                                     'labels': {'agent': 'loan_transaction', 'method': 'getAssetsPrices',
+                                                'outcome': 'ok'}}]
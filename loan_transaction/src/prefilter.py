@@ -0,0 +1,54 @@
+from eth_utils import encode_hex
+
+
+def to_hex(value):
+    # transaction data and log topics come either as hex strings or as bytes
+    if isinstance(value, (bytes, bytearray)):
+        return encode_hex(value)
+    return value.lower() if value else ''
+
+
+class Prefilter:
+    # index of (address -> 4-byte selectors) and (address -> topic0) that lets a transaction be rejected with a
+    # few set lookups before filter_function()/filter_log() decode anything
+    def __init__(self):
+        self.functions = {}
+        self.events = {}
+
+    def watch_function(self, address, selector):
+        # selector is the hex 4-byte function selector, e.g. FunctionDecoder.selector
+        self.functions.setdefault(address.lower(), set()).add(selector.lower())
+
+    def watch_event(self, address, topic):
+        # topic is the hex event topic0, e.g. EventDecoder.topic
+        self.events.setdefault(address.lower(), set()).add(topic.lower())
+
+    def unwatch(self, address):
+        self.functions.pop(address.lower(), None)
+        self.events.pop(address.lower(), None)
+
+    def matches_function(self, transaction_event):
+        if not self.functions:
+            return False
+        # look at the same call sources as filter_function(): the traces if present, the transaction otherwise
+        if transaction_event.traces:
+            sources = [(trace.action.to, trace.action.input) for trace in transaction_event.traces]
+        else:
+            sources = [(transaction_event.transaction.to, transaction_event.transaction.data)]
+        for to, data in sources:
+            selectors = self.functions.get(to.lower()) if to else None
+            if selectors and to_hex(data)[:10] in selectors:
+                return True
+        return False
+
+    def matches_event(self, transaction_event):
+        if not self.events:
+            return False
+        for log in transaction_event.logs:
+            topics = self.events.get(log.address.lower()) if log.address else None
+            if topics and log.topics and to_hex(log.topics[0]) in topics:
+                return True
+        return False
+
+    def matches(self, transaction_event):
+        return self.matches_function(transaction_event) or self.matches_event(transaction_event)
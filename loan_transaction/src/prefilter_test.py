@@ -0,0 +1,47 @@
+from eth_utils import decode_hex
+from forta_agent import create_transaction_event
+
+from src.constants import FLASH_LOAN_FUNCTION
+from src.decoders import EventDecoder, FunctionDecoder
+from src.prefilter import Prefilter
+
+LENDING_POOL = "0x7d2768dE32b0b80b7a3454c06BdAc94A69DDc7A9"
+FLASH_LOAN_SELECTOR = FunctionDecoder(FLASH_LOAN_FUNCTION).selector
+TRANSFER_TOPIC = EventDecoder("""{"anonymous": false, "inputs": [], "name": "Transfer", "type": "event"}""").topic
+
+
+class TestPrefilter:
+    prefilter = Prefilter()
+    prefilter.watch_function(LENDING_POOL, FLASH_LOAN_SELECTOR)
+    prefilter.watch_event(LENDING_POOL, TRANSFER_TOPIC)
+
+    def test_matches_function_call_to_watched_address(self):
+        tx_event = create_transaction_event({
+            'transaction': {'to': LENDING_POOL.lower(), 'data': FLASH_LOAN_SELECTOR + '00' * 32}})
+        assert self.prefilter.matches(tx_event)
+
+    def test_matches_function_call_in_traces(self):
+        tx_event = create_transaction_event({
+            'transaction': {'to': "0x1010101010101010101010101010101010101010", 'data': "0x"},
+            'traces': [{'action': {'to': LENDING_POOL, 'input': FLASH_LOAN_SELECTOR}}]})
+        assert self.prefilter.matches_function(tx_event)
+
+    def test_rejects_other_selector_or_address(self):
+        assert not self.prefilter.matches(create_transaction_event({
+            'transaction': {'to': LENDING_POOL, 'data': "0x12345678"}}))
+        assert not self.prefilter.matches(create_transaction_event({
+            'transaction': {'to': "0x1010101010101010101010101010101010101010", 'data': FLASH_LOAN_SELECTOR}}))
+        assert not self.prefilter.matches(create_transaction_event({'transaction': {'to': None, 'data': None}}))
+
+    def test_matches_event_topic_as_bytes_or_hex(self):
+        for topics in ([decode_hex(TRANSFER_TOPIC)], [TRANSFER_TOPIC]):
+            tx_event = create_transaction_event({
+                'receipt': {'logs': [{'topics': topics, 'data': "0x", 'address': LENDING_POOL}]}})
+            assert self.prefilter.matches_event(tx_event)
+
+    def test_unwatch_removes_address(self):
+        prefilter = Prefilter()
+        prefilter.watch_function(LENDING_POOL, FLASH_LOAN_SELECTOR)
+        prefilter.unwatch(LENDING_POOL)
+        assert not prefilter.matches(create_transaction_event({
+            'transaction': {'to': LENDING_POOL, 'data': FLASH_LOAN_SELECTOR}}))
@@ -0,0 +1,56 @@
+from src.price_cache import PriceCache
+
+
+class FunctionsMock:
+    def __init__(self, prices):
+        self.prices = prices
+        self.calls = []
+
+    def getAssetsPrices(self, assets):
+        self.assets = assets
+        return self
+
+    def call(self, **_):
+        self.calls.append(self.assets)
+        return [self.prices.get(asset) for asset in self.assets]
+
+
+class ContractMock:
+    def __init__(self, prices):
+        self.functions = FunctionsMock(prices)
+
+
+ORACLE = '0xA50ba011c48153De246E5192C8f9258A2ba79Ca9'
+
+
+class TestPriceCache:
+
+    def test_repeated_lookups_in_block_are_served_from_cache(self):
+        contract = ContractMock({'0x01': 1, '0x02': 2})
+        cache = PriceCache()
+
+        assert cache.get_assets_prices(contract, ORACLE, ['0x01', '0x02'], 10) == [1, 2]
+        assert cache.get_assets_prices(contract, ORACLE, ['0x02', '0x01'], 10) == [2, 1]
+        assert contract.functions.calls == [['0x01', '0x02']]
+        assert cache.hits == 2
+        assert cache.misses == 2
+
+    def test_only_missing_prices_are_fetched(self):
+        contract = ContractMock({'0x01': 1, '0x02': 2})
+        cache = PriceCache()
+
+        cache.get_assets_prices(contract, ORACLE, ['0x01'], 10)
+        cache.get_assets_prices(contract, ORACLE, ['0x01', '0x02'], 10)
+        cache.get_assets_prices(contract, ORACLE, ['0x01'], 11)
+        assert contract.functions.calls == [['0x01'], ['0x02'], ['0x01']]
+
+    def test_least_recently_used_price_is_evicted(self):
+        cache = PriceCache(max_size=2)
+        cache.put(ORACLE, '0x01', 10, 1)
+        cache.put(ORACLE, '0x02', 10, 2)
+        cache.get(ORACLE, '0x01', 10)
+        cache.put(ORACLE, '0x03', 10, 3)
+
+        assert len(cache) == 2
+        assert cache.get(ORACLE, '0x01', 10) == 1
+        assert cache.get(ORACLE, '0x02', 10) is None
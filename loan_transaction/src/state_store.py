@@ -0,0 +1,31 @@
+import json
+import sqlite3
+import threading
+
+
+class StateStore:
+    # agent state kept across restarts: JSON values by key in an SQLite database, which the agents of one process can
+    # share with a namespace each. The default in-memory database keeps the state until the process exits only.
+    def __init__(self, path, namespace):
+        self.namespace = namespace
+        self._connection = sqlite3.connect(path or ':memory:', check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')  # the checkpoints do not block the readers
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS state '
+                                 '(namespace TEXT, key TEXT, value TEXT, PRIMARY KEY (namespace, key))')
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self._connection.execute('SELECT value FROM state WHERE namespace = ? AND key = ?',
+                                           (self.namespace, key)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def put(self, key, value):
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO state VALUES (?, ?, ?)',
+                                     (self.namespace, key, json.dumps(value)))
+
+    def delete(self, key):
+        with self._lock:
+            self._connection.execute('DELETE FROM state WHERE namespace = ? AND key = ?', (self.namespace, key))
@@ -0,0 +1,29 @@
+from src.state_store import StateStore
+
+
+class TestStateStore:
+    def test_keeps_values_across_restarts(self, tmp_path):
+        path = str(tmp_path / 'state.sqlite')
+        store = StateStore(path, 'loan_transaction_MAIN_MAINNET')
+        store.put('addresses', {'PriceOracle': '0xA50ba011c48153De246E5192C8f9258A2ba79Ca9'})
+        store.put('last_block', 13000000)
+        store.put('last_block', 13000001)
+
+        restarted = StateStore(path, 'loan_transaction_MAIN_MAINNET')
+        assert restarted.get('addresses') == {'PriceOracle': '0xA50ba011c48153De246E5192C8f9258A2ba79Ca9'}
+        assert restarted.get('last_block') == 13000001
+        restarted.delete('last_block')
+        assert restarted.get('last_block', 0) == 0
+
+    def test_separates_namespaces(self, tmp_path):
+        path = str(tmp_path / 'state.sqlite')
+        StateStore(path, 'loan_transaction_MAIN_MAINNET').put('last_block', 1)
+
+        assert StateStore(path, 'loan_transaction_AMM_MAINNET').get('last_block') is None
+
+    def test_keeps_values_in_memory_without_path(self):
+        store = StateStore(None, 'loan_transaction_MAIN_MAINNET')
+        store.put('last_block', 1)
+
+        assert store.get('last_block') == 1
+        assert StateStore(None, 'loan_transaction_MAIN_MAINNET').get('last_block') is None
@@ -0,0 +1,93 @@
+from src.token_registry import TokenRegistry
+
+USDT = "0xdAC17F958D2ee523a2206206994597C13D831ec7"
+NEW_RESERVE = "0x1111111111111111111111111111111111111111"
+NEW_ATOKEN = "0x2222222222222222222222222222222222222222"
+LENDING_POOL = "0x7d2768dE32b0b80b7a3454c06BdAc94A69DDc7A9"
+
+
+class Web3Mock:
+    # a LendingPool listing USDT and NEW_RESERVE, NEW_RESERVE and NEW_ATOKEN are ERC20 tokens
+    def __init__(self):
+        self.eth = EthMock()
+
+
+class EthMock:
+    def __init__(self):
+        self.calls = []
+
+    def contract(self, address, **_):
+        return ContractMock(self, address)
+
+
+class ContractMock:
+    def __init__(self, eth, address):
+        self.functions = FunctionsMock(eth, address)
+
+
+class FunctionsMock:
+    reserve_data = (None, 0, 0, 0, 0, 0, 0, NEW_ATOKEN, "0x3333333333333333333333333333333333333333",
+                    "0x4444444444444444444444444444444444444444", None, 31)
+    symbols = {NEW_RESERVE: 'NEW', NEW_ATOKEN: 'aNEW'}
+
+    def __init__(self, eth, address):
+        self.eth = eth
+        self.address = address
+        self.return_value = None
+
+    def __getattr__(self, name):
+        def function(*args):
+            self.eth.calls.append(name)
+            self.return_value = {
+                'getReservesList': lambda: [USDT, NEW_RESERVE],
+                'getReserveData': lambda: self.reserve_data,
+                'symbol': lambda: self.symbols[self.address],
+                'decimals': lambda: 8,
+            }[name]()
+            return self
+        return function
+
+    def call(self, **_):
+        return self.return_value
+
+
+class TestTokenRegistry:
+    tokens = TokenRegistry.load('./src/tokens.json', 'MAIN')
+
+    def test_finds_tokens_by_address_symbol_and_atoken_symbol(self):
+        usdt = self.tokens.by_address(USDT.lower())
+
+        assert usdt['address'] == USDT
+        assert usdt['decimals'] == 6
+        assert self.tokens.by_symbol('USDT') is usdt
+        assert self.tokens.by_atoken_symbol('aUSDT') is usdt
+        assert self.tokens.by_symbol('NEW') is None
+        assert USDT.lower() in self.tokens
+
+    def test_keeps_markets_apart(self):
+        amm_tokens = TokenRegistry.load('./src/tokens.json', 'AMM')
+        assert len(self.tokens) == 31
+        assert len(amm_tokens) == 21
+        assert amm_tokens.by_symbol('USDT')['aTokenSymbol'] == 'aAmmUSDT'
+
+    def test_refresh_adds_new_reserves_only(self):
+        tokens = TokenRegistry.load('./src/tokens.json', 'MAIN')
+        w3 = Web3Mock()
+
+        added = tokens.refresh(w3, LENDING_POOL)
+
+        assert added == [tokens.by_address(NEW_RESERVE)]
+        assert added[0]['symbol'] == 'NEW'
+        assert added[0]['aTokenSymbol'] == 'aNEW'
+        assert added[0]['decimals'] == 8
+        assert tokens.by_atoken_symbol('aNEW') is added[0]
+        assert w3.eth.calls.count('getReserveData') == 1  # USDT is known already
+
+    def test_refreshes_every_refresh_blocks(self):
+        tokens = TokenRegistry.load('./src/tokens.json', 'MAIN', refresh_blocks=100)
+        w3 = Web3Mock()
+
+        for block_number in range(1000, 1250):
+            tokens.refresh_if_due(w3, lambda: LENDING_POOL, block_number)
+
+        assert w3.eth.calls.count('getReservesList') == 2  # at the blocks 1100 and 1200
@@ -0,0 +1,50 @@
+from threading import Lock
+
+from web3 import Web3
+
+from src.token_registry import erc20_abi
+
+SCALE_DECIMALS = 18  # amounts are scaled to 18 decimals, the most any reserve has
+
+
+class UsdValuation:
+    # USD value of token amounts at a block from the PriceOracle prices, which are in ETH wei per whole token:
+    #   usd = Σ(price * amount / 10^decimals) / reference price
+    # The decimals are applied with integer factors precomputed from the token registry, so the sum stays exact until
+    # the final division. The reference (USDT) price is fetched once per block at that block, together with the
+    # assets of the first loan, and every loan of the block is valued with that snapshot.
+    def __init__(self, registry, reference_address, price_cache):
+        self.registry = registry
+        self.reference_address = reference_address
+        self.price_cache = price_cache
+        self.factors = {token['address'].lower(): 10 ** (SCALE_DECIMALS - token['decimals']) for token in registry}
+        self.snapshot = (None, None)  # (block number, reference price)
+        self._lock = Lock()
+
+    def factor(self, w3, asset):
+        factor = self.factors.get(asset.lower())
+        if factor is None:
+            # a reserve listed after tokens.json, from the refreshed registry or from the token itself
+            token = self.registry.by_address(asset)
+            decimals = token['decimals'] if token else w3.eth.contract(
+                address=Web3.toChecksumAddress(asset), abi=erc20_abi).functions.decimals().call()
+            factor = self.factors[asset.lower()] = 10 ** (SCALE_DECIMALS - decimals)
+        return factor
+
+    def block_prices(self, price_oracle_contract, price_oracle_address, assets, block_number):
+        # (reference price, prices of assets) with the reference fetched in the same call as the assets if it is not
+        # in the block's snapshot yet
+        with self._lock:
+            snapshot_block, reference_price = self.snapshot
+            if snapshot_block == block_number:
+                return reference_price, self.price_cache.get_assets_prices(
+                    price_oracle_contract, price_oracle_address, assets, block_number) if assets else []
+            *prices, reference_price = self.price_cache.get_assets_prices(
+                price_oracle_contract, price_oracle_address, [*assets, self.reference_address], block_number)
+            self.snapshot = (block_number, reference_price)
+            return reference_price, prices
+
+    def value(self, w3, price_oracle_contract, price_oracle_address, assets, amounts, block_number):
+        reference_price, prices = self.block_prices(price_oracle_contract, price_oracle_address, assets, block_number)
+        total = sum(price * amount * self.factor(w3, asset) for asset, amount, price in zip(assets, amounts, prices))
+        return total / (reference_price * 10 ** SCALE_DECIMALS)
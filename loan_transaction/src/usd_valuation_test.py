@@ -0,0 +1,71 @@
+from src.price_cache import PriceCache
+from src.token_registry import TokenRegistry
+from src.usd_valuation import UsdValuation
+
+USDT = "0xdAC17F958D2ee523a2206206994597C13D831ec7"
+USDC = "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48"
+WBTC = "0x2260FAC5E5542a773Aa44fBCfeDf7C193bc2C599"
+NEW_RESERVE = "0x1111111111111111111111111111111111111111"  # not in tokens.json, 12 decimals
+PRICE_ORACLE = "0xA50ba011c48153De246E5192C8f9258A2ba79Ca9"
+ETH = 10 ** 18
+PRICES = {USDT: ETH // 4000, USDC: ETH // 4000, WBTC: 15 * ETH, NEW_RESERVE: 2 * ETH}  # ETH = $4000
+
+
+class OracleMock:
+    # PriceOracle and ERC20 decimals() in one, every getAssetsPrices() call is recorded
+    def __init__(self):
+        self.functions = self
+        self.calls = []
+        self.return_value = None
+
+    def getAssetsPrices(self, assets):
+        self.calls.append(assets)
+        self.return_value = [PRICES[asset] for asset in assets]
+        return self
+
+    def decimals(self):
+        self.return_value = 12
+        return self
+
+    def call(self, **_):
+        return self.return_value
+
+
+class Web3Mock:
+    def __init__(self, oracle):
+        self.eth = self
+        self.oracle = oracle
+
+    def contract(self, **_):
+        return self.oracle
+
+
+class TestUsdValuation:
+    tokens = TokenRegistry.load('./src/tokens.json', 'MAIN')
+
+    def test_scales_amounts_by_token_decimals(self):
+        oracle = OracleMock()
+        valuation = UsdValuation(self.tokens, USDT, PriceCache())
+
+        usd = valuation.value(Web3Mock(oracle), oracle, PRICE_ORACLE, [WBTC, USDC], [2 * 10 ** 8, 1000 * 10 ** 6], 1)
+
+        assert usd == 2 * 15 * 4000 + 1000
+
+    def test_fetches_reference_once_per_block(self):
+        oracle = OracleMock()
+        valuation = UsdValuation(self.tokens, USDT, PriceCache())
+
+        valuation.value(Web3Mock(oracle), oracle, PRICE_ORACLE, [WBTC], [10 ** 8], 1)
+        valuation.value(Web3Mock(oracle), oracle, PRICE_ORACLE, [USDC], [10 ** 6], 1)
+        valuation.value(Web3Mock(oracle), oracle, PRICE_ORACLE, [USDC], [10 ** 6], 2)
+
+        # one call per loan, the reference only with the first loan of each block
+        assert oracle.calls == [[WBTC, USDT], [USDC], [USDC, USDT]]
+
+    def test_reads_decimals_of_unknown_reserve(self):
+        oracle = OracleMock()
+        valuation = UsdValuation(self.tokens, USDT, PriceCache())
+
+        usd = valuation.value(Web3Mock(oracle), oracle, PRICE_ORACLE, [NEW_RESERVE], [3 * 10 ** 12], 1)
+
+        assert usd == 3 * 2 * 4000
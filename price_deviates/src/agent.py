@@ -1,18 +1,40 @@
 import json
-from forta_agent import Finding, FindingType, FindingSeverity, get_json_rpc_url
+import os
+import threading
+import eth_abi
+from forta_agent import Finding, FindingType, get_json_rpc_url
 from web3 import Web3
 
-from src.constants import LendingPoolAddressesProvider, GET_ASSETS_PRICE_ABI, GET_FALLBACK_ORACLE
-import time
+from src.async_rpc import AsyncRpcClient
+from src.constants import LendingPoolAddressesProvider, GET_ASSETS_PRICE_ABI, GET_FALLBACK_ORACLE, \
+    GET_SOURCE_OF_ASSET_ABI, AGGREGATOR_ABI
+from src.deviation import SEVERITIES, find_deviations
+from src.metrics import Metrics, function_names
+from src.oracles import OracleAddresses
+from src.price_cache import PriceCache
+from src.price_updates import PriceUpdates
+from src.scheduler import BlockScheduler
+from src.state_store import StateStore
+from src.token_registry import TokenRegistry, erc20_abi, lending_pool_abi
 
 # --------------------------SETUP SECTION-------------------------- #
-SLEEP_SECONDS = 1200    # 20 min - check interval
+SWEEP_BLOCKS = 100      # ~20 min - blocks between two checks of a token, the tokens are spread over them
+TOKEN_SWEEP_BLOCKS = {}  # token symbol -> blocks between two checks of that token, e.g. {'USDT': 25}
 PRICE_TH = 10           # 10% - minimal threshold
 HIGH_PRICE_TH = 20      # 20% - threshold for the high severity
 CRITICAL_PRICE_TH = 30  # 30% - threshold for the critical severity
+ORACLE_REFRESH_BLOCKS = 100  # blocks between two reads of the PriceOracle and FallbackOracle addresses
 
-MARKET = 'MAIN'      # available options: MAIN, AMM
-NETWORK = 'MAINNET'  # There is only mainnet available at this moment
+MARKET = os.environ.get('AAVE_MARKET', 'MAIN')  # available options: MAIN, AMM
+NETWORK = os.environ.get('AAVE_NETWORK', 'MAINNET')  # There is only mainnet available at this moment
+
+ASYNC_RPC = True           # fetch all the prices of a check concurrently
+RPC_MAX_CONCURRENCY = 32   # max number of price requests in flight
+
+INCREMENTAL_CHECKS = True  # re-check the tokens whose oracle price changes in a transaction, at its block
+WARMUP_TIMEOUT = 10        # seconds to wait for the watched oracle and source addresses at startup
+RPC_TIMEOUT = 10           # seconds
+STATE_PATH = os.environ.get('AAVE_STATE_PATH')  # SQLite file keeping the agent state across restarts, memory if not set
 # ------------------------END SETUP SECTION------------------------ #
 
 LendingPoolAddressesProvider_address = LendingPoolAddressesProvider.get(MARKET + '_' + NETWORK)
@@ -23,95 +45,305 @@ with open('./src/LendingPoolAddressesProvider.json', 'r') as abi_file:
 with open('./src/FallbackOracleABI.json', 'r') as abi_file:
     fbo_abi = json.load(abi_file)  # get FallbackOracle ABI
 
-with open('./src/tokens.json', 'r') as tokens_file:
-    tokens = json.load(tokens_file)  # get tokens addresses and symbols
-
-web3 = Web3(Web3.HTTPProvider(get_json_rpc_url()))
-lpap_contract = web3.eth.contract(address=Web3.toChecksumAddress(LendingPoolAddressesProvider_address), abi=abi)
+# get tokens addresses and symbols, new reserves are picked up from the LendingPool while running
+tokens = TokenRegistry.load('./src/tokens.json', MARKET)
 
 get_assets_price_abi = json.loads(GET_ASSETS_PRICE_ABI)
 get_fallback_oracle = json.loads(GET_FALLBACK_ORACLE)
+get_source_of_asset_abi = json.loads(GET_SOURCE_OF_ASSET_ABI)
+aggregator_abi = json.loads(AGGREGATOR_ABI)
+prices_submitted_abi = next(x for x in fbo_abi if x.get('type') == 'event' and x['name'] == 'PricesSubmitted')
+
+# every RPC call and handler invocation is counted and timed, see initialize() for the export
+metrics = Metrics('price_deviates', function_names(abi, fbo_abi, get_assets_price_abi, get_fallback_oracle,
+                                                   get_source_of_asset_abi, aggregator_abi, lending_pool_abi,
+                                                   erc20_abi))
+web3 = metrics.instrument(Web3(Web3.HTTPProvider(get_json_rpc_url(), request_kwargs={'timeout': RPC_TIMEOUT})))
+lpap_contract = web3.eth.contract(address=Web3.toChecksumAddress(LendingPoolAddressesProvider_address), abi=abi)
+
+# the oracle and source addresses are resolved in the background by initialize() or the first transaction, unless they
+# are restored from the state store
+store = StateStore(STATE_PATH, f'price_deviates_{MARKET}_{NETWORK}')
+price_updates = PriceUpdates(tokens.addresses, prices_submitted_abi)
+price_updates_lock = threading.Lock()
+watch_thread = None  # the thread resolving the watched addresses, see start_watching_price_updates()
+if store.get('price_updates') is not None:
+    price_updates.watch(**store.get('price_updates'))
+
+
+def fetch_prices(price_cache, price_oracle, fallback_oracle, assets, block_number):
+    # price_oracle and fallback_oracle are (contract, address) pairs
+    # one getAssetsPrices() and one getAssetPrice() call per asset, sequentially
+    (price_oracle_contract, price_oracle_address), (fallback_oracle_contract, fallback_oracle_address) = \
+        price_oracle, fallback_oracle
+    price_oracle_prices = [price_cache.get_assets_prices(price_oracle_contract, price_oracle_address, [asset],
+                                                         block_number)[0] for asset in assets]
+    fallback_oracle_prices = [price_cache.get_asset_price(fallback_oracle_contract, fallback_oracle_address, asset,
+                                                          block_number) for asset in assets]
+    return price_oracle_prices, fallback_oracle_prices
+
+
+def fetch_prices_async(rpc_client, price_cache, price_oracle, fallback_oracle, assets, block_number):
+    # every uncached price is requested at the same time: one getAssetsPrices() call for the PriceOracle prices and
+    # one getAssetPrice() call per asset for the FallbackOracle prices, so a check takes about one round trip
+    (price_oracle_contract, price_oracle_address), (fallback_oracle_contract, fallback_oracle_address) = \
+        price_oracle, fallback_oracle
+    missing_po = [asset for asset in assets if price_cache.get(price_oracle_address, asset, block_number) is None]
+    missing_fo = [asset for asset in assets if price_cache.get(fallback_oracle_address, asset, block_number) is None]
+
+    calls = [(fallback_oracle_address, fallback_oracle_contract.encodeABI(fn_name='getAssetPrice', args=[asset]))
+             for asset in missing_fo]
+    if missing_po:
+        calls.append((price_oracle_address,
+                      price_oracle_contract.encodeABI(fn_name='getAssetsPrices', args=[missing_po])))
+    results = rpc_client.call_all(calls, block_number) if calls else []
+
+    fetched_fo = {asset: eth_abi.decode_abi(['uint256'], result)[0] for asset, result in zip(missing_fo, results)}
+    fetched_po = dict(zip(missing_po, eth_abi.decode_abi(['uint256[]'], results[-1])[0])) if missing_po else {}
+    for oracle_address, fetched in ((price_oracle_address, fetched_po), (fallback_oracle_address, fetched_fo)):
+        for asset, price in fetched.items():
+            price_cache.put(oracle_address, asset, block_number, price)
+
+    return ([fetched_po[asset] if asset in fetched_po else price_cache.get(price_oracle_address, asset, block_number)
+             for asset in assets],
+            [fetched_fo[asset] if asset in fetched_fo else price_cache.get(fallback_oracle_address, asset, block_number)
+             for asset in assets])
+
+
+def resolve_oracles(w3, block_identifier='latest'):
+    # the (contract, address) pairs of the PriceOracle and FallbackOracle at block_identifier
+    # Get the price oracle address by calling getPriceOracle() on the LendingPoolAddressesProvider.
+    # © https://docs.aave.com/developers/the-core-protocol/price-oracle
+    price_oracle_address = lpap_contract.functions.getPriceOracle().call(block_identifier=block_identifier)
+    price_oracle_contract = w3.eth.contract(address=Web3.toChecksumAddress(price_oracle_address),
+                                            abi=[get_assets_price_abi, get_fallback_oracle])
+
+    # Get the fallback oracle address by calling getFallbackOracle() on the PriceOracle.
+    fallback_oracle_address = price_oracle_contract.functions.getFallbackOracle().call(
+        block_identifier=block_identifier)
+    fallback_oracle_contract = w3.eth.contract(address=Web3.toChecksumAddress(fallback_oracle_address),
+                                               abi=fbo_abi)
+    return (price_oracle_contract, price_oracle_address), (fallback_oracle_contract, fallback_oracle_address)
+
+
+def check_prices(w3, price_cache, rpc_client, block_number, block_identifier='latest', token_list=None,
+                 oracles=None):
+    # compares the PriceOracle and FallbackOracle prices of the tokens (all of them by default) at block_number, the
+    # oracle addresses are read at block_identifier: the latest ones for the live checks, which are reused from
+    # oracles for ORACLE_REFRESH_BLOCKS if given, the historical ones for the backfill
+    findings = []
+    token_list = tokens.tokens if token_list is None else token_list
+
+    if oracles is not None and block_identifier == 'latest':
+        price_oracle, fallback_oracle = oracles.get(block_number, lambda: resolve_oracles(w3))
+    else:
+        price_oracle, fallback_oracle = resolve_oracles(w3, block_identifier)
+    price_oracle_address, fallback_oracle_address = price_oracle[1], fallback_oracle[1]
+
+    assets = [token['address'] for token in token_list]
+    if rpc_client is not None:
+        prices = fetch_prices_async(rpc_client, price_cache, price_oracle, fallback_oracle, assets, block_number)
+    else:
+        prices = fetch_prices(price_cache, price_oracle, fallback_oracle, assets, block_number)
+
+    # RSD and severity of all the tokens in one pass, findings are only built for the deviated ones
+    price_oracle_prices, fallback_oracle_prices = prices
+    (deviated_tokens,), deviations, buckets = find_deviations(price_oracle_prices, fallback_oracle_prices,
+                                                              [PRICE_TH, HIGH_PRICE_TH, CRITICAL_PRICE_TH])
+    for i, relative_standard_deviation, bucket in zip(deviated_tokens.tolist(), deviations.tolist(),
+                                                      buckets.tolist()):
+        token = token_list[i]
+        findings.append(Finding({
+            'name': 'Aave Oracles Price Deviation',
+            'description': f'FallbackOracle price for {token.get("symbol")} '
+                           f'deviates from PriceOracle by {int(relative_standard_deviation)}%',
+            'alert_id': 'AAVE-OPD',
+            'type': FindingType.Suspicious,
+            'severity': SEVERITIES[bucket],
+            'metadata': {
+                'price_oracle_price': price_oracle_prices[i],
+                'fallback_oracle_price': fallback_oracle_prices[i],
+                'relative_standard_deviation': relative_standard_deviation,
+                'token_symbol': token.get("symbol"),
+                'actual_price_oracle_address': price_oracle_address,
+                'actual_fallback_oracle_address': fallback_oracle_address,
+                'block_number': block_number,
+                'market': MARKET
+            }
+        }))
+
+    return findings
+
+
+def get_source_addresses(w3, source_address):
+    # AnswerUpdated is emitted by the aggregator behind the Chainlink proxy set as the asset source
+    if int(source_address, 16) == 0:
+        return []
+    source_contract = w3.eth.contract(address=Web3.toChecksumAddress(source_address), abi=[aggregator_abi])
+    try:
+        return [source_address, source_contract.functions.aggregator().call()]
+    except Exception:
+        return [source_address]  # not a proxy, the source emits AnswerUpdated itself
 
-last_check_unix_time = 0
-json_market = 'proto' if MARKET == 'MAIN' else 'amm'
 
+def save_price_updates():
+    store.put('price_updates', {'price_oracle_address': price_updates.price_oracle_address,
+                                'fallback_oracle_address': price_updates.fallback_oracle_address,
+                                'sources': price_updates.sources})
+
+
+def resolve_price_updates(w3):
+    # the PriceOracle and FallbackOracle addresses and the sources of all the assets
+    price_oracle_address = lpap_contract.functions.getPriceOracle().call()
+    price_oracle_contract = w3.eth.contract(address=Web3.toChecksumAddress(price_oracle_address),
+                                            abi=[get_fallback_oracle, get_source_of_asset_abi])
+    fallback_oracle_address = price_oracle_contract.functions.getFallbackOracle().call()
+    sources = {asset: get_source_addresses(w3, price_oracle_contract.functions.getSourceOfAsset(asset).call())
+               for asset in price_updates.assets.values()}
+    return price_oracle_address, fallback_oracle_address, sources
+
+
+def watch_price_updates(w3, refresh=False):
+    # refresh - resolve the addresses again, the ones watched already, e.g. restored, stay watched meanwhile
+    # the addresses are resolved outside the lock and swapped in under it, so nothing waits for the RPC calls
+    if not refresh and price_updates.watching:
+        return
+    resolved = resolve_price_updates(w3)
+    with price_updates_lock:
+        if refresh or not price_updates.watching:
+            price_updates.watch(*resolved)
+            save_price_updates()
+
+
+def start_watching_price_updates(w3, refresh=False):
+    # watch_price_updates() in a background thread, unless one is running already
+    global watch_thread
+    with price_updates_lock:
+        if watch_thread is None or not watch_thread.is_alive():
+            watch_thread = threading.Thread(target=watch_price_updates, args=(w3, refresh), daemon=True)
+            watch_thread.start()
+        return watch_thread
+
+
+def watch_new_tokens(w3, added):
+    # the reserves listed while running are watched for price updates like the others
+    for token in added:
+        price_updates.add_asset(token['address'])
+    with price_updates_lock:
+        if not price_updates.watching:
+            return  # watch_price_updates() resolves the sources of all the assets
+        price_oracle_contract = w3.eth.contract(address=Web3.toChecksumAddress(price_updates.price_oracle_address),
+                                                abi=[get_source_of_asset_abi])
+        for token in added:
+            source_address = price_oracle_contract.functions.getSourceOfAsset(token['address']).call()
+            price_updates.set_sources(token['address'], get_source_addresses(w3, source_address))
+        save_price_updates()
+
+
+def provide_handle_transaction(w3, price_cache=None, rpc_client=None, oracles=None):
+    # re-checks only the tokens whose price is changed by the transaction, as of the transaction's block
+    price_cache = PriceCache() if price_cache is None else price_cache
+    oracles = OracleAddresses(ORACLE_REFRESH_BLOCKS) if oracles is None else oracles
+
+    def handle_transaction(transaction_event):
+        if not INCREMENTAL_CHECKS:
+            return []
+        if not price_updates.watching:
+            # the transactions are not held up by the resolution, they are only checked once it is over
+            start_watching_price_updates(w3)
+            return []
+        if not price_updates.matches(transaction_event):
+            return []
+
+        source_updates = price_updates.source_updates(transaction_event)
+        for asset, source_address in source_updates:
+            price_updates.set_sources(asset, get_source_addresses(w3, source_address))
+        if source_updates:
+            save_price_updates()
+        token_list = [tokens.by_address(asset) for asset in price_updates.updated_assets(transaction_event)]
+        if not token_list:
+            return []
+
+        return check_prices(w3, price_cache, rpc_client, int(transaction_event.block_number), token_list=token_list,
+                            oracles=oracles)
+
+    return handle_transaction
+
+
+def provide_handle_block(w3, price_cache=None, rpc_client=None, scheduler=None, state_store=None, oracles=None):
+    # prices are fetched concurrently through rpc_client if it is provided, sequentially through w3 otherwise
+    # every block checks only the tokens the scheduler has due, a few of them instead of all every SWEEP_BLOCKS, the
+    # last block seen is checkpointed to the state store. Without a scheduler, the sweep goes on from the last block
+    # checkpointed before a restart, the blocks missed while down are checked at once
+    price_cache = PriceCache() if price_cache is None else price_cache
+    state_store = store if state_store is None else state_store
+    if scheduler is None:
+        scheduler = BlockScheduler(tokens.tokens, SWEEP_BLOCKS, TOKEN_SWEEP_BLOCKS)
+        scheduler.last_block = state_store.get('last_block')
+    oracles = OracleAddresses(ORACLE_REFRESH_BLOCKS) if oracles is None else oracles
 
-def provide_handle_block(w3):
     def handle_block(block_event):
-        global last_check_unix_time
-        findings = []
-
-        if time.time() <= last_check_unix_time + SLEEP_SECONDS:
-            return findings
-
-        # Always get the latest price oracle address by calling getPriceOracle() on the LendingPoolAddressesProvider.
-        # © https://docs.aave.com/developers/the-core-protocol/price-oracle
-        price_oracle_address = lpap_contract.functions.getPriceOracle().call()
-        price_oracle_contract = w3.eth.contract(address=Web3.toChecksumAddress(price_oracle_address),
-                                                abi=[get_assets_price_abi, get_fallback_oracle])
-
-        # Always get the latest fallback oracle address by calling getFallbackOracle() on the PriceOracle.
-        fallback_oracle_address = price_oracle_contract.functions.getFallbackOracle().call()
-        fallback_oracle_contract = w3.eth.contract(address=Web3.toChecksumAddress(fallback_oracle_address),
-                                                   abi=fbo_abi)
-
-        for token in tokens[json_market]:
-            price_oracle_price = price_oracle_contract.functions.getAssetsPrices(assets=[token['address']]).call(
-                block_identifier=int(block_event.block_number))[0]  # get price from the price_oracle_contract
-            fallback_oracle_price = fallback_oracle_contract.functions.getAssetPrice(asset=token['address']).call(
-                block_identifier=int(block_event.block_number))  # get price from the fallback_oracle_contract
-
-            if price_oracle_price == 0 or fallback_oracle_price == 0:  # fallback_oracle does not work for some tokens
-                continue
-
-            # s = √(Σ(X - x̄)² / n - 1)
-            # RSD = 100 * s / x̄
-            avg = (price_oracle_price + fallback_oracle_price) / 2
-            sigma = abs(price_oracle_price - avg) + abs(fallback_oracle_price - avg)
-            relative_standard_deviation = 100 * sigma / avg
-
-            if sigma > PRICE_TH:
-                findings.append(Finding({
-                    'name': 'Aave Oracles Price Deviation',
-                    'description': f'FallbackOracle price for {token.get("symbol")} '
-                                   f'deviates from PriceOracle by {int(relative_standard_deviation)}%',
-                    'alert_id': 'AAVE-OPD',
-                    'type': FindingType.Suspicious,
-                    'severity': get_severity(relative_standard_deviation),
-                    'metadata': {
-                        'price_oracle_price': price_oracle_price,
-                        'fallback_oracle_price': fallback_oracle_price,
-                        'relative_standard_deviation': relative_standard_deviation,
-                        'token_symbol': token.get("symbol"),
-                        'actual_price_oracle_address': price_oracle_address,
-                        'actual_fallback_oracle_address': fallback_oracle_address,
-                        'block_number': block_event.block_number,
-                        'market': MARKET
-                    }
-                }))
-
-        last_check_unix_time = time.time()
-        return findings
+        added = tokens.refresh_if_due(w3, lambda: lpap_contract.functions.getLendingPool().call(),
+                                      int(block_event.block_number))
+        for token in added:
+            scheduler.add(token)
+        if added and INCREMENTAL_CHECKS:
+            watch_new_tokens(w3, added)
+
+        token_list = scheduler.due(int(block_event.block_number))
+        state_store.put('last_block', scheduler.last_block)
+        if not token_list:
+            return []
+
+        return check_prices(w3, price_cache, rpc_client, int(block_event.block_number), token_list=token_list,
+                            oracles=oracles)
 
     return handle_block
 
 
-def get_severity(relative_standard_deviation):
-    if relative_standard_deviation < HIGH_PRICE_TH:
-        return FindingSeverity.Medium
-    elif relative_standard_deviation < CRITICAL_PRICE_TH:
-        return FindingSeverity.High
-    else:
-        return FindingSeverity.Critical
+def warmup():
+    # resolve the watched addresses before the first transaction, with a slow RPC the resolution goes on in the
+    # background and the transactions are not checked until it is over. The restored ones are used at once and
+    # resolved again in the background, in case they changed while down
+    if INCREMENTAL_CHECKS:
+        restored = price_updates.watching
+        start_watching_price_updates(web3, restored).join(0 if restored else WARMUP_TIMEOUT)
+
+
+def initialize():
+    warmup()
+    metrics.export()
 
 
-def reset_time():
-    global last_check_unix_time
-    last_check_unix_time = 0
+price_cache = PriceCache()
+oracle_addresses = OracleAddresses(ORACLE_REFRESH_BLOCKS)  # shared by the sweep and the incremental checks
+standalone_handlers = {}
 
 
-real_handle_block = provide_handle_block(web3)
+def get_standalone_handlers():
+    # the handlers of the standalone agent are built on first use with their rpc client, so the agent host, which
+    # provides its own handlers and rpc client, does not build a client it never uses
+    if not standalone_handlers:
+        rpc_client = AsyncRpcClient(get_json_rpc_url(), max_concurrency=RPC_MAX_CONCURRENCY,
+                                    metrics=metrics) if ASYNC_RPC else None
+        standalone_handlers['handle_block'] = provide_handle_block(web3, price_cache, rpc_client,
+                                                                   oracles=oracle_addresses)
+        standalone_handlers['handle_transaction'] = provide_handle_transaction(web3, price_cache, rpc_client,
+                                                                               oracles=oracle_addresses)
+    return standalone_handlers
+
+
+def real_handle_block(block_event):
+    return get_standalone_handlers()['handle_block'](block_event)
+
+
+def real_handle_transaction(transaction_event):
+    return get_standalone_handlers()['handle_transaction'](transaction_event)
 
 
 def handle_block(block_event):
-    return real_handle_block(block_event)
+    return metrics.call_handler('handle_block', real_handle_block, block_event)
+
+
+def handle_transaction(transaction_event):
+    return metrics.call_handler('handle_transaction', real_handle_transaction, transaction_event)
@@ -1,12 +1,17 @@
 import json
 import re
-import time
+import threading
 
-from forta_agent import FindingSeverity, FindingType, create_block_event, get_json_rpc_url
+import pytest
+from forta_agent import FindingSeverity, FindingType, create_block_event, create_transaction_event, get_json_rpc_url
 from web3 import Web3
 
-from src.agent import provide_handle_block, MARKET, LendingPoolAddressesProvider_address, get_fallback_oracle, \
-    reset_time
+from src import agent
+from src.agent import provide_handle_block, provide_handle_transaction, MARKET, LendingPoolAddressesProvider_address, \
+    get_fallback_oracle, price_updates, store, tokens, SWEEP_BLOCKS, ORACLE_REFRESH_BLOCKS
+from src.scheduler import BlockScheduler
+from src.state_store import StateStore
+from src.price_updates_test import USDT, USDT_AGGREGATOR, USDT_SOURCE, answer_updated_log
 
 with open('./src/LendingPoolAddressesProvider.json', 'r') as abi_file:
     abi = json.load(abi_file)  # get LendingPoolAddressesProvider ABI
@@ -76,6 +81,11 @@ class FunctionsMock:
         return self.return_value
 
 
+@pytest.fixture(autouse=True)
+def reset_last_block():
+    store.delete('last_block')  # every test starts a new sweep
+
+
 class TestExchangeRateAgent:
     block_event = create_block_event({
         'block': {
@@ -100,16 +110,77 @@ class TestExchangeRateAgent:
         findings = provide_handle_block(w3)(self.block_event)
         assert len(findings) == 0
 
-    def test_returns_zero_findings_if_time_window_dont_passed(self):
-        reset_time()
-        w3 = Web3Mock(self.price_oracle_address, self.fallback_oracle_address, 100, 50)
-        provide_handle_block(w3)(self.block_event)
-        time.sleep(1)
+    def test_returns_zero_findings_if_large_prices_deviate_less_than_th(self):
+        # 100 wei of difference on 1 ETH prices is far below 10% RSD
+        w3 = Web3Mock(self.price_oracle_address, self.fallback_oracle_address, 10 ** 18, 10 ** 18 + 100)
         findings = provide_handle_block(w3)(self.block_event)
         assert len(findings) == 0
 
+    def test_checks_every_token_once_per_sweep(self):
+        w3 = Web3Mock(self.price_oracle_address, self.fallback_oracle_address, 100, 50)
+        handle_block = provide_handle_block(w3)
+        checked = []
+        for block_number in range(SWEEP_BLOCKS):
+            findings = handle_block(create_block_event({'block': {'number': block_number}}))
+            assert len(findings) <= 1  # 31 tokens over 100 blocks
+            checked.extend(finding.metadata['token_symbol'] for finding in findings)
+
+        assert sorted(checked) == sorted(token['symbol'] for token in tokens.tokens)
+        assert not handle_block(self.block_event)  # a block seen again checks nothing
+        findings = handle_block(create_block_event({'block': {'number': SWEEP_BLOCKS}}))
+        assert [finding.metadata['token_symbol'] for finding in findings] == [tokens.tokens[0]['symbol']]
+
+    def test_reads_oracle_addresses_once_per_refresh_blocks(self, monkeypatch):
+        # a sweep of a few tokens per block only costs their price calls
+        w3 = Web3Mock(self.price_oracle_address, self.fallback_oracle_address, 100, 100)
+        reads = []
+        get_fallback_oracle = FunctionsMock.getFallbackOracle
+        monkeypatch.setattr(FunctionsMock, 'getFallbackOracle',
+                            lambda functions: reads.append(1) or get_fallback_oracle(functions))
+        handle_block = provide_handle_block(w3)
+        for block_number in range(2 * ORACLE_REFRESH_BLOCKS):
+            handle_block(create_block_event({'block': {'number': block_number}}))
+
+        assert len(reads) == 2
+
+    def test_checks_tokens_of_skipped_blocks(self):
+        w3 = Web3Mock(self.price_oracle_address, self.fallback_oracle_address, 100, 50)
+        handle_block = provide_handle_block(w3, scheduler=BlockScheduler(tokens.tokens, 10))
+
+        findings = handle_block(create_block_event({'block': {'number': 0}}))
+        findings += handle_block(create_block_event({'block': {'number': 9}}))  # the blocks 1 to 8 are missed
+
+        assert len(findings) == len(tokens.tokens)
+
+    def test_resumes_sweep_after_restart(self):
+        w3 = Web3Mock(self.price_oracle_address, self.fallback_oracle_address, 100, 50)
+        state_store = StateStore(None, 'test')
+        handle_block = provide_handle_block(w3, scheduler=BlockScheduler(tokens.tokens, 10), state_store=state_store)
+        findings = handle_block(create_block_event({'block': {'number': 0}}))
+        findings += handle_block(create_block_event({'block': {'number': 4}}))
+
+        # the scheduler of the restarted agent goes on from the checkpointed block
+        scheduler = BlockScheduler(tokens.tokens, 10)
+        scheduler.last_block = state_store.get('last_block')
+        handle_block = provide_handle_block(w3, scheduler=scheduler, state_store=state_store)
+        assert not handle_block(create_block_event({'block': {'number': 4}}))
+        findings += handle_block(create_block_event({'block': {'number': 9}}))
+
+        assert sorted(finding.metadata['token_symbol'] for finding in findings) == \
+            sorted(token['symbol'] for token in tokens.tokens)
+
+    def test_default_scheduler_resumes_from_store(self):
+        # e.g. the agent host, which provides the handlers without a scheduler
+        w3 = Web3Mock(self.price_oracle_address, self.fallback_oracle_address, 100, 50)
+        state_store = StateStore(None, 'test')
+        state_store.put('last_block', 1000)
+        handle_block = provide_handle_block(w3, state_store=state_store)
+
+        assert not handle_block(create_block_event({'block': {'number': 1000}}))
+        findings = handle_block(create_block_event({'block': {'number': 1000 + SWEEP_BLOCKS}}))
+        assert len(findings) == len(tokens.tokens)
+
     def test_returns_finding_medium_if_price_changed_more_than_th(self):
-        reset_time()
         w3 = Web3Mock(self.price_oracle_address, self.fallback_oracle_address, 100, 85)
         avg = (100 + 85) / 2
         sigma = abs(100 - avg) + abs(85 - avg)  # s = √(Σ(X - x̄)² / n - 1)
@@ -132,7 +203,6 @@ class TestExchangeRateAgent:
         assert findings[0].severity == FindingSeverity.Medium
 
     def test_returns_finding_high_if_price_changed_more_than_high_th(self):
-        reset_time()
         w3 = Web3Mock(self.price_oracle_address, self.fallback_oracle_address, 100, 75)
         avg = (100 + 75) / 2
         sigma = abs(100 - avg) + abs(75 - avg)  # s = √(Σ(X - x̄)² / n - 1)
@@ -155,7 +225,6 @@ class TestExchangeRateAgent:
         assert findings[0].severity == FindingSeverity.High
 
     def test_returns_finding_critical_if_price_changed_more_than_critical_th(self):
-        reset_time()
         w3 = Web3Mock(self.price_oracle_address, self.fallback_oracle_address, 100, 60)
         avg = (100 + 60) / 2
         sigma = abs(100 - avg) + abs(60 - avg)  # s = √(Σ(X - x̄)² / n - 1)
@@ -176,3 +245,49 @@ class TestExchangeRateAgent:
         assert findings[0].metadata['market'] == MARKET
         assert findings[0].type == FindingType.Suspicious
         assert findings[0].severity == FindingSeverity.Critical
+
+    def test_checks_only_tokens_updated_by_transaction(self):
+        price_updates.watch(self.price_oracle_address, self.fallback_oracle_address,
+                            {USDT: [USDT_SOURCE, USDT_AGGREGATOR]})
+        tx_event = create_transaction_event({
+            'receipt': {'logs': [answer_updated_log(price_updates, USDT_AGGREGATOR)]},
+            'block': {'number': 13000000}
+        })
+        w3 = Web3Mock(self.price_oracle_address, self.fallback_oracle_address, 100, 85)
+        findings = provide_handle_transaction(w3)(tx_event)
+
+        assert len(findings) == 1
+        assert findings[0].metadata['token_symbol'] == 'USDT'
+        assert findings[0].metadata['block_number'] == 13000000
+        assert findings[0].severity == FindingSeverity.Medium
+
+    def test_does_not_wait_for_watched_addresses(self, monkeypatch):
+        # the transactions seen while the addresses are resolved in the background are skipped, not held up
+        w3 = Web3Mock(self.price_oracle_address, self.fallback_oracle_address, 100, 85)
+        resolved = (self.price_oracle_address, self.fallback_oracle_address, {USDT: [USDT_SOURCE, USDT_AGGREGATOR]})
+        release = threading.Event()
+        monkeypatch.setattr(agent, 'resolve_price_updates', lambda _: release.wait(1) and resolved)
+        monkeypatch.setattr(price_updates, 'price_oracle_address', None)
+        tx_event = create_transaction_event({
+            'receipt': {'logs': [answer_updated_log(price_updates, USDT_AGGREGATOR)]},
+            'block': {'number': 13000000}
+        })
+        handle_transaction = provide_handle_transaction(w3)
+
+        assert handle_transaction(tx_event) == []
+        assert handle_transaction(tx_event) == []  # the same resolution is still running
+        release.set()
+        agent.watch_thread.join(1)
+        assert len(handle_transaction(tx_event)) == 1
+
+    def test_returns_zero_findings_if_transaction_updates_no_price(self):
+        price_updates.watch(self.price_oracle_address, self.fallback_oracle_address,
+                            {USDT: [USDT_SOURCE, USDT_AGGREGATOR]})
+        tx_event = create_transaction_event({
+            'receipt': {'logs': [answer_updated_log(price_updates, '0x1010101010101010101010101010101010101010')]},
+            'block': {'number': 13000000}
+        })
+        w3 = Web3Mock(self.price_oracle_address, self.fallback_oracle_address, 100, 85)
+        findings = provide_handle_transaction(w3)(tx_event)
+
+        assert len(findings) == 0
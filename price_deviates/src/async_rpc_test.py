@@ -0,0 +1,78 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.async_rpc import AsyncRpcClient, RpcError
+
+RESPONSE_DELAY = 0.2  # seconds
+
+
+class SlowRpcHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(RESPONSE_DELAY)
+        call, block = request['params']
+        if call['data'] == '0xdead':
+            response = {'jsonrpc': '2.0', 'id': request['id'], 'error': {'code': 3, 'message': 'execution reverted'}}
+        else:
+            # echo the call data and the block back, so the test can check the order of the results
+            block_hex = block[2:].zfill(4) if block.startswith('0x') else ''
+            response = {'jsonrpc': '2.0', 'id': request['id'], 'result': call['data'] + block_hex}
+        body = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        pass
+
+
+class SlowRpcServer(ThreadingHTTPServer):
+    request_queue_size = 64  # the default backlog of 5 delays concurrent connects by a SYN retry
+
+
+@pytest.fixture(scope='module')
+def rpc_url():
+    server = SlowRpcServer(('127.0.0.1', 0), SlowRpcHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+
+
+class TestAsyncRpcClient:
+
+    def test_runs_calls_concurrently_and_keeps_order(self, rpc_url):
+        client = AsyncRpcClient(rpc_url, max_concurrency=32)
+        calls = [('0x0000000000000000000000000000000000000001', f'0x{i:04x}') for i in range(30)]
+
+        start = time.time()
+        results = client.call_all(calls, 16)
+        elapsed = time.time() - start
+        client.close()
+
+        assert results == [bytes.fromhex(f'{i:04x}0010') for i in range(30)]
+        assert elapsed < 10 * RESPONSE_DELAY  # sequential calls would take 30 * RESPONSE_DELAY
+
+    def test_limits_concurrency(self, rpc_url):
+        client = AsyncRpcClient(rpc_url, max_concurrency=2)
+        calls = [('0x0000000000000000000000000000000000000001', '0x00')] * 4
+
+        start = time.time()
+        client.call_all(calls)
+        elapsed = time.time() - start
+        client.close()
+
+        assert elapsed >= 2 * RESPONSE_DELAY
+
+    def test_raises_rpc_error(self, rpc_url):
+        client = AsyncRpcClient(rpc_url)
+        with pytest.raises(RpcError):
+            client.call_all([('0x0000000000000000000000000000000000000001', '0xdead')])
+        client.close()
@@ -0,0 +1,138 @@
+# Scans a historical block range for PriceOracle / FallbackOracle deviations, the same check as the live agent at
+# every STRIDE-th block. The blocks are checked by a pool of workers and the progress is checkpointed to disk, so an
+# interrupted backfill resumes where it stopped. It needs an archive node.
+#
+# Run from the agent directory: python -m src.backfill 11400000 13600000 --workers 16
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from src.agent import check_prices, web3
+from src.price_cache import PriceCache
+
+STRIDE = 100  # blocks between two checks, SWEEP_BLOCKS of the live agent
+WORKERS = 16  # blocks checked in parallel
+RETRIES = 3  # attempts per block before the backfill stops
+CHECKPOINT_EVERY = 50  # checked blocks between two checkpoint writes
+CHECKPOINT_FILE = 'backfill_checkpoint.json'
+OUTPUT_FILE = 'backfill_findings.jsonl'
+
+
+class Checkpoint:
+    # every block below next_block is checked, done keeps the blocks above it finished out of order
+    def __init__(self, path, from_block, to_block, stride):
+        self.path = path
+        self.from_block = from_block
+        self.to_block = to_block
+        self.stride = stride
+        self.next_block = from_block
+        self.done = set()
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path, 'r') as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        if (checkpoint['from_block'], checkpoint['to_block'], checkpoint['stride']) != \
+                (self.from_block, self.to_block, self.stride):
+            raise ValueError(f'{self.path} belongs to another backfill: blocks {checkpoint["from_block"]}-'
+                             f'{checkpoint["to_block"]} with stride {checkpoint["stride"]}')
+        self.next_block = checkpoint['next_block']
+        self.done = set(checkpoint['done'])
+
+    def save(self):
+        # written to a temporary file first so that a crash never leaves a partial checkpoint
+        with open(self.path + '.tmp', 'w') as checkpoint_file:
+            json.dump({'from_block': self.from_block, 'to_block': self.to_block, 'stride': self.stride,
+                       'next_block': self.next_block, 'done': sorted(self.done)}, checkpoint_file)
+        os.replace(self.path + '.tmp', self.path)
+
+    def pending(self):
+        return (block for block in range(self.next_block, self.to_block + 1, self.stride) if block not in self.done)
+
+    def complete(self, block_number):
+        self.done.add(block_number)
+        while self.next_block in self.done:
+            self.done.remove(self.next_block)
+            self.next_block += self.stride
+
+    @property
+    def total(self):
+        return len(range(self.from_block, self.to_block + 1, self.stride))
+
+    @property
+    def checked(self):
+        return len(range(self.from_block, self.next_block, self.stride)) + len(self.done)
+
+
+def check_block(check, w3, price_cache, block_number):
+    for attempt in range(RETRIES):
+        try:
+            # the oracle addresses are read at the checked block, they changed over the history
+            return check(w3, price_cache, None, block_number, block_number)
+        except Exception:
+            if attempt == RETRIES - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def backfill(from_block, to_block, stride=STRIDE, workers=WORKERS, checkpoint_path=CHECKPOINT_FILE,
+             output_path=OUTPUT_FILE, w3=web3, check=check_prices):
+    checkpoint = Checkpoint(checkpoint_path, from_block, to_block, stride)
+    price_cache = PriceCache()
+    blocks = checkpoint.pending()
+    findings_count = 0
+    start = time.time()
+    start_checked = checkpoint.checked
+
+    with ThreadPoolExecutor(workers) as executor, open(output_path, 'a') as output:
+        # a bounded number of blocks is in flight, a multi-million block range is never materialized
+        in_flight = {executor.submit(check_block, check, w3, price_cache, block): block
+                     for block in itertools.islice(blocks, workers * 2)}
+        try:
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    block = in_flight.pop(future)
+                    for finding in future.result():
+                        output.write(finding.toJson() + '\n')
+                        findings_count += 1
+                    checkpoint.complete(block)
+                    next_block = next(blocks, None)
+                    if next_block is not None:
+                        in_flight[executor.submit(check_block, check, w3, price_cache, next_block)] = next_block
+
+                    if checkpoint.checked % CHECKPOINT_EVERY == 0:
+                        # the findings are flushed before the checkpoint, a crash can only repeat findings
+                        output.flush()
+                        checkpoint.save()
+                        rate = (checkpoint.checked - start_checked) / max(time.time() - start, 1e-9)
+                        print(f'checked {checkpoint.checked}/{checkpoint.total} blocks, {rate:.1f} blocks/s, '
+                              f'{findings_count} findings')
+        finally:
+            output.flush()
+            checkpoint.save()
+
+    return findings_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill the PriceOracle / FallbackOracle deviations')
+    parser.add_argument('from_block', type=int)
+    parser.add_argument('to_block', type=int)
+    parser.add_argument('--stride', type=int, default=STRIDE, help='blocks between two checks')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='blocks checked in parallel')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE, help='progress file, the backfill resumes from it')
+    parser.add_argument('--output', default=OUTPUT_FILE, help='findings are appended to it as JSON lines')
+    args = parser.parse_args()
+
+    findings_count = backfill(args.from_block, args.to_block, args.stride, args.workers, args.checkpoint,
+                              args.output)
+    print(f'done, {findings_count} findings written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
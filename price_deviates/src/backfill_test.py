@@ -0,0 +1,87 @@
+import json
+import threading
+
+import pytest
+from forta_agent import Finding, FindingSeverity, FindingType
+
+from src import backfill as backfill_module
+from src.backfill import Checkpoint, backfill
+
+
+def create_finding(block_number):
+    return Finding({'name': 'Aave Oracles Price Deviation', 'description': 'Test', 'alert_id': 'AAVE-OPD',
+                    'type': FindingType.Suspicious, 'severity': FindingSeverity.Medium,
+                    'metadata': {'block_number': block_number}})
+
+
+class CheckMock:
+    # returns one finding for every block divisible by 1000, fails on the blocks in failing
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.blocks = []
+        self.lock = threading.Lock()
+
+    def __call__(self, w3, price_cache, rpc_client, block_number, block_identifier):
+        assert block_identifier == block_number  # the historical oracle addresses are used
+        if block_number in self.failing:
+            raise ConnectionError('RPC is down')
+        with self.lock:
+            self.blocks.append(block_number)
+        return [create_finding(block_number)] if block_number % 1000 == 0 else []
+
+
+def read_findings(path):
+    with open(path, 'r') as output:
+        return [json.loads(line)['metadata']['block_number'] for line in output]
+
+
+class TestBackfill:
+    def test_checks_every_stride_block(self, tmp_path):
+        check = CheckMock()
+        findings_count = backfill(10000, 12999, stride=100, workers=4, checkpoint_path=str(tmp_path / 'cp.json'),
+                                  output_path=str(tmp_path / 'out.jsonl'), w3=None, check=check)
+
+        assert sorted(check.blocks) == list(range(10000, 13000, 100))
+        assert findings_count == 3
+        assert sorted(read_findings(tmp_path / 'out.jsonl')) == [10000, 11000, 12000]
+
+    def test_resumes_from_checkpoint_after_crash(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(backfill_module, 'RETRIES', 1)
+        checkpoint_path, output_path = str(tmp_path / 'cp.json'), str(tmp_path / 'out.jsonl')
+
+        with pytest.raises(ConnectionError):
+            backfill(0, 9900, stride=100, workers=2, checkpoint_path=checkpoint_path, output_path=output_path,
+                     w3=None, check=CheckMock(failing=[5000]))
+        checkpoint = Checkpoint(checkpoint_path, 0, 9900, 100)
+        assert checkpoint.next_block <= 5000  # blocks in flight at the crash are checked again
+        checked_before_crash = set(range(0, checkpoint.next_block, 100)) | checkpoint.done
+
+        check = CheckMock()
+        backfill(0, 9900, stride=100, workers=2, checkpoint_path=checkpoint_path, output_path=output_path, w3=None,
+                 check=check)
+
+        # no block is checked twice and all of them are checked in the end
+        assert not checked_before_crash & set(check.blocks)
+        assert checked_before_crash | set(check.blocks) == set(range(0, 10000, 100))
+        assert sorted(read_findings(output_path)) == list(range(0, 10000, 1000))
+
+    def test_retries_failed_blocks(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(backfill_module.time, 'sleep', lambda _: None)
+        check = CheckMock(failing=[200])
+        calls = []
+
+        def flaky_check(*args):
+            calls.append(args[3])
+            if calls.count(200) == 2:
+                check.failing.clear()  # the RPC recovers for the second retry
+            return check(*args)
+
+        backfill(0, 400, stride=100, workers=1, checkpoint_path=str(tmp_path / 'cp.json'),
+                 output_path=str(tmp_path / 'out.jsonl'), w3=None, check=flaky_check)
+        assert sorted(check.blocks) == [0, 100, 200, 300, 400]
+
+    def test_rejects_checkpoint_of_another_range(self, tmp_path):
+        checkpoint_path = str(tmp_path / 'cp.json')
+        Checkpoint(checkpoint_path, 0, 1000, 100).save()
+        with pytest.raises(ValueError):
+            Checkpoint(checkpoint_path, 0, 2000, 100)
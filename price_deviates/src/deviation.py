@@ -0,0 +1,35 @@
+import numpy as np
+from forta_agent import FindingSeverity
+
+SEVERITIES = [FindingSeverity.Medium, FindingSeverity.High, FindingSeverity.Critical]  # one per threshold
+NOT_DEVIATED = -1
+
+
+def relative_standard_deviations(price_oracle_prices, fallback_oracle_prices):
+    # s = √(Σ(X - x̄)² / n - 1)
+    # RSD = 100 * s / x̄
+    # works on arrays of any shape, e.g. tokens of one sweep or tokens × blocks of a backfill; a pair with a zero
+    # price gets nan since the fallback oracle does not work for some tokens
+    price_oracle_prices = np.asarray(price_oracle_prices, dtype=np.float64)
+    fallback_oracle_prices = np.asarray(fallback_oracle_prices, dtype=np.float64)
+    avg = (price_oracle_prices + fallback_oracle_prices) / 2
+    sigma = np.abs(price_oracle_prices - avg) + np.abs(fallback_oracle_prices - avg)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsd = 100 * sigma / avg
+    rsd[(price_oracle_prices == 0) | (fallback_oracle_prices == 0)] = np.nan
+    return rsd
+
+
+def severity_buckets(rsd, thresholds):
+    # index into SEVERITIES of every RSD, NOT_DEVIATED below the first threshold or for nan
+    buckets = np.digitize(np.nan_to_num(rsd, nan=-np.inf), thresholds) - 1
+    return np.where(np.isnan(rsd), NOT_DEVIATED, buckets)
+
+
+def find_deviations(price_oracle_prices, fallback_oracle_prices, thresholds):
+    # one vectorized pass over all the pairs, only the ones crossing a threshold are returned:
+    # (index arrays as returned by np.nonzero(), their RSDs, their severity buckets)
+    rsd = relative_standard_deviations(price_oracle_prices, fallback_oracle_prices)
+    buckets = severity_buckets(rsd, thresholds)
+    deviated = np.nonzero(buckets != NOT_DEVIATED)
+    return deviated, rsd[deviated], buckets[deviated]
@@ -0,0 +1,59 @@
+import math
+
+import numpy as np
+from forta_agent import FindingSeverity
+
+from src.deviation import NOT_DEVIATED, SEVERITIES, find_deviations, relative_standard_deviations, \
+    severity_buckets
+
+THRESHOLDS = [10, 20, 30]
+
+
+def scalar_rsd(price_oracle_price, fallback_oracle_price):
+    avg = (price_oracle_price + fallback_oracle_price) / 2
+    sigma = abs(price_oracle_price - avg) + abs(fallback_oracle_price - avg)
+    return 100 * sigma / avg
+
+
+class TestDeviation:
+    def test_matches_scalar_rsd(self):
+        price_oracle_prices = [100, 100, 209687125839534, 14058512140390260000]
+        fallback_oracle_prices = [85, 95, 556410000000000, 31611663000000000000]
+
+        rsd = relative_standard_deviations(price_oracle_prices, fallback_oracle_prices)
+
+        assert rsd.tolist() == [scalar_rsd(po, fo) for po, fo in zip(price_oracle_prices, fallback_oracle_prices)]
+
+    def test_ignores_zero_prices(self):
+        rsd = relative_standard_deviations([100, 0, 100], [0, 100, 50])
+
+        assert math.isnan(rsd[0]) and math.isnan(rsd[1])
+        assert severity_buckets(rsd, THRESHOLDS).tolist() == [NOT_DEVIATED, NOT_DEVIATED, 2]
+
+    def test_buckets_severity_by_thresholds(self):
+        rsd = np.array([0, 9.99, 10, 19.99, 20, 29.99, 30, 150])
+
+        buckets = severity_buckets(rsd, THRESHOLDS)
+
+        assert buckets.tolist() == [NOT_DEVIATED, NOT_DEVIATED, 0, 0, 1, 1, 2, 2]
+        assert [SEVERITIES[bucket] for bucket in buckets[2:]] == [FindingSeverity.Medium, FindingSeverity.Medium,
+                                                                  FindingSeverity.High, FindingSeverity.High,
+                                                                  FindingSeverity.Critical, FindingSeverity.Critical]
+
+    def test_finds_deviations_in_sweep(self):
+        (tokens,), rsd, buckets = find_deviations([100, 100, 100, 100], [95, 85, 0, 60], THRESHOLDS)
+
+        assert tokens.tolist() == [1, 3]
+        assert rsd.tolist() == [scalar_rsd(100, 85), scalar_rsd(100, 60)]
+        assert buckets.tolist() == [0, 2]
+
+    def test_finds_deviations_in_tokens_by_blocks_matrix(self):
+        price_oracle_prices = np.full((31, 1000), 10 ** 18, dtype=np.float64)
+        fallback_oracle_prices = price_oracle_prices.copy()
+        fallback_oracle_prices[4, 10] = 0.8 * 10 ** 18
+        fallback_oracle_prices[30, 999] = 3 * 10 ** 18
+
+        (tokens, blocks), rsd, buckets = find_deviations(price_oracle_prices, fallback_oracle_prices, THRESHOLDS)
+
+        assert list(zip(tokens.tolist(), blocks.tolist())) == [(4, 10), (30, 999)]
+        assert buckets.tolist() == [1, 2]
@@ -0,0 +1,14 @@
+class OracleAddresses:
+    # the PriceOracle and FallbackOracle of the live checks, read again once every refresh_blocks blocks instead of
+    # before every check, so a check of a few tokens only costs their price calls
+    def __init__(self, refresh_blocks):
+        self.refresh_blocks = refresh_blocks
+        self.oracles = None
+        self.block_number = None
+
+    def get(self, block_number, resolve):
+        # resolve() reads the oracles, it is called again once refresh_blocks blocks are over or for an older block
+        if self.oracles is None or not 0 <= block_number - self.block_number < self.refresh_blocks:
+            self.oracles = resolve()
+            self.block_number = block_number
+        return self.oracles
@@ -0,0 +1,28 @@
+from src.oracles import OracleAddresses
+
+
+class Resolver:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return f'oracles {self.calls}'
+
+
+class TestOracleAddresses:
+    def test_reuses_oracles_until_refresh_blocks_are_over(self):
+        oracles = OracleAddresses(100)
+        resolve = Resolver()
+
+        assert [oracles.get(block_number, resolve) for block_number in range(1000, 1100)] == ['oracles 1'] * 100
+        assert oracles.get(1100, resolve) == 'oracles 2'
+        assert resolve.calls == 2
+
+    def test_resolves_oracles_again_for_older_block(self):
+        # e.g. a replay started again from an earlier block
+        oracles = OracleAddresses(100)
+        resolve = Resolver()
+
+        oracles.get(1000, resolve)
+        assert oracles.get(999, resolve) == 'oracles 2'
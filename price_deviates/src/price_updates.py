@@ -0,0 +1,71 @@
+from src.constants import ANSWER_UPDATED_ABI, ASSET_SOURCE_UPDATED_ABI
+from src.decoders import EventDecoder, filter_log
+from src.prefilter import Prefilter
+
+
+class PriceUpdates:
+    # finds the assets whose price a transaction changes from the logs of:
+    # - the PriceOracle (AaveOracle): AssetSourceUpdated, an asset gets a new Chainlink source
+    # - the Chainlink aggregators behind the sources: AnswerUpdated, a new PriceOracle price
+    # - the FallbackOracle: PricesSubmitted, new FallbackOracle prices
+    def __init__(self, assets, prices_submitted_abi):
+        self.assets = {asset.lower(): asset for asset in assets}
+        self.asset_source_updated_decoder = EventDecoder(ASSET_SOURCE_UPDATED_ABI)
+        self.answer_updated_decoder = EventDecoder(ANSWER_UPDATED_ABI)
+        self.prices_submitted_decoder = EventDecoder(prices_submitted_abi)
+        self.prefilter = Prefilter()
+        self.price_oracle_address = None
+        self.fallback_oracle_address = None
+        self.sources = {}  # asset -> addresses emitting AnswerUpdated for it: the source proxy and its aggregator
+        self.source_assets = {}  # reverse index of sources
+
+    @property
+    def watching(self):
+        return self.price_oracle_address is not None
+
+    def watch(self, price_oracle_address, fallback_oracle_address, sources):
+        self.prefilter = Prefilter()
+        self.price_oracle_address = price_oracle_address
+        self.fallback_oracle_address = fallback_oracle_address
+        self.prefilter.watch_event(price_oracle_address, self.asset_source_updated_decoder.topic)
+        self.prefilter.watch_event(fallback_oracle_address, self.prices_submitted_decoder.topic)
+        self.sources = {}
+        self.source_assets = {}
+        for asset, source_addresses in sources.items():
+            self.set_sources(asset, source_addresses)
+
+    def add_asset(self, asset):
+        # an asset listed while running, its sources are set by the caller once watching
+        self.assets[asset.lower()] = asset
+
+    def set_sources(self, asset, source_addresses):
+        for source_address in self.sources.pop(asset.lower(), []):
+            self.source_assets[source_address].discard(asset.lower())
+            if not self.source_assets[source_address]:
+                del self.source_assets[source_address]
+                self.prefilter.unwatch(source_address)
+        self.sources[asset.lower()] = [address.lower() for address in source_addresses]
+        for source_address in self.sources[asset.lower()]:
+            self.source_assets.setdefault(source_address, set()).add(asset.lower())
+            self.prefilter.watch_event(source_address, self.answer_updated_decoder.topic)
+
+    def matches(self, transaction_event):
+        return self.prefilter.matches_event(transaction_event)
+
+    def source_updates(self, transaction_event):
+        # (asset, new source) pairs, the new sources have to be watched by the caller
+        events = filter_log(transaction_event, self.asset_source_updated_decoder, self.price_oracle_address)
+        return [(event['args']['asset'], event['args']['source']) for event in events]
+
+    def updated_assets(self, transaction_event):
+        # the assets whose PriceOracle or FallbackOracle price changed, in the order of the assets list
+        updated = set()
+        for asset, _ in self.source_updates(transaction_event):
+            updated.add(asset.lower())
+        for event in filter_log(transaction_event, self.prices_submitted_decoder, self.fallback_oracle_address):
+            updated.update(asset.lower() for asset in event['args']['assets'])
+        for log in transaction_event.logs:
+            assets = self.source_assets.get(log.address.lower()) if log.address else None
+            if assets and self.answer_updated_decoder.decode(log) is not None:
+                updated.update(assets)
+        return [asset for asset_key, asset in self.assets.items() if asset_key in updated]
@@ -0,0 +1,82 @@
+import eth_abi
+from eth_utils import encode_hex
+from forta_agent import create_transaction_event
+
+from src.agent import prices_submitted_abi
+from src.price_updates import PriceUpdates
+
+PRICE_ORACLE = "0xA50ba011c48153De246E5192C8f9258A2ba79Ca9"
+FALLBACK_ORACLE = "0x5B09E578cfEAa23F1b11127A658855434e4F3e09"
+USDT = "0xdAC17F958D2ee523a2206206994597C13D831ec7"
+WBTC = "0x2260FAC5E5542a773Aa44fBCfeDf7C193bc2C599"
+USDT_SOURCE = "0x1111111111111111111111111111111111111111"  # Chainlink proxy
+USDT_AGGREGATOR = "0x2222222222222222222222222222222222222222"  # aggregator behind the proxy
+WBTC_SOURCE = "0x3333333333333333333333333333333333333333"
+NEW_SOURCE = "0x4444444444444444444444444444444444444444"
+
+
+def topic(address):
+    return encode_hex(eth_abi.encode_single('address', address))
+
+
+def create_price_updates():
+    price_updates = PriceUpdates([USDT, WBTC], prices_submitted_abi)
+    price_updates.watch(PRICE_ORACLE, FALLBACK_ORACLE, {USDT: [USDT_SOURCE, USDT_AGGREGATOR], WBTC: [WBTC_SOURCE]})
+    return price_updates
+
+
+def answer_updated_log(price_updates, address):
+    return {'address': address, 'data': encode_hex(eth_abi.encode_single('uint256', 1)),
+            'topics': [price_updates.answer_updated_decoder.topic, encode_hex(eth_abi.encode_single('int256', 100)),
+                       encode_hex(eth_abi.encode_single('uint256', 7))]}
+
+
+def asset_source_updated_log(price_updates, asset, source):
+    return {'address': PRICE_ORACLE, 'data': "0x",
+            'topics': [price_updates.asset_source_updated_decoder.topic, topic(asset), topic(source)]}
+
+
+def prices_submitted_log(price_updates, assets):
+    data = eth_abi.encode_abi(['address', 'address[]', 'uint128[]'], [NEW_SOURCE, assets, [1] * len(assets)])
+    return {'address': FALLBACK_ORACLE, 'data': encode_hex(data),
+            'topics': [price_updates.prices_submitted_decoder.topic]}
+
+
+class TestPriceUpdates:
+    def test_finds_asset_of_updated_aggregator(self):
+        price_updates = create_price_updates()
+        tx_event = create_transaction_event({'receipt': {'logs': [answer_updated_log(price_updates, USDT_AGGREGATOR)]}})
+
+        assert price_updates.matches(tx_event)
+        assert price_updates.updated_assets(tx_event) == [USDT]
+
+    def test_finds_assets_of_fallback_oracle_prices(self):
+        price_updates = create_price_updates()
+        tx_event = create_transaction_event({
+            'receipt': {'logs': [prices_submitted_log(price_updates, [WBTC, USDT])]}})
+
+        assert price_updates.matches(tx_event)
+        assert price_updates.updated_assets(tx_event) == [USDT, WBTC]
+
+    def test_follows_asset_source_updates(self):
+        price_updates = create_price_updates()
+        tx_event = create_transaction_event({
+            'receipt': {'logs': [asset_source_updated_log(price_updates, WBTC, NEW_SOURCE)]}})
+
+        assert price_updates.source_updates(tx_event) == [(WBTC, NEW_SOURCE)]
+        assert price_updates.updated_assets(tx_event) == [WBTC]
+
+        price_updates.set_sources(WBTC, [NEW_SOURCE])
+        assert not price_updates.matches(create_transaction_event({
+            'receipt': {'logs': [answer_updated_log(price_updates, WBTC_SOURCE)]}}))
+        assert price_updates.updated_assets(create_transaction_event({
+            'receipt': {'logs': [answer_updated_log(price_updates, NEW_SOURCE)]}})) == [WBTC]
+
+    def test_rejects_unwatched_logs(self):
+        price_updates = create_price_updates()
+        log = answer_updated_log(price_updates, NEW_SOURCE)  # AnswerUpdated of an aggregator of no asset
+        # another event of a watched source
+        other_log = dict(answer_updated_log(price_updates, USDT_SOURCE),
+                         topics=[price_updates.prices_submitted_decoder.topic])
+
+        assert not price_updates.matches(create_transaction_event({'receipt': {'logs': [log, other_log]}}))
@@ -0,0 +1,37 @@
+class BlockScheduler:
+    # spreads the token checks over the blocks instead of checking every token at once: a token with a cadence of
+    # N blocks is due at the blocks where block_number % N == its offset, and the offsets of the tokens sharing a
+    # cadence are evenly spaced over it, so every block checks about len(tokens) / N of them. Being driven by the
+    # block number only, the same blocks check the same tokens in a replay or a backfill.
+    def __init__(self, token_list, interval, cadences=None):
+        # interval - blocks between two checks of a token, cadences - symbol -> blocks overriding it for that token
+        self.interval = interval
+        self.cadences = cadences or {}
+        self.slots = []  # (token, cadence, offset) in token order
+        by_cadence = {}
+        for token in token_list:
+            by_cadence.setdefault(self.cadence(token), []).append(token)
+        offsets = {}
+        for cadence, cadence_tokens in by_cadence.items():
+            for i, token in enumerate(cadence_tokens):
+                offsets[id(token)] = i * cadence // len(cadence_tokens)
+        for token in token_list:
+            self.slots.append((token, self.cadence(token), offsets[id(token)]))
+        self.last_block = None
+
+    def cadence(self, token):
+        return self.cadences.get(token.get('symbol'), self.interval)
+
+    def add(self, token):
+        # a token listed while running gets an offset from its address, the other offsets stay as they are
+        cadence = self.cadence(token)
+        self.slots = self.slots + [(token, cadence, int(token['address'], 16) % cadence)]
+
+    def due(self, block_number):
+        # the tokens with a slot in (last seen block, block_number], so the slots of skipped blocks are not lost and
+        # a block seen again checks nothing
+        first_block = block_number if self.last_block is None else self.last_block + 1
+        due = [token for token, cadence, offset in self.slots
+               if block_number - (block_number - offset) % cadence >= first_block]
+        self.last_block = max(block_number, first_block - 1)
+        return due
@@ -0,0 +1,39 @@
+from src.scheduler import BlockScheduler
+
+TOKENS = [{'symbol': f'T{i}'} for i in range(10)]
+
+
+def symbols(token_list):
+    return [token['symbol'] for token in token_list]
+
+
+class TestBlockScheduler:
+    def test_spreads_tokens_evenly_over_interval(self):
+        scheduler = BlockScheduler(TOKENS, 5)
+        due = [symbols(scheduler.due(block_number)) for block_number in range(1000, 1010)]
+
+        assert [len(block_tokens) for block_tokens in due] == [2] * 10
+        assert due[:5] == due[5:]
+        assert sorted(sum(due[:5], [])) == sorted(symbols(TOKENS))
+
+    def test_checks_token_at_its_own_cadence(self):
+        scheduler = BlockScheduler(TOKENS, 100, {'T3': 10})
+        due = sum((symbols(scheduler.due(block_number)) for block_number in range(100)), [])
+
+        assert due.count('T3') == 10
+        assert all(due.count(symbol) == 1 for symbol in symbols(TOKENS) if symbol != 'T3')
+
+    def test_depends_on_block_number_only(self):
+        # a scheduler started at any block, e.g. by a restarted agent or a replay, checks the same tokens
+        scheduler = BlockScheduler(TOKENS, 7)
+        running = [symbols(scheduler.due(block_number)) for block_number in range(50)]
+        restarted = [symbols(BlockScheduler(TOKENS, 7).due(block_number)) for block_number in range(50)]
+        assert running == restarted
+
+    def test_schedules_added_token_once_per_interval(self):
+        scheduler = BlockScheduler(TOKENS, 5)
+        scheduler.add({'symbol': 'NEW', 'address': '0x1111111111111111111111111111111111111112'})
+        due = sum((symbols(scheduler.due(block_number)) for block_number in range(100, 110)), [])
+
+        assert due.count('NEW') == 2
+        assert all(due.count(symbol) == 2 for symbol in symbols(TOKENS))
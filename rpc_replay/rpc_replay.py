@@ -0,0 +1,184 @@
+# Local JSON-RPC stand-in for the agents' tests and benchmarks.
+#
+# eth_call responses are replayed from a fixtures file keyed by (to, data, block), other methods are answered from
+# the fixtures' "methods" map. In record mode the requests missing from the fixtures are forwarded to an upstream
+# node and the responses are saved to the fixtures file.
+#
+# Run from the repository root:
+#   python rpc_replay/rpc_replay.py loan_transaction/src/rpc_fixtures.json --port 8545
+#   python rpc_replay/rpc_replay.py loan_transaction/src/rpc_fixtures.json --record https://mainnet.node
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NO_RESPONSE_ERROR = -32000
+
+
+def block_key(block_identifier):
+    # 'latest', 15 and '0xf' all come from the same kind of request, so the hex numbers are stored as ints
+    if isinstance(block_identifier, str) and block_identifier.startswith('0x'):
+        return int(block_identifier, 16)
+    return block_identifier
+
+
+def call_key(to, data, block_identifier):
+    return (to or '').lower(), (data or '').lower(), block_key(block_identifier)
+
+
+class RpcFixtures:
+    def __init__(self, path=None):
+        self.path = path
+        self.calls = {}
+        self.methods = {}
+        self.lock = threading.Lock()
+        if path:
+            try:
+                with open(path, 'r') as fixtures_file:
+                    self.load(json.load(fixtures_file))
+            except FileNotFoundError:
+                pass  # created on the first save in record mode
+
+    def load(self, fixtures):
+        self.methods.update(fixtures.get('methods', {}))
+        for call in fixtures.get('calls', []):
+            self.calls[call_key(call['to'], call['data'], call['block'])] = call['result']
+
+    def dump(self):
+        return {
+            'methods': self.methods,
+            'calls': [{'to': to, 'data': data, 'block': block, 'result': result}
+                      for (to, data, block), result in sorted(self.calls.items(), key=str)],
+        }
+
+    def save(self):
+        with self.lock, open(self.path, 'w') as fixtures_file:
+            json.dump(self.dump(), fixtures_file, indent=2)
+            fixtures_file.write('\n')
+
+    def get(self, method, params):
+        if method == 'eth_call':
+            call = params[0]
+            return self.calls.get(call_key(call.get('to'), call.get('data', call.get('input')),
+                                           params[1] if len(params) > 1 else 'latest'))
+        return self.methods.get(method)
+
+    def put(self, method, params, result):
+        with self.lock:
+            if method == 'eth_call':
+                call = params[0]
+                self.calls[call_key(call.get('to'), call.get('data', call.get('input')),
+                                    params[1] if len(params) > 1 else 'latest')] = result
+            else:
+                self.methods[method] = result
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fixtures, address=('127.0.0.1', 0), upstream=None, latency=0.0, jitter=0.0, seed=0):
+        # latency and jitter are in seconds, every request sleeps latency + uniform(0, jitter)
+        super().__init__(address, ReplayRequestHandler)
+        self.fixtures = fixtures if isinstance(fixtures, RpcFixtures) else RpcFixtures(fixtures)
+        self.upstream = upstream
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.requests = Counter()  # requests served by method, e.g. to count the RPC calls per event
+        self.thread = None
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def reset_requests(self):
+        self.requests.clear()
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+    def forward(self, request):
+        upstream_request = urllib.request.Request(self.upstream, data=json.dumps(request).encode(),
+                                                  headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(upstream_request, timeout=30) as response:
+            return json.loads(response.read())
+
+    def respond(self, request):
+        method, params = request['method'], request.get('params', [])
+        self.requests[method] += 1
+        self.delay()
+        result = self.fixtures.get(method, params)
+        if result is None and self.upstream:
+            response = self.forward(request)
+            if 'error' in response:
+                return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': response['error']}
+            result = response['result']
+            self.fixtures.put(method, params, result)
+            if self.fixtures.path:
+                self.fixtures.save()
+        if result is None:
+            return {'jsonrpc': '2.0', 'id': request.get('id'),
+                    'error': {'code': NO_RESPONSE_ERROR, 'message': f'no recorded response for {method} {params}'}}
+        return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+
+
+class ReplayRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, *_):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if isinstance(request, list):
+            response = [self.server.respond(item) for item in request]
+        else:
+            response = self.server.respond(request)
+        body = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay (or record) JSON-RPC responses from a fixtures file')
+    parser.add_argument('fixtures', help='path to the fixtures JSON file')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8545)
+    parser.add_argument('--record', metavar='UPSTREAM_URL', help='forward unknown requests and save the responses')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random extra seconds added to every response')
+    args = parser.parse_args()
+
+    server = ReplayServer(args.fixtures, (args.host, args.port), args.record, args.latency, args.jitter)
+    print(f'{"recording" if args.record else "replaying"} {args.fixtures} on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import json
+import time
+import urllib.request
+
+from rpc_replay import ReplayServer, RpcFixtures
+
+PRICE_ORACLE = '0xA50ba011c48153De246E5192C8f9258A2ba79Ca9'
+FIXTURES = {
+    'methods': {'eth_chainId': '0x1'},
+    'calls': [{'to': PRICE_ORACLE.lower(), 'data': '0x6210308c', 'block': 13000000, 'result': '0x01'}],
+}
+
+
+def post(url, method, params):
+    request = urllib.request.Request(url, data=json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': method,
+                                                           'params': params}).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def create_server(**kwargs):
+    fixtures = RpcFixtures()
+    fixtures.load(FIXTURES)
+    return ReplayServer(fixtures, **kwargs).start()
+
+
+class TestReplayServer:
+    def test_replays_eth_call_by_to_data_and_block(self):
+        server = create_server()
+        try:
+            # the address case and the block format do not matter
+            response = post(server.url, 'eth_call', [{'to': PRICE_ORACLE, 'data': '0x6210308c'}, hex(13000000)])
+            assert response['result'] == '0x01'
+            assert post(server.url, 'eth_chainId', [])['result'] == '0x1'
+            assert server.requests == {'eth_call': 1, 'eth_chainId': 1}
+        finally:
+            server.stop()
+
+    def test_returns_error_for_unknown_call(self):
+        server = create_server()
+        try:
+            response = post(server.url, 'eth_call', [{'to': PRICE_ORACLE, 'data': '0x6210308c'}, 'latest'])
+            assert 'result' not in response
+            assert 'no recorded response' in response['error']['message']
+        finally:
+            server.stop()
+
+    def test_records_missing_responses_from_upstream(self, tmp_path):
+        upstream = create_server()
+        fixtures_path = tmp_path / 'rpc_fixtures.json'
+        server = ReplayServer(str(fixtures_path), upstream=upstream.url).start()
+        try:
+            params = [{'to': PRICE_ORACLE, 'data': '0x6210308c'}, hex(13000000)]
+            assert post(server.url, 'eth_call', params)['result'] == '0x01'
+            assert upstream.requests['eth_call'] == 1
+        finally:
+            server.stop()
+            upstream.stop()
+
+        replay = ReplayServer(str(fixtures_path)).start()
+        try:
+            assert post(replay.url, 'eth_call', params)['result'] == '0x01'
+        finally:
+            replay.stop()
+
+    def test_injects_latency(self):
+        server = create_server(latency=0.05, jitter=0.05)
+        try:
+            start = time.time()
+            post(server.url, 'eth_chainId', [])
+            assert time.time() - start >= 0.05
+        finally:
+            server.stop()